@@ -0,0 +1,217 @@
+import asyncio
+
+from aiocache import Cache, SimpleMemoryCache
+from aiocache.base import BaseCache
+from aiocache.serializers import PickleSerializer
+from collections import OrderedDict
+from loguru import logger
+from time import time
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    Optional,
+    Tuple,
+    TypeVar
+)
+
+from app.configs import CacheConfig
+from app.metrics import MetricsRegistry
+
+T = TypeVar("T")
+
+
+class LRUCache(Generic[T]):
+    """
+    Bounded in-process LRU with a per-entry expiry timestamp.
+    Not thread-safe, meant to be used from the event loop only.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        metrics: MetricsRegistry,
+        max_size: int,
+        ttl: float,
+    ):
+        self._data: OrderedDict[Hashable, Tuple[float, T]] = OrderedDict()
+        self._max_size = max_size
+        self._ttl = ttl
+        self._hits = metrics.counter(f"{name}.hits")
+        self._misses = metrics.counter(f"{name}.misses")
+        self._size = metrics.gauge(f"{name}.size")
+
+    def get(self, key: Hashable) -> Optional[T]:
+        entry = self._data.get(key)
+        if entry is None:
+            self._misses.inc()
+            return None
+        expires_at, value = entry
+        if expires_at <= time():
+            del self._data[key]
+            self._size.set(len(self._data))
+            self._misses.inc()
+            return None
+        self._data.move_to_end(key)
+        self._hits.inc()
+        return value
+
+    def set(
+        self,
+        key: Hashable,
+        value: T,
+        expires_at: Optional[float] = None
+    ) -> None:
+        """
+        Stores value until expires_at (unix time),
+        capped by the cache ttl.
+        """
+        deadline = time() + self._ttl
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+        self._data[key] = (deadline, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self._max_size:
+            self._data.popitem(last=False)
+        self._size.set(len(self._data))
+
+    def delete(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+        self._size.set(len(self._data))
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._size.set(0)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Any) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and entry[0] > time()
+
+
+class SingleFlight(Generic[T]):
+    """
+    Collapses concurrent calls with the same key into one,
+    every caller gets the result of the first call.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(
+        self,
+        key: Hashable,
+        func: Callable[[], Awaitable[T]]
+    ) -> T:
+        call = self._calls.get(key)
+        if call is None:
+            call = asyncio.ensure_future(func())
+            self._calls[key] = call
+            call.add_done_callback(lambda _: self._calls.pop(key, None))
+        # a cancelled caller must not cancel the call for the others
+        return await asyncio.shield(call)
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+
+def build_shared_cache(config: CacheConfig) -> BaseCache | None:
+    """
+    "memory" gives a process local stand-in, anything else is handed
+    to aiocache as an url, e.g. redis://localhost:6379/0
+    """
+    if config.shared_backend is None:
+        return None
+    if config.shared_backend == "memory":
+        return SimpleMemoryCache(serializer=PickleSerializer())
+    cache = Cache.from_url(config.shared_backend)
+    cache.serializer = PickleSerializer()
+    return cache
+
+
+class TieredCache(Generic[T]):
+    """
+    In-process LRU in front of an optional shared cache.
+    Misses for the same key are loaded once, shared cache errors
+    are logged and treated as misses. None is never cached.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        metrics: MetricsRegistry,
+        shared_cache: BaseCache | None,
+        max_size: int,
+        ttl: float,
+    ):
+        self._name = name
+        self._local: LRUCache[T] = LRUCache(name, metrics, max_size, ttl)
+        self._shared = shared_cache
+        self._ttl = ttl
+        self._single_flight: SingleFlight[Optional[T]] = SingleFlight()
+        # bumped on every invalidation, a load that raced with one
+        # must not store what it read
+        self._epoch = 0
+        self._shared_hits = metrics.counter(f"{name}.shared_hits")
+        self._loads = metrics.counter(f"{name}.loads")
+
+    def _shared_key(self, key: str) -> str:
+        return f"{self._name}:{key}"
+
+    async def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Optional[T]]]
+    ) -> Optional[T]:
+        value = self._local.get(key)
+        if value is not None:
+            return value
+        return await self._single_flight.do(
+            key, lambda: self._load(key, loader)
+        )
+
+    async def _load(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Optional[T]]]
+    ) -> Optional[T]:
+        epoch = self._epoch
+        if self._shared is not None:
+            try:
+                value = await self._shared.get(self._shared_key(key))
+            except Exception as e:
+                logger.warning(f"{self._name} shared get failed: {e}")
+                value = None
+            if value is not None:
+                self._shared_hits.inc()
+                if epoch == self._epoch:
+                    self._local.set(key, value)
+                return value
+
+        self._loads.inc()
+        value = await loader()
+        if value is None or epoch != self._epoch:
+            return value
+        self._local.set(key, value)
+        if self._shared is not None:
+            try:
+                await self._shared.set(
+                    self._shared_key(key), value, ttl=int(self._ttl)
+                )
+            except Exception as e:
+                logger.warning(f"{self._name} shared set failed: {e}")
+        return value
+
+    async def invalidate(self, key: str) -> None:
+        self._epoch += 1
+        self._local.delete(key)
+        if self._shared is not None:
+            try:
+                await self._shared.delete(self._shared_key(key))
+            except Exception as e:
+                logger.warning(f"{self._name} shared delete failed: {e}")
@@ -0,0 +1,64 @@
+from aiocache.base import BaseCache
+from datetime import datetime
+from pydantic import BaseModel, ConfigDict
+from typing import Callable
+
+from app.cache import TieredCache
+from app.components.accounts.repo import AccountRepository
+from app.configs import CacheConfig
+from app.metrics import MetricsRegistry
+
+
+class CachedAccount(BaseModel):
+    """
+    Immutable copy of an account row, one instance is handed
+    to every request that finds it in the cache.
+    """
+    model_config = ConfigDict(frozen=True, from_attributes=True)
+
+    id: int
+    created_at: datetime
+    hex_id: str
+    login: str
+
+
+class AccountCache:
+    """
+    Account lookups by id for authentication. Concurrent misses
+    for the same account share a single db query.
+    """
+
+    def __init__(
+        self,
+        config: CacheConfig,
+        metrics: MetricsRegistry,
+        shared_cache: BaseCache | None,
+        accounts_repository: AccountRepository,
+        db_session: Callable,
+    ):
+        self._cache: TieredCache[CachedAccount] = TieredCache(
+            "accounts.cache",
+            metrics,
+            shared_cache,
+            max_size=config.accounts_size,
+            ttl=config.accounts_ttl,
+        )
+        self._accounts_repository = accounts_repository
+        self._db_session = db_session
+
+    async def get_account(self, account_id: int) -> CachedAccount | None:
+        return await self._cache.get_or_load(
+            str(account_id), lambda: self._load(account_id)
+        )
+
+    async def _load(self, account_id: int) -> CachedAccount | None:
+        async with self._db_session() as tx:
+            account = await self._accounts_repository.get_account(
+                tx, account_id
+            )
+        if account is None:
+            return None
+        return CachedAccount.model_validate(account)
+
+    async def invalidate(self, account_id: int) -> None:
+        await self._cache.invalidate(str(account_id))
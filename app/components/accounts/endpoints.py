@@ -5,12 +5,12 @@ from fastapi import Depends
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi_utils.cbv import cbv
 from fastapi_utils.inferring_router import InferringRouter
-from passlib.context import CryptContext
 from typing import Callable
 
 from app.components.accounts.models import Account
 from app.components.accounts.scheme import GetAccountResponse
 from app.components.accounts.service import AccountService
+from app.components.auth.hashing import PasswordHasher
 from app.components.auth.models import Auth
 from app.components.auth.service import AuthService
 from app.containers import Container, container
@@ -29,13 +29,13 @@ class AccountsAPI:
         auth_service: AuthService = Depends(
             Provide[Container.auth_service]
         ),
-        crypt_context: CryptContext = Depends(
-            Provide[Container.crypt_context]
+        password_hasher: PasswordHasher = Depends(
+            Provide[Container.password_hasher]
         ),
     ):
         self._accounts_service = accounts_service
         self._auth_service = auth_service
-        self._crypt_context = crypt_context
+        self._password_hasher = password_hasher
 
     @accounts_router.post(
         "/accounts/register",
@@ -49,9 +49,9 @@ class AccountsAPI:
         db_session: Callable = Depends(Provide[Container.db_session]),
     ) -> GetAccountResponse:
         account = Account(login=data.username, hex_id=secrets.token_hex(16))
+        hashed_pwd = await self._password_hasher.hash(data.password)
         async with db_session() as tx:
             account = await self._accounts_service.add_account(tx, account)
-            hashed_pwd = self._crypt_context.hash(data.password)
             auth = Auth(
                 account_id=account.id,
                 login=data.username,
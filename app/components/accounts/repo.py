@@ -15,8 +15,6 @@ class AccountRepository:
             await tx.flush()
         except IntegrityError:
             raise AccountEntityAlreadyExist(account.login)
-        await tx.commit()
-        await tx.refresh(account)
         return account
     
     @staticmethod
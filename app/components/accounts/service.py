@@ -1,13 +1,20 @@
 from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import Optional
 
+from app.components.accounts.cache import AccountCache, CachedAccount
 from app.components.accounts.models import Account
 from app.components.accounts.repo import AccountRepository
+from app.database import after_commit
 
 
 class AccountService:
-    def __init__(self, accounts_repository: AccountRepository):
+    def __init__(
+        self,
+        accounts_repository: AccountRepository,
+        account_cache: AccountCache,
+    ):
         self._accounts_repository = accounts_repository
+        self._account_cache = account_cache
 
     async def add_account(
         self,
@@ -28,3 +35,18 @@ class AccountService:
         return await self._accounts_repository.get_account(
             tx, account_id, account_hex_id
         )
+
+    async def get_cached_account(
+        self,
+        account_id: int
+    ) -> CachedAccount | None:
+        return await self._account_cache.get_account(account_id)
+
+    def invalidate_account(self, tx: AsyncSession, account_id: int) -> None:
+        """
+        Must be called with the transaction that updates or deletes
+        the account row, the cached copy is dropped once it commits.
+        """
+        after_commit(
+            tx, lambda: self._account_cache.invalidate(account_id)
+        )
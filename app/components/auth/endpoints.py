@@ -34,10 +34,10 @@ class AuthAPI:
         db_session: Callable = Depends(Provide[Container.db_session]),
     ) -> GetTokenResponse:
         async with db_session() as tx:
-            access_token, expires_in = await self._auth_service.create_token(
-                tx, data.username, data.password
-            )
             auth = await self._auth_service.get_auth(tx, data.username)
+        access_token, expires_in = await self._auth_service.create_token(
+            auth, data.username, data.password
+        )
 
         return GetTokenResponse(
             access_token=access_token,
@@ -22,3 +22,17 @@ class AuthException(HTTPException):
             headers=headers,
             status_code=status_code,
         )
+
+
+class HashingOverloadedException(HTTPException):
+    def __init__(
+        self,
+        detail: str = "Too many authentication requests, try again later",
+        headers={"Retry-After": "1"},
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+    ):
+        super().__init__(
+            detail=detail,
+            headers=headers,
+            status_code=status_code,
+        )
@@ -0,0 +1,61 @@
+import asyncio
+
+from concurrent.futures import ThreadPoolExecutor
+from passlib.context import CryptContext
+from time import perf_counter
+from typing import Any, Callable
+
+from app.components.auth.exceptions import HashingOverloadedException
+from app.metrics import MetricsRegistry
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt hashing and verification in a bounded thread pool,
+    bcrypt releases the GIL so the event loop keeps serving requests.
+    Calls beyond workers + queue size are rejected right away.
+    """
+
+    def __init__(
+        self,
+        crypt_context: CryptContext,
+        metrics: MetricsRegistry,
+        max_workers: int,
+        max_queue: int,
+    ):
+        self._crypt_context = crypt_context
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="password-hasher"
+        )
+        self._capacity = max_workers + max_queue
+        self._pending = 0
+        self._pending_gauge = metrics.gauge("auth.hashing.pending")
+        self._rejected = metrics.counter("auth.hashing.rejected")
+        self._duration = metrics.histogram("auth.hashing.ms")
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        if self._pending >= self._capacity:
+            self._rejected.inc()
+            raise HashingOverloadedException()
+
+        self._pending += 1
+        self._pending_gauge.set(self._pending)
+        started = perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            self._pending -= 1
+            self._pending_gauge.set(self._pending)
+            self._duration.observe((perf_counter() - started) * 1000)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self._crypt_context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(
+            self._crypt_context.verify, password, hashed_password
+        )
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
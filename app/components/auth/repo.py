@@ -14,7 +14,6 @@ class AuthRepository:
             await tx.flush()
         except IntegrityError as e:
             raise AuthEntityAlreadyExist(auth.login)
-        await tx.refresh(auth)
         return auth
 
     @staticmethod
@@ -0,0 +1,44 @@
+from functools import lru_cache
+from typing import Tuple
+
+from app.components.auth.consts import ScopeEnum
+
+SCOPE_BITS = {scope.value: 1 << i for i, scope in enumerate(ScopeEnum)}
+
+
+def _expand(scope: str) -> int:
+    """
+    Mask of every known scope matched by a possibly wildcarded
+    "group:func" scope. Unknown scopes match nothing.
+    """
+    group, _, func = scope.partition(":")
+    mask = 0
+    for known, bit in SCOPE_BITS.items():
+        known_group, _, known_func = known.partition(":")
+        if group in ("*", known_group) and func in ("*", known_func):
+            mask |= bit
+    return mask
+
+
+@lru_cache(maxsize=1024)
+def compile_scopes(scopes: Tuple[str, ...]) -> int:
+    mask = 0
+    for scope in scopes:
+        mask |= _expand(scope)
+    return mask
+
+
+@lru_cache(maxsize=1024)
+def compile_required_scopes(scopes: Tuple[str, ...]) -> int:
+    """
+    Same as compile_scopes but refuses scopes outside of ScopeEnum,
+    such a requirement could never be satisfied.
+    """
+    unknown = [scope for scope in scopes if not _expand(scope)]
+    if unknown:
+        raise ValueError(f"Unknown scopes: {' '.join(unknown)}")
+    return compile_scopes(scopes)
+
+
+def is_granted(token_mask: int, required_mask: int) -> bool:
+    return token_mask & required_mask == required_mask
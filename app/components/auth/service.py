@@ -2,9 +2,9 @@ from datetime import timedelta, datetime
 from typing import Tuple
 
 from jose import jwt
-from passlib.context import CryptContext
 from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app.components.auth.hashing import PasswordHasher
 from app.components.auth.models import Auth
 from app.components.auth.repo import AuthRepository
 from app.configs import AuthConfig
@@ -16,11 +16,11 @@ class AuthService:
         self,
         config: AuthConfig,
         auth_repository: AuthRepository,
-        crypt_context: CryptContext,
+        password_hasher: PasswordHasher,
     ):
         self._config = config
         self._auth_repository = auth_repository
-        self._pwd_context = crypt_context
+        self._password_hasher = password_hasher
 
     async def add_auth(self, tx: AsyncSession, auth: Auth) -> Auth:
         return await self._auth_repository.add_auth(tx, auth)
@@ -29,13 +29,18 @@ class AuthService:
         return await self._auth_repository.get_auth(tx, login)
 
     async def create_token(
-        self, tx: AsyncSession, login: str, password: str
+        self, auth: Auth | None, login: str, password: str
     ) -> Tuple[str, float]:
-        auth = await self._auth_repository.get_auth(tx, login)
+        """
+        auth is loaded by the caller beforehand, no connection is
+        held while the password is verified.
+        """
         if not auth:
             raise LogicError(f"Account {login} doesn't exist")
 
-        if not self._pwd_context.verify(password, auth.hashed_password):
+        if not await self._password_hasher.verify(
+            password, auth.hashed_password
+        ):
             raise LogicError("Invalid auth credentials")
 
         expires_delta = timedelta(
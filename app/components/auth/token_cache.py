@@ -0,0 +1,74 @@
+from hashlib import sha256
+from jose import jwt
+from jose.exceptions import JWTClaimsError
+from typing import Any, Dict, FrozenSet
+
+from app.cache import LRUCache
+from app.components.auth.scopes import compile_scopes
+from app.configs import AuthConfig
+from app.metrics import MetricsRegistry
+
+
+class TokenClaims:
+    def __init__(
+        self,
+        account_id: int,
+        scopes: FrozenSet[str],
+        expires_at: float | None = None,
+    ):
+        self.account_id = account_id
+        self.scopes = scopes
+        self.scope_mask = compile_scopes(tuple(sorted(scopes)))
+        self.expires_at = expires_at
+
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any]) -> "TokenClaims":
+        account_id = payload.get("account_id")
+        if account_id is None:
+            raise JWTClaimsError("Token has no account_id")
+        token_scopes = payload.get("scopes")
+        if token_scopes is None:
+            raise JWTClaimsError("Token has no scopes")
+        expires_at = payload.get("exp")
+        return cls(
+            account_id=account_id,
+            scopes=frozenset(token_scopes.split(" ")),
+            expires_at=float(expires_at) if expires_at is not None else None,
+        )
+
+
+class TokenCache:
+    """
+    Keeps verified claims by token digest, so a token reused across
+    requests is decoded and signature-checked only once.
+    Entries live no longer than the token itself.
+    """
+
+    def __init__(self, config: AuthConfig, metrics: MetricsRegistry):
+        self._config = config
+        self._cache: LRUCache[TokenClaims] = LRUCache(
+            "auth.token_cache",
+            metrics,
+            max_size=config.token_cache_size,
+            ttl=config.token_cache_ttl,
+        )
+
+    def decode(self, token: str) -> TokenClaims:
+        """
+        Raises JWTError if the token is invalid, expired
+        or misses required claims.
+        """
+        key = sha256(token.encode()).digest()
+        claims = self._cache.get(key)
+        if claims is None:
+            payload = jwt.decode(
+                token,
+                self._config.secret_key,
+                algorithms=[self._config.algorithm]
+            )
+            claims = TokenClaims.from_payload(payload)
+            self._cache.set(key, claims, claims.expires_at)
+        return claims
+
+    def clear(self) -> None:
+        self._cache.clear()
@@ -1,18 +1,22 @@
-from aiocache import cached
 from dependency_injector.wiring import Provide, inject
 from fastapi.params import Depends, Security
-from fastapi.security import OAuth2PasswordBearer, SecurityScopes
-from jose import jwt, JWTError
+from fastapi.security import OAuth2PasswordBearer
+from functools import lru_cache
+from jose import JWTError
 from loguru import logger
-from typing import Callable, Sequence
+from typing import Sequence, Tuple
 
 from app.components.auth.consts import ScopeEnum, RolePermissionsEnum, RoleEnum
-from app.configs import AuthConfig
 from app.containers import Container, container
 from app.components.auth.models import Auth
 from app.components.auth.exceptions import AuthException
-from app.components.accounts.models import Account
-from app.components.accounts.repo import AccountRepository
+from app.components.auth.scopes import (
+    compile_required_scopes,
+    compile_scopes,
+    is_granted
+)
+from app.components.auth.token_cache import TokenCache
+from app.components.accounts.cache import AccountCache, CachedAccount
 
 oauth2_scheme = OAuth2PasswordBearer(
     tokenUrl="auth/token",
@@ -31,6 +35,59 @@ oauth2_scheme = OAuth2PasswordBearer(
 )
 
 
+class ScopeChecker:
+    """
+    Authenticates the request and checks the token against the
+    required scopes, compiled into a mask once per set of scopes.
+    """
+
+    def __init__(self, scopes: Tuple[str, ...]):
+        self.scopes = scopes
+        # fails at import time on typos
+        self.required_mask = compile_required_scopes(scopes)
+
+    @inject
+    async def __call__(
+        self,
+        token: str = Depends(oauth2_scheme),
+        token_cache: TokenCache = Depends(Provide[Container.token_cache]),
+        account_cache: AccountCache = Depends(
+            Provide[Container.account_cache]
+        ),
+    ) -> CachedAccount:
+        credentials_exception = AuthException(
+            detail="Could not validate credentials",
+        )
+        if not token:
+            raise credentials_exception
+        try:
+            claims = token_cache.decode(token)
+        except JWTError:
+            raise credentials_exception
+        account_id = claims.account_id
+        if not is_granted(claims.scope_mask, self.required_mask):
+            required_scopes_left = {*self.scopes} - claims.scopes
+            logger.error(
+                f"Not enough permissions: {' '.join(required_scopes_left)} " \
+                f"account_id: {account_id}"
+            )
+            raise AuthException(
+                detail=(
+                    f"Not enough permissions: {' '.join(required_scopes_left)}"
+                )
+            )
+        account = await account_cache.get_account(account_id)
+        if account is None:
+            raise credentials_exception
+        return account
+
+
+@lru_cache(maxsize=None)
+def scope_checker(scopes: Tuple[str, ...]) -> ScopeChecker:
+    # one dependency per set of scopes, FastAPI caches it per request
+    return ScopeChecker(scopes)
+
+
 class Scopes(Security):
     def __init__(
         self,
@@ -39,82 +96,22 @@ class Scopes(Security):
         use_cache: bool = True,
     ):
         scopes = [scopes] if isinstance(scopes, str) else scopes
+        # plain strings, ScopeEnum members hash by name
+        scopes = tuple(
+            scope.value if isinstance(scope, ScopeEnum) else scope
+            for scope in scopes
+        )
         super().__init__(
-            dependency=check_auth,
-            scopes=scopes,
+            dependency=scope_checker(scopes),
+            scopes=list(scopes),
             use_cache=use_cache
         )
 
-@cached(ttl=60 * 5)  # 5 minutes ttl
-async def _get_account_cached(
-    account_id: int,
-    db_session: Callable = Depends(Provide[Container.db_session]),
-    account_repo: AccountRepository = Depends(
-        Provide[Container.accounts_repository]
-    ),
-) -> Account | None:
-    async with db_session() as tx:
-        return await account_repo.get_account(tx, account_id)
-
-@inject
-async def check_auth(
-    security_scopes: SecurityScopes,
-    token: str = Depends(oauth2_scheme),
-    config: AuthConfig = Depends(Provide[Container.config.provided.auth]),
-) -> Account:
-    credentials_exception = AuthException(
-        detail="Could not validate credentials",
-    )
-    if not token:
-        raise credentials_exception
-    try:
-        payload = jwt.decode(
-            token,
-            config.secret_key,
-            algorithms=[config.algorithm]
-        )
-    except JWTError:
-        raise credentials_exception
-    account_id = payload.get("account_id")
-    if account_id is None:
-        raise credentials_exception
-    token_scopes = payload.get("scopes")
-    if token_scopes is None:
-        raise credentials_exception
-    required_scopes_left = (
-        {*security_scopes.scopes} - {*token_scopes.split(" ")}
-    )
-    is_enough = check_scopes(token_scopes, " ".join(security_scopes.scopes))
-    if not is_enough:
-        logger.error(
-            f"Not enough permissions: {' '.join(required_scopes_left)} " \
-            f"account_id: {account_id}"
-        )
-        raise AuthException(
-            detail=f"Not enough permissions: {' '.join(required_scopes_left)}"
-        )
-    account = await _get_account_cached(account_id)
-    if account is None:
-        raise credentials_exception
-    return account
-
 def check_scopes(token_scopes: str, required_scopes: str) -> bool:
-    if token_scopes == "*:*":
-        return True
-    rscopes = required_scopes.split(" ")
-    for scope in token_scopes.split(" "):
-        if not rscopes:
-            return True
-        group, func = scope.split(":")
-        cur_rscope_i = 0
-        while cur_rscope_i < len(rscopes):
-            rgroup, rfunc = rscopes[cur_rscope_i].split(":")
-            if group not in ("*", rgroup) or func not in ("*", rfunc):
-                cur_rscope_i += 1
-            else:
-                del rscopes[cur_rscope_i]
-
-    return not rscopes
+    return is_granted(
+        compile_scopes(tuple(token_scopes.split(" "))),
+        compile_required_scopes(tuple(required_scopes.split(" ")))
+    )
 
 def find_role(auth: Auth) -> RoleEnum:
     for _role in RolePermissionsEnum:
@@ -1,3 +1,10 @@
 from sqlalchemy.orm import declarative_base
 
-Base = declarative_base()
+
+class _Base:
+    # server defaults (ids, created_at) come back with INSERT ... RETURNING
+    # instead of a SELECT per refreshed row
+    __mapper_args__ = {"eager_defaults": True}
+
+
+Base = declarative_base(cls=_Base)
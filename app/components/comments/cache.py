@@ -0,0 +1,113 @@
+from aiocache.base import BaseCache
+from loguru import logger
+from sqlalchemy.engine import Row
+from time import time_ns
+from typing import Callable
+
+from app.cache import LRUCache, TieredCache
+from app.components.comments.repo import CommentRepository
+from app.configs import CacheConfig
+from app.metrics import MetricsRegistry
+from app.pagination import CheckedPage
+
+
+class CommentListCache:
+    """
+    First pages of the comment lists by post, as anyone sees them.
+
+    Pages are keyed by a per-post version that is replaced on every
+    change, so a load that raced with a change ends up under a stale
+    key and is never served. Without a shared cache versions live in
+    process; with one they live there as well, and other processes
+    pick a change up within comment_lists_version_ttl.
+    """
+
+    def __init__(
+        self,
+        config: CacheConfig,
+        metrics: MetricsRegistry,
+        shared_cache: BaseCache | None,
+        comments_repository: CommentRepository,
+        db_session: Callable,
+    ):
+        self._pages: TieredCache[CheckedPage[Row]] = TieredCache(
+            "comments.lists",
+            metrics,
+            shared_cache,
+            max_size=config.comment_lists_size,
+            ttl=config.comment_lists_ttl,
+        )
+        version_ttl = config.comment_lists_ttl
+        if shared_cache is not None:
+            version_ttl = config.comment_lists_version_ttl
+        self._versions: LRUCache[int] = LRUCache(
+            "comments.lists.versions",
+            metrics,
+            max_size=config.comment_lists_size,
+            ttl=version_ttl,
+        )
+        self._shared = shared_cache
+        self._ttl = config.comment_lists_ttl
+        self._comments_repository = comments_repository
+        self._db_session = db_session
+
+    @staticmethod
+    def _version_key(post_id: int) -> str:
+        return f"comments.lists.version:{post_id}"
+
+    async def get_comments(
+        self,
+        post_id: int,
+        quantity: int
+    ) -> CheckedPage[Row]:
+        version = await self._version(post_id)
+        return await self._pages.get_or_load(
+            f"{post_id}:{quantity}:{version}",
+            lambda: self._load(post_id, quantity)
+        )
+
+    async def _load(
+        self,
+        post_id: int,
+        quantity: int
+    ) -> CheckedPage[Row]:
+        # master, a lagging replica could bring back what was just changed
+        async with self._db_session() as tx:
+            return await self._comments_repository.get_public_comments(
+                tx, post_id, quantity
+            )
+
+    async def _version(self, post_id: int) -> int:
+        version = self._versions.get(post_id)
+        if version is not None:
+            return version
+        # an unknown version is a new one, nothing was stored under it
+        version = time_ns()
+        if self._shared is not None:
+            key = self._version_key(post_id)
+            try:
+                shared = await self._shared.get(key)
+                if shared is None:
+                    await self._shared.add(key, version, ttl=int(self._ttl))
+                else:
+                    version = shared
+            except ValueError:
+                # added by another process meanwhile
+                version = await self._shared.get(key) or version
+            except Exception as e:
+                logger.warning(f"comments.lists version get failed: {e}")
+                return version
+        self._versions.set(post_id, version)
+        return version
+
+    async def invalidate(self, post_id: int) -> None:
+        version = time_ns()
+        self._versions.set(post_id, version)
+        if self._shared is None:
+            return
+        try:
+            await self._shared.set(
+                self._version_key(post_id), version, ttl=int(self._ttl)
+            )
+        except Exception as e:
+            logger.warning(f"comments.lists version set failed: {e}")
@@ -0,0 +1,24 @@
+import enum
+
+
+@enum.unique
+class BreakdownDimensionEnum(str, enum.Enum):
+    POST = "post_id"
+    ACCOUNT = "account_hex_id"
+
+
+# pg advisory lock held by the instance sealing comment_daily_stats
+DAILY_STATS_LOCK_ID = 7305_0001
+
+
+# what GetCommentResponse shows, lists and exports select only these
+COMMENT_COLUMNS = (
+    "id",
+    "created_at",
+    "account_hex_id",
+    "post_id",
+    "text",
+    "edited",
+    "pending",
+)
+EXPORT_COMMENT_COLUMNS = COMMENT_COLUMNS
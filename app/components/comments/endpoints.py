@@ -1,32 +1,64 @@
-import asyncio
 from dependency_injector.wiring import inject, Provide
-from fastapi import Depends, Path
+from fastapi import Depends, Header, Path, Response
+from fastapi.responses import StreamingResponse
 from fastapi_utils.cbv import cbv
 from fastapi_utils.inferring_router import InferringRouter
-from typing import Callable
+from loguru import logger
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Tuple
+)
 
-from app.components.accounts.models import Account
-from app.components.accounts.service import AccountService
+from app.components.accounts.cache import CachedAccount
 from app.components.auth.consts import ScopeEnum
 from app.components.auth.utils import Scopes
+from app.components.comments.consts import (
+    COMMENT_COLUMNS,
+    EXPORT_COMMENT_COLUMNS
+)
 from app.components.comments.models import Comment
 from app.components.comments.scheme import (
+    BreakdownSlice,
+    BulkCommentResult,
     CreateCommentRequest,
+    CreateCommentsBulkRequest,
+    CreateCommentsBulkResponse,
     DailyBreakdown,
     DeleteCommentResponse,
+    ExportCommentsBreakdownRequest,
+    ExportCommentsRequest,
     GetCommentRequest,
     GetCommentResponse,
     GetCommentsBreakdownRequest,
     GetCommentsBreakdownResponse,
     GetCommentsRequest,
     GetCommentsResponse,
-    UpdateCommentRequest
+    UpdateCommentRequest,
+    get_breakdown_request,
+    get_export_breakdown_request
 )
+from app.components.comments.scheduler import CommentScheduler
 from app.components.comments.service import CommentService
+from app.components.gemini.consts import ModerationTargetEnum
+from app.components.gemini.exceptions import (
+    GeminiUnavailableError,
+    moderation_exception
+)
+from app.components.gemini.moderation import ModerationQueue
 from app.components.gemini.service import GeminiService
+from app.components.posts.models import Post
 from app.components.posts.service import PostService
 from app.containers import Container, container
+from app.etag import etag_matches, make_etag, not_modified
 from app.exceptions import LogicError
+from app.export import MEDIA_TYPES, encode_rows
+from app.responses import page_response
 
 comments_router = InferringRouter()
 
@@ -36,9 +68,6 @@ class CommentsAPI:
     @inject
     def __init__(
         self,
-        accounts_service: AccountService = Depends(
-            Provide[Container.accounts_service]
-        ),
         comments_service: CommentService = Depends(
             Provide[Container.comments_service]
         ),
@@ -48,10 +77,17 @@ class CommentsAPI:
         posts_service: PostService = Depends(
             Provide[Container.posts_service]
         ),
+        moderation_queue: ModerationQueue = Depends(
+            Provide[Container.moderation_queue]
+        ),
+        comment_scheduler: CommentScheduler = Depends(
+            Provide[Container.comment_scheduler]
+        ),
     ):
-        self._accounts_service = accounts_service
         self._comments_service = comments_service
         self._gemini_service = gemini_service
+        self._moderation_queue = moderation_queue
+        self._comment_scheduler = comment_scheduler
         self._posts_service = posts_service
 
     @comments_router.post(
@@ -63,13 +99,14 @@ class CommentsAPI:
     async def create_comment(
         self,
         payload: CreateCommentRequest,
-        account: Account = Scopes(ScopeEnum.COMMENTS_CREATE),
+        account: CachedAccount = Scopes(ScopeEnum.COMMENTS_CREATE),
         db_session: Callable = Depends(Provide[Container.db_session]),
     ) -> GetCommentResponse:
         async with db_session() as tx:
             post = await self._posts_service.get_post(
                 tx,
-                payload.post_id
+                payload.post_id,
+                viewer_hex_id=account.hex_id
             )
             if not post:
                 raise LogicError(f"Post not found")
@@ -78,28 +115,103 @@ class CommentsAPI:
                 post_id=post.id,
                 text=payload.text
             )
+            if self._moderation_queue.deferred:
+                comment.pending = True
+                comment = await self._comments_service.add_comment(
+                    tx, comment
+                )
+        if comment.pending:
+            await self._moderation_queue.submit(
+                ModerationTargetEnum.COMMENT, comment.id
+            )
+            return GetCommentResponse.from_model(comment)
+
+        try:
             valid, message = await self._gemini_service.analyze_comment(
                 post, comment
             )
-            comment.banned = not valid
+        except GeminiUnavailableError as e:
+            raise moderation_exception(e)
+        comment.banned = not valid
+        async with db_session() as tx:
             if post.auto_comment_timeout is not None and message:
-                reply_comment = Comment(
-                    account_hex_id=post.account_hex_id,
-                    post_id=post.id,
-                    text=message,
-                )
-                asyncio.create_task(
-                    self._comments_service.add_delayed_comment(
-                        delay=post.auto_comment_timeout,
-                        comment=reply_comment,
-                        db_session=db_session
-                    )
-                )
+                await self._comment_scheduler.schedule(tx, post, message)
             comment = await self._comments_service.add_comment(tx, comment)
         if not valid:
             raise LogicError("Comment was banned!")
         return GetCommentResponse.from_model(comment)
 
+    @comments_router.post(
+        "/comments/bulk",
+        response_model=CreateCommentsBulkResponse,
+        description="Creates comments across posts, "\
+                    "returns a result for every item in the request order"
+    )
+    @inject
+    async def create_comments_bulk(
+        self,
+        payload: CreateCommentsBulkRequest,
+        account: CachedAccount = Scopes(ScopeEnum.COMMENTS_CREATE),
+        db_session: Callable = Depends(Provide[Container.db_session]),
+    ) -> CreateCommentsBulkResponse:
+        results = [
+            BulkCommentResult(index=index)
+            for index in range(len(payload.comments))
+        ]
+        async with db_session() as tx:
+            posts = await self._posts_service.get_posts_by_ids(
+                tx,
+                [item.post_id for item in payload.comments],
+                viewer_hex_id=account.hex_id
+            )
+
+        items: List[Tuple[int, Post, Comment]] = []
+        for index, item in enumerate(payload.comments):
+            post = posts.get(item.post_id)
+            if post is None:
+                results[index].error = "Post not found"
+                continue
+            items.append((index, post, Comment(
+                account_hex_id=account.hex_id,
+                post_id=post.id,
+                text=item.text,
+                pending=self._moderation_queue.deferred,
+            )))
+
+        replies: List[Tuple[Post, str]] = []
+        if not self._moderation_queue.deferred:
+            verdicts = await self._gemini_service.analyze_comments(
+                [(post, comment) for _, post, comment in items]
+            )
+            moderated = []
+            for (index, post, comment), verdict in zip(items, verdicts):
+                if isinstance(verdict, BaseException):
+                    logger.warning(f"Bulk comment moderation failed: {verdict}")
+                    results[index].error = "Moderation failed"
+                    continue
+                valid, message = verdict
+                comment.banned = not valid
+                if post.auto_comment_timeout is not None and message:
+                    replies.append((post, message))
+                moderated.append((index, post, comment))
+            items = moderated
+
+        async with db_session() as tx:
+            await self._comment_scheduler.schedule_many(tx, replies)
+            comments = await self._comments_service.add_comments(
+                tx, [comment for _, _, comment in items]
+            )
+        for (index, _, _), comment in zip(items, comments):
+            results[index].comment = GetCommentResponse.from_model(comment)
+            if comment.banned:
+                results[index].banned = True
+                results[index].error = "Comment was banned!"
+            elif comment.pending:
+                await self._moderation_queue.submit(
+                    ModerationTargetEnum.COMMENT, comment.id
+                )
+        return CreateCommentsBulkResponse(results=results)
+
     @comments_router.get(
         "/comment",
         response_model=GetCommentResponse,
@@ -109,13 +221,14 @@ class CommentsAPI:
     async def get_comment(
         self,
         payload: GetCommentRequest = Depends(),
-        account: Account = Scopes(ScopeEnum.COMMENTS_GET),
+        account: CachedAccount = Scopes(ScopeEnum.COMMENTS_GET),
         db_session: Callable = Depends(Provide[Container.db_session]),
     ) -> GetCommentResponse:
         async with db_session() as tx:
             comment = await self._comments_service.get_comment(
                 tx,
-                payload.comment_id
+                payload.comment_id,
+                viewer_hex_id=account.hex_id
             )
         if not comment:
             raise LogicError(f"Comment not found")
@@ -130,26 +243,23 @@ class CommentsAPI:
     async def get_comments(
         self,
         payload: GetCommentsRequest = Depends(),
-        account: Account = Scopes(ScopeEnum.COMMENTS_GET),
-        db_session: Callable = Depends(Provide[Container.db_session]),
-    ) -> GetCommentsResponse:
+        account: CachedAccount = Scopes(ScopeEnum.COMMENTS_GET),
+        db_session: Callable = Depends(Provide[Container.db_read_session]),
+        if_none_match: Optional[str] = Header(None),
+    ) -> GetCommentsResponse | Response:
         async with db_session() as tx:
-            post = await self._posts_service.get_post(tx, payload.post_id)
-            if not post:
-                raise LogicError(f"Post not found")
-            
-            if payload.owner_hex_id is not None:
-                comments_owner = await self._accounts_service.get_account(
-                    tx, account_hex_id=payload.owner_hex_id
-                )
-                if comments_owner is None:
-                    raise LogicError("Invalid owner id")
-                
-            comments = await self._comments_service.get_comments(tx, payload)
-        return GetCommentsResponse(
-            comments = [
-                GetCommentResponse.from_model(comment) for comment in comments
-            ]
+            page = await self._comments_service.get_comments(
+                tx, payload, viewer_hex_id=account.hex_id
+            )
+        etag = make_etag(page.items, GetCommentResponse, page.next_cursor)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        return page_response(
+            "comments",
+            page.items,
+            COMMENT_COLUMNS,
+            page.next_cursor,
+            headers={"ETag": etag}
         )
     
     @comments_router.get(
@@ -160,22 +270,98 @@ class CommentsAPI:
     @inject
     async def get_comments_daily_breakdown(
         self,
-        payload: GetCommentsBreakdownRequest = Depends(),
-        account: Account = Scopes(ScopeEnum.STATISTICS_GET),
-        db_session: Callable = Depends(Provide[Container.db_session]),
+        payload: GetCommentsBreakdownRequest = Depends(
+            get_breakdown_request
+        ),
+        account: CachedAccount = Scopes(ScopeEnum.STATISTICS_GET),
+        db_session: Callable = Depends(Provide[Container.db_read_session]),
     ) -> GetCommentsBreakdownResponse:
         async with db_session() as tx:
                 
             breakdown = await self._comments_service.get_comments_breakdown(
                 tx, payload
             )
+        report: Dict[str, DailyBreakdown] = {}
+        for row in breakdown:
+            day = report.setdefault(
+                row["date"].strftime("%Y-%m-%d"),
+                DailyBreakdown(created=0, blocked=0)
+            )
+            day.created += row["created"]
+            day.blocked += row["blocked"]
         return GetCommentsBreakdownResponse(
-            report = {
-                row["date"].strftime("%Y-%m-%d") : DailyBreakdown(
-                    created=row["created"],
-                    blocked=row["blocked"]
-                ) for row in breakdown
-            }
+            report=report,
+            slices=[
+                BreakdownSlice(**row) for row in breakdown
+            ] if payload.group_by else []
+        )
+
+    @comments_router.get(
+        "/comments/export",
+        response_class=StreamingResponse,
+        description="Streams all comments of a post as ndjson or csv"
+    )
+    @inject
+    async def export_comments(
+        self,
+        payload: ExportCommentsRequest = Depends(),
+        account: CachedAccount = Scopes(ScopeEnum.COMMENTS_GET),
+        db_session: Callable = Depends(Provide[Container.db_read_session]),
+    ) -> StreamingResponse:
+        async with db_session() as tx:
+            post = await self._posts_service.get_post(
+                tx, payload.post_id, viewer_hex_id=account.hex_id
+            )
+        if not post:
+            raise LogicError(f"Post not found")
+
+        async def rows() -> AsyncIterator[Mapping[str, Any]]:
+            async with db_session() as tx:
+                async for row in self._comments_service.stream_comments(
+                    tx,
+                    payload.post_id,
+                    owner_hex_id=payload.owner_hex_id,
+                    viewer_hex_id=account.hex_id
+                ):
+                    yield row
+
+        return StreamingResponse(
+            encode_rows(rows(), payload.format, EXPORT_COMMENT_COLUMNS),
+            media_type=MEDIA_TYPES[payload.format]
+        )
+
+    @comments_router.get(
+        "/comments-daily-breakdown/export",
+        response_class=StreamingResponse,
+        description="Streams the daily breakdown as ndjson or csv"
+    )
+    @inject
+    async def export_comments_daily_breakdown(
+        self,
+        payload: ExportCommentsBreakdownRequest = Depends(
+            get_export_breakdown_request
+        ),
+        account: CachedAccount = Scopes(ScopeEnum.STATISTICS_GET),
+        db_session: Callable = Depends(Provide[Container.db_read_session]),
+    ) -> StreamingResponse:
+        columns = [
+            "date",
+            *(dimension.value for dimension in payload.group_by),
+            "created",
+            "blocked",
+        ]
+
+        async def rows() -> AsyncIterator[Mapping[str, Any]]:
+            async with db_session() as tx:
+                service = self._comments_service
+                async for row in service.stream_comments_breakdown(
+                    tx, payload
+                ):
+                    yield row
+
+        return StreamingResponse(
+            encode_rows(rows(), payload.format, columns),
+            media_type=MEDIA_TYPES[payload.format]
         )
 
     @comments_router.put(
@@ -187,7 +373,7 @@ class CommentsAPI:
     async def update_comment(
         self,
         payload: UpdateCommentRequest,
-        account: Account = Scopes(ScopeEnum.COMMENTS_UPDATE),
+        account: CachedAccount = Scopes(ScopeEnum.COMMENTS_UPDATE),
         db_session: Callable = Depends(Provide[Container.db_session]),
     ) -> GetCommentResponse:
         async with db_session() as tx:
@@ -197,11 +383,15 @@ class CommentsAPI:
             )
             if comment is None:
                 raise LogicError(f"Comment not found")
-            valid, _ = await self._gemini_service.analyze_text(
-                f"COMMENT: {payload.text}")
-            comment.banned = not valid
-            comment.text = payload.text
-            comment.edited = True
+            try:
+                valid, _ = await self._gemini_service.analyze_text(
+                    f"COMMENT: {payload.text}", subject=payload.text
+                )
+            except GeminiUnavailableError as e:
+                raise moderation_exception(e)
+            comment = await self._comments_service.update_comment(
+                tx, comment, payload.text, banned=not valid
+            )
         if not valid:
             raise LogicError("Comment was banned!")
         return GetCommentResponse.from_model(comment)
@@ -218,7 +408,7 @@ class CommentsAPI:
             ..., 
             title="Unique id that corresponds to comment."
         ),
-        account: Account = Scopes(ScopeEnum.COMMENTS_DELETE),
+        account: CachedAccount = Scopes(ScopeEnum.COMMENTS_DELETE),
         db_session: Callable = Depends(Provide[Container.db_session]),
     ) -> DeleteCommentResponse:
         async with db_session() as tx:
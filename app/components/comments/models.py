@@ -1,5 +1,17 @@
-from datetime import datetime
-from sqlalchemy import Boolean, Column, DateTime, Integer, String, ForeignKey
+from datetime import date, datetime
+from sqlalchemy import (
+    DDL,
+    Boolean,
+    Column,
+    Date,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    event
+)
+from sqlalchemy.sql import false, true
 
 from app.components.base.models import Base
 from app.database import UTCNow
@@ -31,3 +43,160 @@ class Comment(Base):
     banned: bool = Column(
         Boolean, nullable=False, default=False
     )
+    pending: bool = Column(
+        Boolean, nullable=False, default=False, server_default=false()
+    )
+
+
+
+# match the filters and the order of CommentRepository.get_comments_query
+Index(
+    "ix_comments_post_id_created_at",
+    Comment.post_id, Comment.created_at.desc(), Comment.id.desc(),
+    postgresql_where=Comment.banned == false(),
+)
+Index(
+    "ix_comments_post_id_account_hex_id_created_at",
+    Comment.post_id,
+    Comment.account_hex_id,
+    Comment.created_at.desc(),
+    Comment.id.desc(),
+    postgresql_where=Comment.banned == false(),
+)
+# date range scans of the daily breakdown
+Index("ix_comments_created_at", Comment.created_at)
+Index(
+    "ix_comments_pending",
+    Comment.id,
+    postgresql_where=Comment.pending == true(),
+)
+
+
+class ScheduledComment(Base):
+    """
+    Comment to be published at due_at, e.g. a post auto reply.
+    """
+    __tablename__ = "scheduled_comments"
+
+    id: int | None = Column(
+        Integer, primary_key=True, nullable=False, unique=True
+    )
+    due_at: datetime = Column(
+        DateTime, nullable=False, index=True
+    )
+    account_hex_id: str = Column(
+        String(32), ForeignKey("accounts.hex_id", ondelete="cascade"),
+        nullable=False
+    )
+    post_id: int = Column(
+        Integer, ForeignKey("posts.id", ondelete="cascade"),
+        nullable=False
+    )
+    text: str = Column(
+        String, nullable=False
+    )
+
+
+class CommentDailyStats(Base):
+    """
+    Per day rollup for the comments breakdown. A row is written once
+    the day is over ("sealed"), the comments_daily_stats trigger keeps
+    sealed rows in line with later bans and deletes.
+    """
+    __tablename__ = "comment_daily_stats"
+
+    date: date = Column(
+        Date, primary_key=True, nullable=False
+    )
+    created: int = Column(
+        Integer, nullable=False, default=0
+    )
+    blocked: int = Column(
+        Integer, nullable=False, default=0
+    )
+
+
+class CommentDailyDimStats(Base):
+    """
+    Same rollup sliced by post and author, sealed together with
+    comment_daily_stats.
+    """
+    __tablename__ = "comment_daily_dim_stats"
+
+    date: date = Column(
+        Date, primary_key=True, nullable=False
+    )
+    post_id: int = Column(
+        Integer, primary_key=True, nullable=False
+    )
+    account_hex_id: str = Column(
+        String(32), primary_key=True, nullable=False
+    )
+    created: int = Column(
+        Integer, nullable=False, default=0
+    )
+    blocked: int = Column(
+        Integer, nullable=False, default=0
+    )
+
+
+Index(
+    "ix_comment_daily_dim_stats_post_id_date",
+    CommentDailyDimStats.post_id, CommentDailyDimStats.date,
+)
+Index(
+    "ix_comment_daily_dim_stats_account_hex_id_date",
+    CommentDailyDimStats.account_hex_id, CommentDailyDimStats.date,
+)
+
+
+# Only rows of sealed days are updated, unsealed days are read live,
+# so inserts of today's comments never contend on a stats row.
+# Rows written before a day is sealed are counted by the seal itself,
+# see CommentRepository.seal_daily_stats.
+COMMENT_DAILY_STATS_TRIGGER = """
+CREATE OR REPLACE FUNCTION comment_daily_stats_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+        AND OLD.banned = NEW.banned
+        AND OLD.created_at = NEW.created_at THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE comment_daily_stats
+        SET created = created - (NOT OLD.banned)::int,
+            blocked = blocked - OLD.banned::int
+        WHERE date = OLD.created_at::date;
+        UPDATE comment_daily_dim_stats
+        SET created = created - (NOT OLD.banned)::int,
+            blocked = blocked - OLD.banned::int
+        WHERE date = OLD.created_at::date
+            AND post_id = OLD.post_id
+            AND account_hex_id = OLD.account_hex_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE comment_daily_stats
+        SET created = created + (NOT NEW.banned)::int,
+            blocked = blocked + NEW.banned::int
+        WHERE date = NEW.created_at::date;
+        UPDATE comment_daily_dim_stats
+        SET created = created + (NOT NEW.banned)::int,
+            blocked = blocked + NEW.banned::int
+        WHERE date = NEW.created_at::date
+            AND post_id = NEW.post_id
+            AND account_hex_id = NEW.account_hex_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER comments_daily_stats
+AFTER INSERT OR DELETE OR UPDATE OF banned, created_at ON comments
+FOR EACH ROW EXECUTE FUNCTION comment_daily_stats_apply();
+"""
+
+event.listen(
+    Comment.__table__,
+    "after_create",
+    DDL(COMMENT_DAILY_STATS_TRIGGER).execute_if(dialect="postgresql")
+)
@@ -1,11 +1,52 @@
-from datetime import datetime
-from sqlalchemy import desc, func, select, and_, case
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import (
+    and_,
+    case,
+    delete,
+    desc,
+    exists,
+    func,
+    insert,
+    or_,
+    select,
+    text,
+    true,
+    tuple_,
+    update
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Row
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql import Select
 from sqlmodel.ext.asyncio.session import AsyncSession
-from typing import Optional, List, Dict
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Sequence
+)
 
-from app.components.comments.models import Comment
+from app.components.accounts.models import Account
+from app.components.comments.consts import (
+    COMMENT_COLUMNS,
+    DAILY_STATS_LOCK_ID,
+    EXPORT_COMMENT_COLUMNS,
+    BreakdownDimensionEnum
+)
+from app.components.comments.models import (
+    Comment,
+    CommentDailyDimStats,
+    CommentDailyStats,
+    ScheduledComment
+)
+from app.components.posts.models import Post
+from app.components.posts.repo import PostRepository
+from app.constants import EXPORT_BATCH_SIZE
 from app.exceptions import LogicError
+from app.pagination import CheckedPage, Cursor, fetch_checked_page
 
 
 class CommentRepository:
@@ -16,15 +57,44 @@ class CommentRepository:
             await tx.flush()
         except IntegrityError:
             raise LogicError("Invalid comment data")
-        await tx.commit()
-        await tx.refresh(comment)
         return comment
 
+    @staticmethod
+    async def add_comments_returning(
+        tx: AsyncSession,
+        comments: Sequence[Dict[str, Any]]
+    ) -> List[Comment]:
+        """
+        Inserts all comments with one INSERT ... RETURNING,
+        in the order they were given.
+        """
+        if not comments:
+            return []
+        try:
+            raw = await tx.scalars(
+                insert(Comment).returning(Comment, sort_by_parameter_order=True),
+                comments
+            )
+        except IntegrityError:
+            raise LogicError("Invalid comment data")
+        return raw.all()
+
+    @staticmethod
+    def visible_to(viewer_hex_id: Optional[str]):
+        """
+        Comments waiting for moderation are shown to their owners only.
+        """
+        return or_(
+            Comment.pending == False,
+            Comment.account_hex_id == viewer_hex_id
+        )
+
     @staticmethod
     async def get_comment(
         tx: AsyncSession, 
         comment_id: int, 
-        owner_hex_id: Optional[str] = None
+        owner_hex_id: Optional[str] = None,
+        viewer_hex_id: Optional[str] = None,
     ) -> Comment | None:
         q = select(Comment).where(and_(
             Comment.id == comment_id,
@@ -32,37 +102,127 @@ class CommentRepository:
         ))
         if owner_hex_id is not None:
             q = q.where(Comment.account_hex_id == owner_hex_id)
+        if viewer_hex_id is not None:
+            q = q.where(CommentRepository.visible_to(viewer_hex_id))
         raw = await tx.execute(q)
         return raw.scalar_one_or_none()
     
     @staticmethod
-    async def get_comments(
-        tx: AsyncSession, 
+    def get_comments_query(
         post_id: int, 
-        quantity: int,
+        quantity: Optional[int],
         account_hex_id: Optional[str] = None, 
-    ) -> List[Comment]:
+        viewer_hex_id: Optional[str] = None,
+        after: Optional[Cursor] = None,
+    ) -> Select:
+        """
+        Served by the ix_comments_post_*_created_at partial indexes,
+        keep the filters and the order in line with them.
+        """
         q = select(Comment).where(and_(
             Comment.post_id == post_id,
-            Comment.banned == False
+            Comment.banned == False,
+            CommentRepository.visible_to(viewer_hex_id)
         ))
 
         if account_hex_id is not None:
             q = q.where(Comment.account_hex_id == account_hex_id)
+        if after is not None:
+            q = q.where(
+                tuple_(Comment.created_at, Comment.id)
+                < tuple_(after.created_at, after.id)
+            )
 
-        q = q.order_by(desc(Comment.created_at)).limit(quantity)
-        raw = await tx.execute(q)
-        return raw.scalars().all()
+        q = q.order_by(desc(Comment.created_at), desc(Comment.id))
+        if quantity is not None:
+            q = q.limit(quantity)
+        return q
 
     @staticmethod
-    async def get_comments_breakdown(
+    def get_comments_export_query(
+        post_id: int,
+        account_hex_id: Optional[str] = None,
+        viewer_hex_id: Optional[str] = None,
+    ) -> Select:
+        return CommentRepository.get_comments_query(
+            post_id, None, account_hex_id, viewer_hex_id
+        ).with_only_columns(
+            *(getattr(Comment, column) for column in EXPORT_COMMENT_COLUMNS)
+        )
+
+    @staticmethod
+    async def get_comments(
+        tx: AsyncSession, 
+        post_id: int, 
+        quantity: int,
+        account_hex_id: Optional[str] = None, 
+        viewer_hex_id: Optional[str] = None,
+        after: Optional[Cursor] = None,
+    ) -> CheckedPage[Row]:
+        """
+        Rows of COMMENT_COLUMNS. Also checks that the post is there
+        for the viewer and the owner account exists, in the same
+        statement.
+        """
+        q = CommentRepository.get_comments_query(
+            post_id, quantity, account_hex_id, viewer_hex_id, after
+        ).with_only_columns(
+            *(getattr(Comment, column) for column in COMMENT_COLUMNS)
+        )
+        post = exists().where(and_(Post.id == post_id, Post.banned == False))
+        if viewer_hex_id is not None:
+            post = post.where(PostRepository.visible_to(viewer_hex_id))
+        owner = true()
+        if account_hex_id is not None:
+            owner = exists().where(Account.hex_id == account_hex_id)
+        return await fetch_checked_page(tx, q, post=post, owner=owner)
+
+    @staticmethod
+    async def get_public_comments(
         tx: AsyncSession,
+        post_id: int,
+        quantity: int,
+    ) -> CheckedPage[Row]:
+        """
+        The page as anyone sees it. The pending check tells whether
+        some viewers would see more, i.e. their own comments that are
+        waiting for moderation.
+        """
+        q = CommentRepository.get_comments_query(
+            post_id, quantity
+        ).with_only_columns(
+            *(getattr(Comment, column) for column in COMMENT_COLUMNS)
+        )
+        post = exists().where(and_(
+            Post.id == post_id,
+            Post.banned == False,
+            Post.pending == False
+        ))
+        pending = exists().where(and_(
+            Comment.post_id == post_id,
+            Comment.pending == True
+        ))
+        return await fetch_checked_page(tx, q, post=post, pending=pending)
+
+    @staticmethod
+    def get_comments_breakdown_query(
         date_from: Optional[datetime] = None,
-        date_to: Optional[datetime] = None
-    ) -> List[Dict]:
+        date_to: Optional[datetime] = None,
+        date_before: Optional[datetime] = None,
+        post_id: Optional[int] = None,
+        account_hex_id: Optional[str] = None,
+        group_by: Sequence[BreakdownDimensionEnum] = (),
+    ) -> Select:
+        """
+        Live per day counts, date_to is inclusive, date_before is not.
+        """
+        dimensions = [
+            getattr(Comment, dimension.value) for dimension in group_by
+        ]
         q = (
             select(
                 func.date(Comment.created_at).label("date"),
+                *dimensions,
                 func.sum(
                     case(
                         (Comment.banned == False, 1),
@@ -85,10 +245,243 @@ class CommentRepository:
             q = q.where(
                 Comment.created_at <= date_to
             )
-        q = q.group_by(func.date(Comment.created_at)).order_by("date")
+        if date_before:
+            q = q.where(
+                Comment.created_at < date_before
+            )
+        if post_id is not None:
+            q = q.where(Comment.post_id == post_id)
+        if account_hex_id is not None:
+            q = q.where(Comment.account_hex_id == account_hex_id)
+        return q.group_by(
+            func.date(Comment.created_at), *dimensions
+        ).order_by("date", *dimensions)
+
+    @staticmethod
+    def get_daily_stats_query(
+        date_from: Optional[date] = None,
+        date_before: Optional[date] = None,
+        post_id: Optional[int] = None,
+        account_hex_id: Optional[str] = None,
+        group_by: Sequence[BreakdownDimensionEnum] = (),
+    ) -> Select:
+        """
+        Sealed per day counts. Unsliced reports read the per day table,
+        the rest is summed up from the per post and author one.
+        """
+        if post_id is None and account_hex_id is None and not group_by:
+            q = select(
+                CommentDailyStats.date,
+                CommentDailyStats.created,
+                CommentDailyStats.blocked,
+            )
+            if date_from:
+                q = q.where(CommentDailyStats.date >= date_from)
+            if date_before:
+                q = q.where(CommentDailyStats.date < date_before)
+            return q.order_by(CommentDailyStats.date)
+
+        stats = CommentDailyDimStats
+        dimensions = [
+            getattr(stats, dimension.value) for dimension in group_by
+        ]
+        q = select(
+            stats.date,
+            *dimensions,
+            func.sum(stats.created).label("created"),
+            func.sum(stats.blocked).label("blocked"),
+        )
+        if date_from:
+            q = q.where(stats.date >= date_from)
+        if date_before:
+            q = q.where(stats.date < date_before)
+        if post_id is not None:
+            q = q.where(stats.post_id == post_id)
+        if account_hex_id is not None:
+            q = q.where(stats.account_hex_id == account_hex_id)
+        return q.group_by(stats.date, *dimensions).order_by(
+            stats.date, *dimensions
+        )
+
+    @staticmethod
+    async def stream_rows(
+        tx: AsyncSession,
+        q: Select,
+        batch_size: int = EXPORT_BATCH_SIZE
+    ) -> AsyncIterator[Mapping[str, Any]]:
+        """
+        Iterates over the rows of q through a server-side cursor,
+        batch_size rows are held in memory at a time.
+        """
+        raw = await tx.stream(
+            q.execution_options(yield_per=batch_size)
+        )
+        async for row in raw.mappings():
+            yield row
+
+    @staticmethod
+    async def get_daily_stats_watermark(tx: AsyncSession) -> date | None:
+        """
+        Last sealed day, days after it are not in the rollup yet.
+        """
+        raw = await tx.execute(select(func.max(CommentDailyStats.date)))
+        return raw.scalar_one_or_none()
+
+    @staticmethod
+    async def delete_daily_stats(tx: AsyncSession) -> None:
+        await tx.execute(delete(CommentDailyDimStats))
+        await tx.execute(delete(CommentDailyStats))
+
+    @staticmethod
+    async def get_first_comment_date(tx: AsyncSession) -> date | None:
+        raw = await tx.execute(select(func.min(Comment.created_at)))
+        first = raw.scalar_one_or_none()
+        return first.date() if first is not None else None
+
+    @staticmethod
+    async def try_lock_daily_stats(tx: AsyncSession) -> bool:
+        """
+        Only one instance seals at a time, the lock is released
+        with the transaction.
+        """
+        raw = await tx.execute(
+            select(func.pg_try_advisory_xact_lock(DAILY_STATS_LOCK_ID))
+        )
+        return bool(raw.scalar_one())
+
+    @staticmethod
+    async def seal_daily_stats(
+        tx: AsyncSession,
+        date_from: date,
+        date_before: date
+    ) -> int:
+        """
+        Writes rollup rows for the days in [date_from, date_before),
+        days without comments get zero rows so the watermark moves on.
+        The share lock on comments waits for the writers in flight, so
+        a comment of a sealed day that commits late is counted, and the
+        lock on the rollup makes trigger updates of these days wait for
+        the commit, so none of them is lost in between. Comments are
+        locked first, the order the trigger takes the locks in. Writes
+        to comments wait for the whole transaction, so keep the range
+        short, CommentService seals a day at a time.
+        """
+        if date_from >= date_before:
+            return 0
+        await tx.execute(text("LOCK TABLE comments IN SHARE MODE"))
+        await tx.execute(text(
+            "LOCK TABLE comment_daily_stats, comment_daily_dim_stats "
+            "IN SHARE ROW EXCLUSIVE MODE"
+        ))
+        q = CommentRepository.get_comments_breakdown_query(
+            date_from=datetime.combine(date_from, time.min),
+            date_before=datetime.combine(date_before, time.min),
+            group_by=list(BreakdownDimensionEnum),
+        )
+        slices = (await tx.execute(q)).mappings().all()
+        days = (date_before - date_from).days
+        by_date = {
+            date_from + timedelta(days=offset): {"created": 0, "blocked": 0}
+            for offset in range(days)
+        }
+        for row in slices:
+            by_date[row["date"]]["created"] += row["created"]
+            by_date[row["date"]]["blocked"] += row["blocked"]
+
+        q = pg_insert(CommentDailyStats).on_conflict_do_nothing(
+            index_elements=[CommentDailyStats.date]
+        )
+        await tx.execute(q, [
+            {"date": day, **counts} for day, counts in by_date.items()
+        ])
+        if slices:
+            q = pg_insert(CommentDailyDimStats).on_conflict_do_nothing()
+            await tx.execute(q, [dict(row) for row in slices])
+        return days
+
+    @staticmethod
+    async def get_pending_comment_ids(tx: AsyncSession) -> List[int]:
+        q = (
+            select(Comment.id)
+            .where(Comment.pending == True)
+            .order_by(Comment.id)
+        )
+        raw = await tx.execute(q)
+        return raw.scalars().all()
+
+    @staticmethod
+    async def set_moderation_result(
+        tx: AsyncSession,
+        comment_id: int,
+        banned: bool
+    ) -> int | None:
+        """
+        Resolves a pending comment and returns its post id, None if it
+        was already resolved (e.g. re-moderated by an update) or deleted.
+        """
+        q = (
+            update(Comment)
+            .where(and_(Comment.id == comment_id, Comment.pending == True))
+            .values(banned=banned, pending=False)
+            .returning(Comment.post_id)
+        )
+        raw = await tx.execute(q)
+        return raw.scalar_one_or_none()
+
+    @staticmethod
+    async def add_scheduled_comments(
+        tx: AsyncSession,
+        scheduled: Sequence[Dict[str, Any]]
+    ) -> None:
+        if not scheduled:
+            return
+        await tx.execute(insert(ScheduledComment), scheduled)
+
+    @staticmethod
+    async def pop_due_scheduled_comments(
+        tx: AsyncSession,
+        now: datetime,
+        limit: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Deletes and returns up to limit rows due by now. Rows locked by
+        another transaction are skipped, so concurrent schedulers never
+        pick the same row.
+        """
+        due = (
+            select(ScheduledComment.id)
+            .where(ScheduledComment.due_at <= now)
+            .order_by(ScheduledComment.due_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        q = (
+            delete(ScheduledComment)
+            .where(ScheduledComment.id.in_(due.scalar_subquery()))
+            .returning(
+                ScheduledComment.due_at,
+                ScheduledComment.account_hex_id,
+                ScheduledComment.post_id,
+                ScheduledComment.text,
+            )
+        )
         raw = await tx.execute(q)
         return raw.mappings().all()
 
+    @staticmethod
+    async def get_next_scheduled_at(tx: AsyncSession) -> datetime | None:
+        raw = await tx.execute(select(func.min(ScheduledComment.due_at)))
+        return raw.scalar_one_or_none()
+
+    @staticmethod
+    async def add_comments(
+        tx: AsyncSession,
+        comments: Sequence[Dict[str, Any]]
+    ) -> None:
+        if not comments:
+            return
+        await tx.execute(insert(Comment), comments)
+
     @staticmethod
     async def delete_comment(tx: AsyncSession, comment: Comment) -> None:
         await tx.delete(comment)
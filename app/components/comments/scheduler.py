@@ -0,0 +1,144 @@
+import asyncio
+
+from datetime import datetime
+from loguru import logger
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Callable, Sequence, Tuple
+
+from app.components.comments.service import CommentService
+from app.components.posts.models import Post
+from app.configs import CommentsConfig
+from app.database import after_commit
+from app.metrics import MetricsRegistry
+
+
+class CommentScheduler:
+    """
+    Publishes scheduled comments (post auto replies) when they are due.
+
+    Pending replies live in the scheduled_comments table, the due_at
+    index keeps them ordered, so only the earliest due time is held in
+    memory however many replies are waiting. Due rows are moved into
+    comments in batches, which also picks up whatever was left behind
+    by a restart.
+    """
+
+    def __init__(
+        self,
+        config: CommentsConfig,
+        metrics: MetricsRegistry,
+        comments_service: CommentService,
+        db_session: Callable,
+    ):
+        self._config = config
+        self._comments_service = comments_service
+        self._db_session = db_session
+        self._task: asyncio.Task | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._next_due: datetime | None = None
+        self._scheduled = metrics.counter("scheduler.scheduled")
+        self._delivered = metrics.counter("scheduler.delivered")
+        self._errors = metrics.counter("scheduler.errors")
+        self._lag = metrics.histogram("scheduler.lag_ms")
+
+    async def schedule(
+        self,
+        tx: AsyncSession,
+        post: Post,
+        message: str
+    ) -> None:
+        """
+        Schedules the post auto reply within the caller's transaction,
+        the delivery loop is started on first use.
+        """
+        await self.schedule_many(tx, [(post, message)])
+
+    async def schedule_many(
+        self,
+        tx: AsyncSession,
+        replies: Sequence[Tuple[Post, str]]
+    ) -> None:
+        if not replies:
+            return
+        due = await self._comments_service.schedule_auto_replies(
+            tx, replies
+        )
+        self._scheduled.inc(len(due))
+        self._ensure_started()
+        # the loop must not look for the replies before they are committed
+        after_commit(tx, lambda due_at=min(due): self._wake(due_at))
+
+    async def _wake(self, due_at: datetime) -> None:
+        if self._next_due is not None and self._next_due <= due_at:
+            return
+        self._next_due = due_at
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._loop is not loop:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def start(self) -> None:
+        await self.stop()
+        self._ensure_started()
+
+    async def stop(self) -> None:
+        # a task of another, finished loop can't be awaited from this one
+        if (
+            self._task is not None
+            and self._loop is asyncio.get_running_loop()
+        ):
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._wakeup = None
+        self._loop = None
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            # replies scheduled from now on lower it again via _wake
+            self._next_due = None
+            try:
+                await self._deliver_due()
+                async with self._db_session() as tx:
+                    stored_due = (
+                        await self._comments_service.get_next_scheduled_at(tx)
+                    )
+                if stored_due is not None and (
+                    self._next_due is None or stored_due < self._next_due
+                ):
+                    self._next_due = stored_due
+            except Exception as e:
+                self._errors.inc()
+                logger.exception(f"Scheduled comments delivery failed: {e}")
+
+            timeout = self._config.scheduler_poll_interval
+            if self._next_due is not None:
+                until_due = (
+                    self._next_due - datetime.utcnow()
+                ).total_seconds()
+                timeout = max(min(timeout, until_due), 0)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _deliver_due(self) -> None:
+        batch_size = self._config.scheduler_batch_size
+        while True:
+            now = datetime.utcnow()
+            async with self._db_session() as tx:
+                due = await self._comments_service.deliver_due_comments(
+                    tx, now, batch_size
+                )
+            for due_at in due:
+                self._lag.observe((now - due_at).total_seconds() * 1000)
+            self._delivered.inc(len(due))
+            if len(due) < batch_size:
+                return
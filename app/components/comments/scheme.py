@@ -1,8 +1,13 @@
-from datetime import datetime
-from pydantic import BaseModel, Field
+from datetime import date, datetime
+from fastapi import Depends, Query
+from pydantic import BaseModel, Field, field_validator
 from typing import List, Optional
 
+from app.constants import BULK_COMMENTS_SIZE, PAGINATION_SIZE
+
+from app.components.comments.consts import BreakdownDimensionEnum
 from app.components.comments.models import Comment
+from app.export import ExportFormatEnum
 
 
 class CreateCommentRequest(BaseModel):
@@ -13,6 +18,13 @@ class CreateCommentRequest(BaseModel):
     )
 
 
+class CreateCommentsBulkRequest(BaseModel):
+    comments: List[CreateCommentRequest] = Field(
+        ..., min_length=1, max_length=BULK_COMMENTS_SIZE,
+        description="Comments to create, they may target different posts"
+    )
+
+
 class GetCommentRequest(BaseModel):
     comment_id: int = Field(..., gt=0, description="Unical ID of the comment")
 
@@ -22,22 +34,87 @@ class GetCommentsRequest(BaseModel):
         ..., description="ID to fetch comments by post"
     )
     quantity: Optional[int] = Field(
-        50, ge=1, le=100,
+        50, ge=1, le=PAGINATION_SIZE,
         description="Number of comments to retrieve, "\
                     "default is 50 if not provided.")
     owner_hex_id: Optional[str] = Field(
-        None, pattern=r'^[a-fA-F0-9]{16}$',
+        None, pattern=r'^[a-fA-F0-9]{32}$',
         description="Owner's hexadecimal ID."
     )
+    cursor: Optional[str] = Field(
+        None, max_length=128,
+        description="next_cursor of the previous page, "\
+                    "the first page is returned if not provided."
+    )
 
 
-class GetCommentsBreakdownRequest(BaseModel):
+class CommentsBreakdownFilters(BaseModel):
     date_from: Optional[datetime] = Field(
         None, description="Start date for sorting comments."
     )
     date_to: Optional[datetime] = Field(
         None, description="End date for sorting comments."
     )
+    post_id: Optional[int] = Field(
+        None, gt=0, description="Count comments of this post only."
+    )
+    account_hex_id: Optional[str] = Field(
+        None, pattern=r'^[a-fA-F0-9]{32}$',
+        description="Count comments of this author only."
+    )
+
+
+class GetCommentsBreakdownRequest(CommentsBreakdownFilters):
+    group_by: List[BreakdownDimensionEnum] = Field(
+        [], description="Slice every day by these dimensions."
+    )
+
+    @field_validator("group_by")
+    @classmethod
+    def unique_group_by(
+        cls, value: List[BreakdownDimensionEnum]
+    ) -> List[BreakdownDimensionEnum]:
+        # a repeated dimension would be a repeated column
+        return list(dict.fromkeys(value))
+
+
+def get_breakdown_request(
+    filters: CommentsBreakdownFilters = Depends(),
+    group_by: List[BreakdownDimensionEnum] = Query(
+        [], description="Slice every day by these dimensions."
+    ),
+) -> GetCommentsBreakdownRequest:
+    return GetCommentsBreakdownRequest(
+        **filters.model_dump(), group_by=group_by
+    )
+
+
+class ExportCommentsRequest(BaseModel):
+    post_id: int = Field(..., gt=0, description="ID to export comments by post")
+    owner_hex_id: Optional[str] = Field(
+        None, pattern=r'^[a-fA-F0-9]{32}$',
+        description="Owner's hexadecimal ID."
+    )
+    format: ExportFormatEnum = Field(
+        ExportFormatEnum.NDJSON, description="ndjson or csv"
+    )
+
+
+class ExportCommentsBreakdownRequest(GetCommentsBreakdownRequest):
+    format: ExportFormatEnum = Field(
+        ExportFormatEnum.NDJSON, description="ndjson or csv"
+    )
+
+
+def get_export_breakdown_request(
+    payload: GetCommentsBreakdownRequest = Depends(get_breakdown_request),
+    format: ExportFormatEnum = Query(
+        ExportFormatEnum.NDJSON, description="ndjson or csv"
+    ),
+) -> ExportCommentsBreakdownRequest:
+    return ExportCommentsBreakdownRequest(
+        **payload.model_dump(), format=format
+    )
 
 
 class UpdateCommentRequest(BaseModel):
@@ -54,6 +131,7 @@ class GetCommentResponse(BaseModel):
     post_id: int
     text: str
     edited: bool
+    pending: bool = False
 
     @classmethod
     def from_model(cls, model: Comment) -> "GetCommentResponse":
@@ -64,11 +142,24 @@ class GetCommentResponse(BaseModel):
             post_id=model.post_id,
             text=model.text,
             edited=model.edited,
+            pending=bool(model.pending),
         )
 
 
+class BulkCommentResult(BaseModel):
+    index: int = Field(..., description="Position in the request")
+    comment: Optional[GetCommentResponse] = None
+    banned: bool = False
+    error: Optional[str] = None
+
+
+class CreateCommentsBulkResponse(BaseModel):
+    results: List[BulkCommentResult]
+
+
 class GetCommentsResponse(BaseModel):
     comments: List[GetCommentResponse]
+    next_cursor: Optional[str] = None
 
 
 class DailyBreakdown(BaseModel):
@@ -76,8 +167,15 @@ class DailyBreakdown(BaseModel):
     blocked: int
 
 
+class BreakdownSlice(DailyBreakdown):
+    date: date
+    post_id: Optional[int] = None
+    account_hex_id: Optional[str] = None
+
+
 class GetCommentsBreakdownResponse(BaseModel):
     report: dict[str, DailyBreakdown]
+    slices: List[BreakdownSlice] = []
 
 
 class DeleteCommentResponse(BaseModel):
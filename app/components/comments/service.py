@@ -1,81 +1,337 @@
-import asyncio
-
-from datetime import datetime
+from datetime import date, datetime, time, timedelta
+from sqlalchemy.engine import Row
 from sqlmodel.ext.asyncio.session import AsyncSession
-from typing import Optional, List, Dict, Callable
+from sqlalchemy.sql import Select
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple
+)
 
+from app.components.comments.cache import CommentListCache
 from app.components.comments.models import Comment
+from app.components.posts.models import Post
 from app.components.comments.repo import CommentRepository
 from app.components.comments.scheme import (
     GetCommentsRequest,
     GetCommentsBreakdownRequest
 )
+from app.database import after_commit
+from app.exceptions import LogicError
+from app.pagination import Cursor, Page
 
 
 class CommentService:
-    def __init__(self, comments_repository: CommentRepository):
+    def __init__(
+        self,
+        comments_repository: CommentRepository,
+        comment_list_cache: Optional[CommentListCache] = None,
+    ):
         self._comments_repository = comments_repository
+        self._comment_list_cache = comment_list_cache
+
+    def invalidate_comments(self, tx: AsyncSession, *post_ids: int) -> None:
+        """
+        Cached comment lists of the posts are dropped
+        once the caller's transaction is committed.
+        """
+        if self._comment_list_cache is None:
+            return
+        for post_id in set(post_ids):
+            after_commit(
+                tx,
+                lambda post_id=post_id: (
+                    self._comment_list_cache.invalidate(post_id)
+                )
+            )
 
     async def add_comment(
         self, tx: AsyncSession, comment: Comment
     ) -> Comment:
-        return await self._comments_repository.add_comment(tx, comment)
+        comment = await self._comments_repository.add_comment(tx, comment)
+        self.invalidate_comments(tx, comment.post_id)
+        return comment
+
+    async def add_comments(
+        self, tx: AsyncSession, comments: Sequence[Comment]
+    ) -> List[Comment]:
+        self.invalidate_comments(
+            tx, *(comment.post_id for comment in comments)
+        )
+        return await self._comments_repository.add_comments_returning(tx, [
+            {
+                "account_hex_id": comment.account_hex_id,
+                "post_id": comment.post_id,
+                "text": comment.text,
+                "banned": bool(comment.banned),
+                "pending": bool(comment.pending),
+            }
+            for comment in comments
+        ])
 
-    async def add_delayed_comment(
+    async def schedule_auto_replies(
         self,
-        delay: int,
-        comment: Comment,
-        db_session: Callable
-    ) -> None:
-        await asyncio.sleep(delay)
-        async with db_session() as tx:
-            await self.add_comment(tx, comment)
+        tx: AsyncSession,
+        replies: Sequence[Tuple[Post, str]]
+    ) -> List[datetime]:
+        """
+        Stores the replies in the caller's transaction,
+        returns the times they are due at.
+        """
+        now = datetime.utcnow()
+        scheduled = [
+            {
+                "due_at": now + timedelta(seconds=post.auto_comment_timeout),
+                "account_hex_id": post.account_hex_id,
+                "post_id": post.id,
+                "text": message,
+            }
+            for post, message in replies
+        ]
+        await self._comments_repository.add_scheduled_comments(tx, scheduled)
+        return [reply["due_at"] for reply in scheduled]
+
+    async def deliver_due_comments(
+        self,
+        tx: AsyncSession,
+        now: datetime,
+        limit: int
+    ) -> List[datetime]:
+        """
+        Moves up to limit due scheduled comments into comments,
+        returns their due times.
+        """
+        due = await self._comments_repository.pop_due_scheduled_comments(
+            tx, now, limit
+        )
+        await self._comments_repository.add_comments(tx, [
+            {
+                "account_hex_id": row["account_hex_id"],
+                "post_id": row["post_id"],
+                "text": row["text"],
+            }
+            for row in due
+        ])
+        self.invalidate_comments(tx, *(row["post_id"] for row in due))
+        return [row["due_at"] for row in due]
+
+    async def get_next_scheduled_at(
+        self, tx: AsyncSession
+    ) -> datetime | None:
+        return await self._comments_repository.get_next_scheduled_at(tx)
 
     async def get_comment(
         self,
         tx: AsyncSession,
         comment_id: int,
-        owner_hex_id: Optional[str] = None
+        owner_hex_id: Optional[str] = None,
+        viewer_hex_id: Optional[str] = None,
     ) -> Comment | None:
         return await self._comments_repository.get_comment(
-            tx, comment_id, owner_hex_id
+            tx, comment_id, owner_hex_id, viewer_hex_id
         )
     
     async def get_comments(
         self, 
         tx: AsyncSession, 
-        payload: GetCommentsRequest
-    ) -> List[Comment]:            
-        return await self._comments_repository.get_comments(
+        payload: GetCommentsRequest,
+        viewer_hex_id: Optional[str] = None,
+    ) -> Page[Row]:
+        if (
+            self._comment_list_cache is not None
+            and payload.cursor is None
+            and payload.owner_hex_id is None
+        ):
+            found = await self._comment_list_cache.get_comments(
+                payload.post_id, payload.quantity + 1
+            )
+            # viewers may see more while some comments are pending,
+            # those lists are not served from the cache
+            if found.checks["post"] and not found.checks["pending"]:
+                return Page.from_rows(found.rows, payload.quantity)
+
+        after = None
+        if payload.cursor is not None:
+            after = Cursor.decode(payload.cursor)
+        found = await self._comments_repository.get_comments(
             tx, 
             post_id=payload.post_id, 
-            quantity=payload.quantity, 
-            account_hex_id=payload.owner_hex_id
+            quantity=payload.quantity + 1, 
+            account_hex_id=payload.owner_hex_id,
+            viewer_hex_id=viewer_hex_id,
+            after=after,
+        )
+        if not found.checks["post"]:
+            raise LogicError("Post not found")
+        if not found.checks["owner"]:
+            raise LogicError("Invalid owner id")
+        return Page.from_rows(found.rows, payload.quantity)
+
+    async def stream_comments(
+        self,
+        tx: AsyncSession,
+        post_id: int,
+        owner_hex_id: Optional[str] = None,
+        viewer_hex_id: Optional[str] = None,
+    ) -> AsyncIterator[Mapping[str, Any]]:
+        q = self._comments_repository.get_comments_export_query(
+            post_id, owner_hex_id, viewer_hex_id
         )
+        async for row in self._comments_repository.stream_rows(tx, q):
+            yield row
+
+    async def get_pending_comment_ids(self, tx: AsyncSession) -> List[int]:
+        return await self._comments_repository.get_pending_comment_ids(tx)
+
+    async def set_moderation_result(
+        self, tx: AsyncSession, comment_id: int, banned: bool
+    ) -> bool:
+        post_id = await self._comments_repository.set_moderation_result(
+            tx, comment_id, banned
+        )
+        if post_id is None:
+            return False
+        self.invalidate_comments(tx, post_id)
+        return True
     
     async def get_comments_breakdown(
         self,
         tx: AsyncSession,
         payload: GetCommentsBreakdownRequest
     ) -> List[Dict]:
-        
+        return [
+            dict(row)
+            async for row in self.stream_comments_breakdown(tx, payload)
+        ]
+
+    async def stream_comments_breakdown(
+        self,
+        tx: AsyncSession,
+        payload: GetCommentsBreakdownRequest
+    ) -> AsyncIterator[Mapping[str, Any]]:
+        """
+        Rows ordered by date, then by the group_by dimensions.
+        """
         if payload.date_from is not None:
             now = datetime.now()
             if payload.date_from > now:
-                return []
+                return
             if (
                 payload.date_to is not None and 
                 payload.date_to < payload.date_from
             ):
-                return []
-            
-        return await self._comments_repository.get_comments_breakdown(
-            tx,
-            date_from=payload.date_from,
-            date_to=payload.date_to
-        )
+                return
+
+        repo = self._comments_repository
+        slicing = {
+            "post_id": payload.post_id,
+            "account_hex_id": payload.account_hex_id,
+            "group_by": payload.group_by,
+        }
+        watermark = await repo.get_daily_stats_watermark(tx)
+        if watermark is None:
+            queries = [repo.get_comments_breakdown_query(
+                date_from=payload.date_from,
+                date_to=payload.date_to,
+                **slicing
+            )]
+        else:
+            queries = self._breakdown_queries(payload, watermark, slicing)
+        # the queries cover consecutive, non overlapping date ranges
+        for q in queries:
+            async for row in repo.stream_rows(tx, q):
+                yield row
+
+    def _breakdown_queries(
+        self,
+        payload: GetCommentsBreakdownRequest,
+        watermark: date,
+        slicing: Dict[str, Any]
+    ) -> List[Select]:
+        """
+        Whole sealed days come from the rollup, the partial first day
+        and everything after the watermark are counted live.
+        """
+        repo = self._comments_repository
+        rollup_from = None
+        if payload.date_from is not None:
+            rollup_from = payload.date_from.date()
+            if payload.date_from.time() != time.min:
+                rollup_from += timedelta(days=1)
+        rollup_before = watermark + timedelta(days=1)
+        if payload.date_to is not None:
+            rollup_before = min(rollup_before, payload.date_to.date())
+        if rollup_from is not None and rollup_from > rollup_before:
+            rollup_before = rollup_from
+
+        queries = []
+        if rollup_from is not None:
+            rollup_start = datetime.combine(rollup_from, time.min)
+            if payload.date_from < rollup_start:
+                queries.append(repo.get_comments_breakdown_query(
+                    date_from=payload.date_from,
+                    date_to=payload.date_to,
+                    date_before=rollup_start,
+                    **slicing
+                ))
+        queries.append(repo.get_daily_stats_query(
+            rollup_from, rollup_before, **slicing
+        ))
+        queries.append(repo.get_comments_breakdown_query(
+            date_from=datetime.combine(rollup_before, time.min),
+            date_to=payload.date_to,
+            **slicing
+        ))
+        return queries
+
+    async def reset_daily_stats(self, tx: AsyncSession) -> None:
+        await self._comments_repository.delete_daily_stats(tx)
+
+    async def seal_daily_stats(
+        self,
+        tx: AsyncSession,
+        until: date
+    ) -> int:
+        """
+        Rolls up the first day after the watermark if it is before
+        until. Returns the number of sealed days, 0 when there is
+        nothing to seal or another instance is sealing.
+        """
+        repo = self._comments_repository
+        if not await repo.try_lock_daily_stats(tx):
+            return 0
+        watermark = await repo.get_daily_stats_watermark(tx)
+        if watermark is not None:
+            date_from = watermark + timedelta(days=1)
+        else:
+            date_from = await repo.get_first_comment_date(tx)
+            if date_from is None:
+                return 0
+        # one day per transaction, writers to comments wait for it
+        date_before = min(until, date_from + timedelta(days=1))
+        return await repo.seal_daily_stats(tx, date_from, date_before)
     
+    async def update_comment(
+        self,
+        tx: AsyncSession,
+        comment: Comment,
+        text: str,
+        banned: bool
+    ) -> Comment:
+        comment.banned = banned
+        comment.pending = False
+        comment.text = text
+        comment.edited = True
+        self.invalidate_comments(tx, comment.post_id)
+        return comment
+
     async def delete_comment(
         self, tx: AsyncSession, comment: Comment
     ) -> None:
         await self._comments_repository.delete_comment(tx, comment)
+        self.invalidate_comments(tx, comment.post_id)
@@ -0,0 +1,93 @@
+import argparse
+import asyncio
+
+from datetime import datetime
+from loguru import logger
+from typing import Callable
+
+from app.components.comments.service import CommentService
+from app.configs import CommentsConfig
+from app.metrics import MetricsRegistry
+
+
+class DailyStatsRollup:
+    """
+    Seals finished (UTC) days into comment_daily_stats. The breakdown
+    reads unsealed days live, so this only has to run every now and
+    then to keep the live part down to about a day. Every instance
+    runs it, the one holding the advisory lock does the work.
+    """
+
+    def __init__(
+        self,
+        config: CommentsConfig,
+        metrics: MetricsRegistry,
+        comments_service: CommentService,
+        db_session: Callable,
+    ):
+        self._config = config
+        self._comments_service = comments_service
+        self._db_session = db_session
+        self._task: asyncio.Task | None = None
+        self._sealed = metrics.counter("stats_rollup.sealed_days")
+        self._errors = metrics.counter("stats_rollup.errors")
+
+    async def seal(self, rebuild: bool = False) -> int:
+        """
+        Seals every finished day, a day per transaction. Stops early
+        if another instance is sealing. With rebuild the rollup is
+        dropped and computed from scratch.
+        """
+        if rebuild:
+            async with self._db_session() as tx:
+                await self._comments_service.reset_daily_stats(tx)
+        total = 0
+        while True:
+            async with self._db_session() as tx:
+                sealed = await self._comments_service.seal_daily_stats(
+                    tx, until=datetime.utcnow().date()
+                )
+            self._sealed.inc(sealed)
+            total += sealed
+            if not sealed:
+                return total
+
+    async def start(self) -> None:
+        await self.stop()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.seal()
+            except Exception as e:
+                self._errors.inc()
+                logger.exception(f"Daily stats rollup failed: {e}")
+            await asyncio.sleep(self._config.stats_rollup_interval)
+
+
+async def backfill(rebuild: bool) -> None:
+    from app.containers import container
+
+    sealed = await container.daily_stats_rollup().seal(rebuild=rebuild)
+    logger.info(f"Sealed {sealed} days of comment stats")
+    await container.db().dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Backfills comment_daily_stats, "
+                    "python -m app.components.comments.stats"
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="drop the rollup and compute it from scratch"
+    )
+    asyncio.run(backfill(parser.parse_args().rebuild))
@@ -0,0 +1,87 @@
+import asyncio
+
+from typing import (
+    Awaitable,
+    Callable,
+    Generic,
+    List,
+    Set,
+    Tuple,
+    TypeVar
+)
+
+from app.metrics import MetricsRegistry
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+BatchHandler = Callable[[List[T]], Awaitable[List[R | BaseException]]]
+
+
+class MicroBatcher(Generic[T, R]):
+    """
+    Collects submitted items for up to max_delay seconds or until
+    max_size of them are pending, then hands them to the handler in one
+    call. The handler returns a result or an exception per item, in order.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        handler: BatchHandler,
+        metrics: MetricsRegistry,
+        max_size: int,
+        max_delay: float,
+    ):
+        self._handler = handler
+        self._max_size = max_size
+        self._max_delay = max_delay
+        self._pending: List[Tuple[T, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._batch_size = metrics.histogram(
+            f"{name}.batch_size", buckets=(1, 2, 4, 8, 16, 32, 64)
+        )
+
+    async def submit(self, item: T) -> R:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # whatever was pending belongs to a loop that is gone
+            self._pending = []
+            self._timer = None
+            self._loop = loop
+
+        future: asyncio.Future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self._max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._max_delay, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._run(batch))
+        # keep a reference until done, the loop only holds weak ones
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[T, asyncio.Future]]) -> None:
+        self._batch_size.observe(len(batch))
+        try:
+            results = await self._handler([item for item, _ in batch])
+        except BaseException as e:
+            results = [e] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
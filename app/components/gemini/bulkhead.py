@@ -0,0 +1,113 @@
+import asyncio
+
+from itertools import count
+from time import monotonic, perf_counter
+from typing import List, Tuple
+
+from app.components.gemini.consts import ModerationPriorityEnum
+from app.components.gemini.exceptions import GeminiUnavailableError
+from app.metrics import MetricsRegistry
+
+Waiter = Tuple[ModerationPriorityEnum, int, asyncio.Future]
+
+
+class Bulkhead:
+    """
+    Caps the calls in flight at max_in_flight. Others wait in a queue
+    of queue_size, served by priority and then in order of arrival;
+    when it is full a more urgent call takes the place of the least
+    urgent one. A call is turned away once less than min_budget
+    seconds would be left of its deadline, it could not finish anyway.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        metrics: MetricsRegistry,
+        max_in_flight: int,
+        queue_size: int,
+        min_budget: float,
+    ):
+        self._max_in_flight = max(max_in_flight, 1)
+        self._queue_size = queue_size
+        self._min_budget = min_budget
+        self._in_flight = 0
+        self._waiters: List[Waiter] = []
+        self._order = count()
+        self._in_flight_gauge = metrics.gauge(f"{name}.in_flight")
+        self._queued = metrics.gauge(f"{name}.queued")
+        self._wait = metrics.histogram(f"{name}.wait_ms")
+        self._rejected = metrics.counter(f"{name}.rejected")
+        self._evicted = metrics.counter(f"{name}.evicted")
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _reject(self, reason: str) -> GeminiUnavailableError:
+        self._rejected.inc()
+        return GeminiUnavailableError(f"bulkhead: {reason}")
+
+    def _set_in_flight(self, delta: int) -> None:
+        self._in_flight += delta
+        self._in_flight_gauge.set(self._in_flight)
+
+    def _remove(self, waiter: Waiter) -> None:
+        self._waiters.remove(waiter)
+        self._queued.set(len(self._waiters))
+
+    async def acquire(
+        self,
+        priority: ModerationPriorityEnum,
+        deadline: float
+    ) -> None:
+        """
+        Must be paired with release() once the call is done.
+        """
+        budget = deadline - monotonic() - self._min_budget
+        if budget <= 0:
+            raise self._reject("budget too small")
+        if self._in_flight < self._max_in_flight and not self._waiters:
+            self._set_in_flight(1)
+            self._wait.observe(0)
+            return
+
+        if len(self._waiters) >= self._queue_size:
+            least_urgent = max(self._waiters, default=None)
+            if least_urgent is None or least_urgent[0] <= priority:
+                raise self._reject("queue full")
+            self._remove(least_urgent)
+            self._evicted.inc()
+            least_urgent[2].set_exception(self._reject("evicted"))
+
+        future = asyncio.get_running_loop().create_future()
+        waiter: Waiter = (priority, next(self._order), future)
+        self._waiters.append(waiter)
+        self._queued.set(len(self._waiters))
+        started = perf_counter()
+        try:
+            await asyncio.wait_for(future, budget)
+        except asyncio.TimeoutError:
+            raise self._reject("budget ran out while queued")
+        except BaseException:
+            if future.done() and not future.cancelled():
+                if future.exception() is None:
+                    # granted just as the caller gave up
+                    self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._remove(waiter)
+        self._wait.observe((perf_counter() - started) * 1000)
+
+    def release(self) -> None:
+        """
+        Hands the slot to the most urgent waiter, if any.
+        """
+        while self._waiters:
+            waiter = min(self._waiters)
+            self._remove(waiter)
+            if not waiter[2].done():
+                waiter[2].set_result(None)
+                return
+        self._set_in_flight(-1)
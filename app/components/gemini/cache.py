@@ -0,0 +1,111 @@
+import unicodedata
+
+from datetime import datetime, timedelta
+from hashlib import sha256
+from loguru import logger
+from typing import Callable, Optional, Tuple
+
+from app.cache import LRUCache
+from app.components.gemini.consts import (
+    BATCH_PROMPT_TEMPLATE,
+    PROMPT_TEMPLATE
+)
+from app.components.gemini.repo import ModerationVerdictRepository
+from app.configs import GeminiConfig
+from app.metrics import MetricsRegistry
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+class ModerationCache:
+    """
+    Verdicts by hash of prompt mode and normalized text.
+    The key is salted with a version of the prompt and generation
+    config, changing either of them makes old verdicts unreachable.
+    """
+
+    def __init__(
+        self,
+        config: GeminiConfig,
+        metrics: MetricsRegistry,
+        verdicts_repository: ModerationVerdictRepository,
+        db_session: Callable,
+    ):
+        self._config = config
+        self._local: LRUCache[Tuple[bool, str]] = LRUCache(
+            "gemini.verdict_cache",
+            metrics,
+            max_size=config.verdict_cache_size,
+            ttl=config.verdict_cache_ttl,
+        )
+        self._persistent_hits = metrics.counter(
+            "gemini.verdict_cache.persistent_hits"
+        )
+        self._verdicts_repository = verdicts_repository
+        self._db_session = db_session
+        self.version = sha256(
+            (
+                PROMPT_TEMPLATE
+                + BATCH_PROMPT_TEMPLATE
+                + config.generation_config.model_dump_json()
+            ).encode()
+        ).hexdigest()[:16]
+
+    def key(self, text: str, generate_answer: bool) -> str:
+        return sha256(
+            f"{self.version}:{int(generate_answer)}:"
+            f"{normalize_text(text)}".encode()
+        ).hexdigest()
+
+    @property
+    def _created_after(self) -> datetime:
+        return datetime.utcnow() - timedelta(
+            seconds=self._config.verdict_cache_ttl
+        )
+
+    async def get(self, key: str) -> Optional[Tuple[bool, str]]:
+        verdict = self._local.get(key)
+        if verdict is not None or not self._config.verdict_cache_persistent:
+            return verdict
+
+        try:
+            async with self._db_session() as tx:
+                row = await self._verdicts_repository.get_verdict(
+                    tx, key, self._created_after
+                )
+        except Exception as e:
+            logger.warning(f"Verdict cache lookup failed: {e}")
+            return None
+        if row is None:
+            return None
+        self._persistent_hits.inc()
+        verdict = (row.allowed, row.message)
+        self._local.set(key, verdict)
+        return verdict
+
+    async def set(self, key: str, verdict: Tuple[bool, str]) -> None:
+        self._local.set(key, verdict)
+        if not self._config.verdict_cache_persistent:
+            return
+
+        allowed, message = verdict
+        try:
+            async with self._db_session() as tx:
+                await self._verdicts_repository.save_verdict(
+                    tx, key, self.version, allowed, message
+                )
+        except Exception as e:
+            logger.warning(f"Verdict cache store failed: {e}")
+
+    async def purge(self) -> None:
+        """
+        Drops persisted verdicts of other versions or past their ttl.
+        """
+        if not self._config.verdict_cache_persistent:
+            return
+        async with self._db_session() as tx:
+            await self._verdicts_repository.delete_stale_verdicts(
+                tx, self.version, self._created_after
+            )
@@ -0,0 +1,62 @@
+from fastapi import HTTPException, status
+from math import ceil
+from typing import Optional
+
+
+class GeminiError(Exception):
+    """
+    The model could not be asked or gave no usable answer.
+    Retryable errors are worth another attempt (timeouts, 429, 5xx).
+    """
+
+    def __init__(
+        self,
+        detail: str,
+        retryable: bool = False,
+        retry_after: Optional[float] = None,
+    ):
+        super().__init__(detail)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class GeminiUnavailableError(GeminiError):
+    """
+    Refused locally, by the circuit breaker or the rate limiter,
+    or no verdict could be had and there is no fallback verdict.
+    In the latter case retryable tells whether asking again may help.
+    """
+
+
+class ModerationUnavailableException(HTTPException):
+    def __init__(
+        self,
+        detail: str = "Moderation is unavailable, try again later",
+        headers={"Retry-After": "5"},
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    ):
+        super().__init__(
+            detail=detail,
+            headers=headers,
+            status_code=status_code,
+        )
+
+
+class ModerationFailedException(HTTPException):
+    def __init__(
+        self,
+        detail: str = "Moderation failed, the text could not be judged",
+        status_code=status.HTTP_502_BAD_GATEWAY,
+    ):
+        super().__init__(detail=detail, status_code=status_code)
+
+
+def moderation_exception(error: GeminiUnavailableError) -> HTTPException:
+    """
+    What an interactive request answers when there is no verdict:
+    a 503 if asking again later may help, a 502 otherwise.
+    """
+    if not error.retryable:
+        return ModerationFailedException()
+    wait = ceil(error.retry_after or 1)
+    return ModerationUnavailableException(headers={"Retry-After": str(wait)})
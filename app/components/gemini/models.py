@@ -0,0 +1,25 @@
+from datetime import datetime
+from sqlalchemy import Boolean, Column, DateTime, String
+
+from app.components.base.models import Base
+from app.database import UTCNow
+
+
+class ModerationVerdict(Base):
+    __tablename__ = "moderation_verdicts"
+
+    key: str = Column(
+        String(64), primary_key=True, nullable=False
+    )
+    version: str = Column(
+        String(16), nullable=False, index=True
+    )
+    created_at: datetime | None = Column(
+        DateTime, server_default=UTCNow(), nullable=False
+    )
+    allowed: bool = Column(
+        Boolean, nullable=False
+    )
+    message: str = Column(
+        String, nullable=False, default=""
+    )
@@ -0,0 +1,231 @@
+import asyncio
+
+from loguru import logger
+from typing import Callable, Dict, List, Set, Tuple
+
+from app.components.comments.scheduler import CommentScheduler
+from app.components.comments.service import CommentService
+from app.components.gemini.consts import (
+    ModerationPriorityEnum,
+    ModerationTargetEnum
+)
+from app.components.gemini.exceptions import GeminiUnavailableError
+from app.components.gemini.service import GeminiService
+from app.components.posts.service import PostService
+from app.configs import GeminiConfig
+from app.metrics import MetricsRegistry
+
+ModerationJob = Tuple[ModerationTargetEnum, int]
+
+
+class ModerationQueue:
+    """
+    Deferred moderation: content is stored as pending and a pool of
+    workers resolves it in the background. Pending rows left over by a
+    restart are picked up again when the workers start. A job the model
+    can't judge for now is retried with a growing delay; one it can
+    never judge, or that runs out of attempts, is banned.
+    """
+
+    def __init__(
+        self,
+        config: GeminiConfig,
+        metrics: MetricsRegistry,
+        gemini_service: GeminiService,
+        posts_service: PostService,
+        comments_service: CommentService,
+        comment_scheduler: CommentScheduler,
+        db_session: Callable,
+    ):
+        self._config = config
+        self._gemini_service = gemini_service
+        self._posts_service = posts_service
+        self._comments_service = comments_service
+        self._comment_scheduler = comment_scheduler
+        self._db_session = db_session
+        self._queue: asyncio.Queue[ModerationJob] | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._workers: Set[asyncio.Task] = set()
+        self._retrying: Set[asyncio.Task] = set()
+        self._attempts: Dict[ModerationJob, int] = {}
+        self._depth = metrics.gauge("moderation.queue_depth")
+        self._processed = metrics.counter("moderation.processed")
+        self._failed = metrics.counter("moderation.failed")
+        self._inline = metrics.counter("moderation.inline")
+        self._retried = metrics.counter("moderation.retried")
+        self._given_up = metrics.counter("moderation.given_up")
+
+    @property
+    def deferred(self) -> bool:
+        return self._config.deferred_moderation
+
+    def _ensure_started(self) -> asyncio.Queue[ModerationJob]:
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop:
+            self._queue = asyncio.Queue(
+                maxsize=self._config.moderation_queue_size
+            )
+            self._loop = loop
+            self._workers = {
+                asyncio.create_task(self._work())
+                for _ in range(self._config.moderation_workers)
+            }
+        return self._queue
+
+    async def start(self) -> None:
+        if not self.deferred:
+            return
+        queue = self._ensure_started()
+        async with self._db_session() as tx:
+            post_ids = await self._posts_service.get_pending_post_ids(tx)
+            comment_ids = (
+                await self._comments_service.get_pending_comment_ids(tx)
+            )
+        jobs: List[ModerationJob] = [
+            *((ModerationTargetEnum.POST, id_) for id_ in post_ids),
+            *((ModerationTargetEnum.COMMENT, id_) for id_ in comment_ids),
+        ]
+        if jobs:
+            logger.info(f"Resuming moderation of {len(jobs)} pending items")
+        for job in jobs:
+            await queue.put(job)
+        self._depth.set(queue.qsize())
+
+    async def stop(self) -> None:
+        tasks = self._workers | self._retrying
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = set()
+        self._retrying = set()
+        self._attempts = {}
+        self._queue = None
+        self._loop = None
+
+    async def submit(self, target: ModerationTargetEnum, id_: int) -> None:
+        """
+        Must be called after the pending row is committed.
+        When the queue is full the job is processed right away, a job
+        the model can't take now is queued again after a while rather
+        than failing the caller.
+        """
+        queue = self._ensure_started()
+        try:
+            queue.put_nowait((target, id_))
+        except asyncio.QueueFull:
+            self._inline.inc()
+            await self._process((target, id_))
+        self._depth.set(queue.qsize())
+
+    async def _work(self) -> None:
+        queue = self._queue
+        while True:
+            job = await queue.get()
+            self._depth.set(queue.qsize())
+            try:
+                await self._process(job)
+            except Exception as e:
+                self._failed.inc()
+                logger.exception(f"Moderation of {job} failed: {e}")
+            finally:
+                queue.task_done()
+
+    async def _process(self, job: ModerationJob) -> None:
+        target, id_ = job
+        try:
+            if target == ModerationTargetEnum.POST:
+                await self._moderate_post(id_)
+            else:
+                await self._moderate_comment(id_)
+        except GeminiUnavailableError as e:
+            attempt = self._attempts.get(job, 0) + 1
+            if e.retryable and attempt < self._config.moderation_max_attempts:
+                # the row stays pending, it is asked for again later
+                logger.warning(f"Moderation of {job} postponed: {e}")
+                self._attempts[job] = attempt
+                self._retry(job, max(e.retry_after or 0, min(
+                    self._config.moderation_retry_max_delay,
+                    self._config.moderation_retry_base_delay
+                    * 2 ** (attempt - 1),
+                )))
+                return
+            self._attempts.pop(job, None)
+            await self._give_up(job, e)
+            return
+        self._attempts.pop(job, None)
+        self._processed.inc()
+
+    async def _give_up(
+        self, job: ModerationJob, error: GeminiUnavailableError
+    ) -> None:
+        # a row nobody could judge is not published
+        logger.error(f"Moderation of {job} given up, banning it: {error}")
+        self._given_up.inc()
+        target, id_ = job
+        async with self._db_session() as tx:
+            if target == ModerationTargetEnum.POST:
+                await self._posts_service.set_moderation_result(
+                    tx, id_, banned=True
+                )
+            else:
+                await self._comments_service.set_moderation_result(
+                    tx, id_, banned=True
+                )
+
+    def _retry(self, job: ModerationJob, delay: float) -> None:
+        self._retried.inc()
+        task = asyncio.create_task(self._requeue(job, delay))
+        self._retrying.add(task)
+        task.add_done_callback(self._retrying.discard)
+
+    async def _requeue(self, job: ModerationJob, delay: float) -> None:
+        await asyncio.sleep(delay)
+        queue = self._ensure_started()
+        await queue.put(job)
+        self._depth.set(queue.qsize())
+
+    async def _moderate_post(self, post_id: int) -> None:
+        # no connection is held while waiting for the model
+        async with self._db_session() as tx:
+            post = await self._posts_service.get_post(tx, post_id)
+        if post is None or not post.pending:
+            return
+        valid, _ = await self._gemini_service.analyze_text(
+            f"POST: {post.text}",
+            subject=post.text,
+            priority=ModerationPriorityEnum.BACKGROUND,
+        )
+        async with self._db_session() as tx:
+            await self._posts_service.set_moderation_result(
+                tx, post_id, banned=not valid
+            )
+
+    async def _moderate_comment(self, comment_id: int) -> None:
+        async with self._db_session() as tx:
+            comment = await self._comments_service.get_comment(
+                tx, comment_id
+            )
+            if comment is None or not comment.pending:
+                return
+            post = await self._posts_service.get_post(tx, comment.post_id)
+        if post is None:
+            # the post was banned or deleted meanwhile
+            async with self._db_session() as tx:
+                await self._comments_service.set_moderation_result(
+                    tx, comment_id, banned=True
+                )
+            return
+
+        valid, message = await self._gemini_service.analyze_comment(
+            post, comment, ModerationPriorityEnum.BACKGROUND
+        )
+        async with self._db_session() as tx:
+            resolved = await self._comments_service.set_moderation_result(
+                tx, comment_id, banned=not valid
+            )
+            if (
+                resolved
+                and post.auto_comment_timeout is not None
+                and message
+            ):
+                await self._comment_scheduler.schedule(tx, post, message)
@@ -0,0 +1,126 @@
+import re
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.components.gemini.cache import normalize_text
+from app.configs import GeminiConfig
+from app.metrics import MetricsRegistry
+
+# common look-alike substitutions, applied before blocklist matching only
+LOOKALIKES = str.maketrans({
+    "0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t",
+    "@": "a", "$": "s",
+})
+WORDS = re.compile(r"\w+")
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over the blocklist, a text is scanned once
+    however many keywords there are. Keywords match whole words only,
+    a trailing "*" lets them match as a word prefix ("damn*").
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        # node 0 is the root, every node is a dict of transitions
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # (keyword length, prefix match) ending at the node
+        self._out: List[List[Tuple[int, bool]]] = [[]]
+        for keyword in keywords:
+            self._add(keyword)
+        self._link()
+
+    def __bool__(self) -> bool:
+        return len(self._goto) > 1
+
+    def _add(self, keyword: str) -> None:
+        prefix = keyword.endswith("*")
+        keyword = normalize_text(keyword.rstrip("*")).translate(LOOKALIKES)
+        if not keyword:
+            return
+        node = 0
+        for char in keyword:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = next_node
+        self._out[node].append((len(keyword), prefix))
+
+    def _link(self) -> None:
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                if self._fail[child] == child:
+                    self._fail[child] = 0
+                self._out[child] += self._out[self._fail[child]]
+
+    def search(self, text: str) -> bool:
+        text = normalize_text(text).translate(LOOKALIKES)
+        node = 0
+        for end, char in enumerate(text, 1):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for length, prefix in self._out[node]:
+                start = end - length
+                if start > 0 and text[start - 1].isalnum():
+                    continue
+                if not prefix and end < len(text) and text[end].isalnum():
+                    continue
+                return True
+        return False
+
+
+class ModerationPrefilter:
+    """
+    Local verdicts ahead of the model: blocklisted words are banned
+    right away, allowlisted short phrases ("thanks!", "great post")
+    pass. Anything else, and allowlisted texts that need a generated
+    reply, still goes to the model.
+    """
+
+    def __init__(self, config: GeminiConfig, metrics: MetricsRegistry):
+        self._blocklist = KeywordMatcher(config.prefilter_blocklist)
+        self._allowlist = {
+            phrase for phrase in map(self._phrase, config.prefilter_allowlist)
+            if phrase
+        }
+        self._allow_max_length = config.prefilter_allow_max_length
+        self._blocked = metrics.counter("gemini.prefilter.blocked")
+        self._allowed = metrics.counter("gemini.prefilter.allowed")
+        self._passed = metrics.counter("gemini.prefilter.passed")
+
+    @staticmethod
+    def _phrase(text: str) -> str:
+        return " ".join(WORDS.findall(normalize_text(text)))
+
+    def check(
+        self,
+        text: str,
+        is_auto_comment: bool = False
+    ) -> Optional[Tuple[bool, str]]:
+        """
+        Verdict in the analyze_text format, None if the model decides.
+        """
+        if self._blocklist and self._blocklist.search(text):
+            self._blocked.inc()
+            return False, ""
+        if (
+            not is_auto_comment
+            and len(text) <= self._allow_max_length
+            and self._phrase(text) in self._allowlist
+        ):
+            self._allowed.inc()
+            return True, ""
+        self._passed.inc()
+        return None
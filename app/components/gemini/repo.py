@@ -0,0 +1,56 @@
+from datetime import datetime
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.future import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.components.gemini.models import ModerationVerdict
+
+
+class ModerationVerdictRepository:
+    @staticmethod
+    async def get_verdict(
+        tx: AsyncSession,
+        key: str,
+        created_after: datetime
+    ) -> ModerationVerdict | None:
+        q = select(ModerationVerdict).where(
+            ModerationVerdict.key == key,
+            ModerationVerdict.created_at >= created_after
+        )
+        raw = await tx.execute(q)
+        return raw.scalar_one_or_none()
+
+    @staticmethod
+    async def save_verdict(
+        tx: AsyncSession,
+        key: str,
+        version: str,
+        allowed: bool,
+        message: str
+    ) -> None:
+        q = insert(ModerationVerdict).values(
+            key=key, version=version, allowed=allowed, message=message
+        )
+        q = q.on_conflict_do_update(
+            index_elements=[ModerationVerdict.key],
+            set_={
+                "version": q.excluded.version,
+                "allowed": q.excluded.allowed,
+                "message": q.excluded.message,
+                "created_at": q.excluded.created_at,
+            }
+        )
+        await tx.execute(q)
+
+    @staticmethod
+    async def delete_stale_verdicts(
+        tx: AsyncSession,
+        version: str,
+        created_before: datetime
+    ) -> None:
+        q = delete(ModerationVerdict).where(
+            (ModerationVerdict.version != version)
+            | (ModerationVerdict.created_at < created_before)
+        )
+        await tx.execute(q)
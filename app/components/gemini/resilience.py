@@ -0,0 +1,136 @@
+import enum
+
+from time import monotonic
+from typing import Optional
+
+from app.components.gemini.exceptions import GeminiUnavailableError
+from app.metrics import MetricsRegistry
+
+
+class TokenBucket:
+    """
+    Spreads calls over the quota: rate tokens per second, up to burst
+    of them saved up. A call that would wait longer than it can afford
+    is refused instead of queued.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        metrics: MetricsRegistry,
+        rate: float,
+        burst: int,
+    ):
+        self._rate = rate
+        self._burst = max(burst, 1)
+        self._tokens = float(self._burst)
+        self._updated = monotonic()
+        self._queued = metrics.gauge(f"{name}.queued")
+        self._wait = metrics.histogram(f"{name}.wait_ms")
+        self._refused = metrics.counter(f"{name}.refused")
+
+    def reserve(self, max_wait: float) -> float:
+        """
+        Takes a token and returns how long to wait before using it.
+        Tokens go negative while calls are queued, so reservations are
+        served in order without a lock.
+        """
+        if self._rate <= 0:
+            return 0
+        now = monotonic()
+        self._tokens = min(
+            self._burst, self._tokens + (now - self._updated) * self._rate
+        )
+        self._updated = now
+        wait = max(0.0, (1 - self._tokens) / self._rate)
+        if wait > max_wait:
+            self._refused.inc()
+            raise GeminiUnavailableError("rate limit")
+        self._tokens -= 1
+        self._wait.observe(wait * 1000)
+        return wait
+
+    def queued(self, delta: int) -> None:
+        self._queued.inc(delta)
+
+
+class BreakerStateEnum(int, enum.Enum):
+    CLOSED = 0
+    HALF_OPEN = 1
+    OPEN = 2
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold failed calls in a row and refuses
+    calls for reset_timeout seconds. Then a single probe is let
+    through, its outcome closes the breaker or opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        metrics: MetricsRegistry,
+        failure_threshold: int,
+        reset_timeout: float,
+    ):
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: float = 0
+        self._probing = False
+        self.state = BreakerStateEnum.CLOSED
+        self._state = metrics.gauge(f"{name}.state")
+        self._opened = metrics.counter(f"{name}.opened")
+        self._rejected = metrics.counter(f"{name}.rejected")
+
+    def _set_state(self, state: BreakerStateEnum) -> None:
+        self.state = state
+        self._state.set(state.value)
+
+    def check(self) -> None:
+        """
+        Raises GeminiUnavailableError if the call may not go out.
+        """
+        if self.state == BreakerStateEnum.OPEN:
+            if monotonic() - self._opened_at >= self._reset_timeout:
+                self._set_state(BreakerStateEnum.HALF_OPEN)
+        if self.state == BreakerStateEnum.HALF_OPEN:
+            if not self._probing:
+                self._probing = True
+                return
+        elif self.state == BreakerStateEnum.CLOSED:
+            return
+        self._rejected.inc()
+        raise GeminiUnavailableError("circuit open")
+
+    def release(self) -> None:
+        """
+        The call ended without telling anything about the API
+        (cancelled, refused by the rate limiter).
+        """
+        self._probing = False
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._probing = False
+        if self.state != BreakerStateEnum.CLOSED:
+            self._set_state(BreakerStateEnum.CLOSED)
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._probing = False
+        if (
+            self.state == BreakerStateEnum.HALF_OPEN
+            or self._failures >= self._failure_threshold
+        ):
+            self._opened_at = monotonic()
+            if self.state != BreakerStateEnum.OPEN:
+                self._opened.inc()
+            self._set_state(BreakerStateEnum.OPEN)
+
+    @property
+    def retry_after(self) -> Optional[float]:
+        if self.state != BreakerStateEnum.OPEN:
+            return None
+        return max(0.0, self._opened_at + self._reset_timeout - monotonic())
@@ -1,41 +1,207 @@
-from httpx import AsyncClient
-from typing import Tuple, Any
+import asyncio
+import json
+import random
+
+from email.utils import parsedate_to_datetime
+from httpx import (
+    AsyncClient,
+    Limits,
+    Response,
+    Timeout,
+    TimeoutException,
+    TransportError
+)
+from loguru import logger
+from time import monotonic, perf_counter, time
+from typing import Any, List, Optional, Sequence, Set, Tuple
 
 from app.components.comments.models import Comment
-from app.components.gemini.consts import PROMPT, PostStatusEnum
+from app.components.gemini.batcher import MicroBatcher
+from app.components.gemini.bulkhead import Bulkhead
+from app.components.gemini.cache import ModerationCache
+from app.components.gemini.consts import (
+    BATCH_PROMPT,
+    BATCH_RESPONSE_SCHEMA,
+    PROMPT,
+    ModerationPriorityEnum,
+    PostStatusEnum
+)
+from app.components.gemini.exceptions import (
+    GeminiError,
+    GeminiUnavailableError
+)
+from app.components.gemini.prefilter import ModerationPrefilter
+from app.components.gemini.resilience import CircuitBreaker, TokenBucket
 from app.components.posts.models import Post
 from app.configs import GeminiConfig
+from app.metrics import MetricsRegistry
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+RETRYABLE_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+BatchItem = Tuple[str, ModerationPriorityEnum]
 
 
+def retry_after(response: Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time())
+    except (TypeError, ValueError):
+        return None
 
-class GeminiService: # TODO response status and tokens limit checker
+
+class GeminiService:
     headers = {
         "Content-Type": "application/json"
     }
 
     def __init__(
         self,
-        config: GeminiConfig
+        config: GeminiConfig,
+        metrics: MetricsRegistry,
+        moderation_cache: ModerationCache,
+        prefilter: ModerationPrefilter,
     ):
         self._config = config
+        self._moderation_cache = moderation_cache
+        self._prefilter = prefilter
+        self._client: AsyncClient | None = None
+        self._client_loop: asyncio.AbstractEventLoop | None = None
+        self._closing: Set[asyncio.Task] = set()
+        self._latency = metrics.histogram("gemini.call_ms")
+        self._errors = metrics.counter("gemini.errors")
+        self._batch_fallbacks = metrics.counter("gemini.batch_fallbacks")
+        self._retries = metrics.counter("gemini.retries")
+        self._fallbacks = metrics.counter("gemini.fallbacks")
+        self._rate_limiter = TokenBucket(
+            "gemini.rate_limiter",
+            metrics,
+            rate=config.rate_limit_rpm / 60,
+            burst=config.rate_limit_burst,
+        )
+        self._breaker = CircuitBreaker(
+            "gemini.breaker",
+            metrics,
+            failure_threshold=config.breaker_failure_threshold,
+            reset_timeout=config.breaker_reset_timeout,
+        )
+        self._bulkhead = Bulkhead(
+            "gemini.bulkhead",
+            metrics,
+            max_in_flight=config.max_in_flight,
+            queue_size=config.in_flight_queue_size,
+            min_budget=config.min_call_budget,
+        )
+        self._batcher: MicroBatcher[BatchItem, Tuple[bool, str]] = (
+            MicroBatcher(
+                "gemini.batcher",
+                self._analyze_batch,
+                metrics,
+                max_size=config.batch_max_size,
+                max_delay=config.batch_max_delay_ms / 1000,
+            )
+        )
+
+    def _create_client(self) -> AsyncClient:
+        http2 = self._config.http2
+        if http2 and not HTTP2_AVAILABLE:
+            logger.warning("h2 is not installed, gemini client uses HTTP/1.1")
+            http2 = False
+        return AsyncClient(
+            headers=self.headers,
+            http2=http2,
+            limits=Limits(
+                max_connections=self._config.max_connections,
+                max_keepalive_connections=(
+                    self._config.max_keepalive_connections
+                ),
+                keepalive_expiry=self._config.keepalive_expiry,
+            ),
+            timeout=Timeout(
+                self._config.timeout, connect=self._config.connect_timeout
+            ),
+        )
+
+    @property
+    def client(self) -> AsyncClient:
+        """
+        Long-lived client, normally opened by the app lifespan.
+        Pooled connections can't outlive their event loop, so a client
+        made on another loop is closed and replaced.
+        """
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            if self._client is not None:
+                self._discard(self._client, self._client_loop)
+            self._client = self._create_client()
+            self._client_loop = loop
+        return self._client
+
+    def _discard(
+        self,
+        client: AsyncClient,
+        client_loop: asyncio.AbstractEventLoop | None
+    ) -> None:
+        if client_loop is not None and client_loop.is_running():
+            # still serving elsewhere, its connections are closed there
+            asyncio.run_coroutine_threadsafe(client.aclose(), client_loop)
+            return
+        task = asyncio.get_running_loop().create_task(
+            self._close_stale(client)
+        )
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close_stale(client: AsyncClient) -> None:
+        # the loop its connections were made on is gone, whatever can
+        # still be released is released and the client can't be reused
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.debug(f"Closing a stale gemini client failed: {e}")
+
+    async def start(self) -> None:
+        await self.close()
+        self._client = self._create_client()
+        self._client_loop = asyncio.get_running_loop()
+
+    async def close(self) -> None:
+        client, client_loop = self._client, self._client_loop
+        self._client = None
+        self._client_loop = None
+        if client is None:
+            return
+        if client_loop is asyncio.get_running_loop():
+            await client.aclose()
+        else:
+            self._discard(client, client_loop)
 
     @property
     def api_endpoint(self) -> str:
         return "https://generativelanguage.googleapis.com/v1beta/models/" \
               f"gemini-1.5-flash:generateContent?key={self._config.api_key}"
     
-    def make_payload(
+    def _make_request(
         self,
-        text: str, 
-        generate_answer: bool = False
+        parts: List[str],
+        generation_config: dict[str, Any]
     ) -> dict[str, Any]:
         return {
             "contents": [
                 {
-                    "parts": [
-                        {"text": PROMPT(generate_answer)},
-                        {"text": f"{text}"}
-                    ]
+                    "parts": [{"text": part} for part in parts]
                 }
             ],
             "safetySettings": [
@@ -60,40 +226,347 @@ class GeminiService: # TODO response status and tokens limit checker
                     "threshold": "BLOCK_NONE"
                 },
             ],
-            "generationConfig": self._config.generation_config.model_dump(
-                mode="json"
-            )
+            "generationConfig": generation_config
         }
-    
+
+    def make_payload(
+        self,
+        text: str, 
+        generate_answer: bool = False
+    ) -> dict[str, Any]:
+        return self._make_request(
+            [PROMPT(generate_answer), f"{text}"],
+            self._config.generation_config.model_dump(mode="json")
+        )
+
+    def make_batch_payload(self, texts: List[str]) -> dict[str, Any]:
+        generation_config = self._config.generation_config.model_dump(
+            mode="json"
+        )
+        # roughly {"id": 12, "verdict": "ALLOWED"}, per item
+        generation_config["maxOutputTokens"] = max(
+            generation_config["maxOutputTokens"], 16 * len(texts)
+        )
+        generation_config["responseMimeType"] = "application/json"
+        generation_config["responseSchema"] = BATCH_RESPONSE_SCHEMA
+        # texts are JSON strings, one user's text can't pass for
+        # another item or for an answer
+        items = json.dumps(
+            [{"id": i, "text": text} for i, text in enumerate(texts, 1)],
+            ensure_ascii=False,
+        )
+        return self._make_request(
+            [BATCH_PROMPT(len(texts)), items],
+            generation_config
+        )
+
     @staticmethod
-    def process_result(response: dict) -> Tuple[bool, str]:
-        best_candidate = response["candidates"][0]
-        analyze_result = best_candidate["content"]["parts"][0]["text"]
+    def _result_text(response: dict) -> Optional[str]:
+        try:
+            best_candidate = response["candidates"][0]
+            return best_candidate["content"]["parts"][0]["text"]
+        except (KeyError, IndexError, TypeError):
+            return None
+
+    @classmethod
+    def process_result(cls, response: dict) -> Tuple[bool, str]:
+        analyze_result = cls._result_text(response)
+        if analyze_result is None:
+            # the prompt itself was refused, whatever the safety settings
+            if response.get("promptFeedback", {}).get("blockReason"):
+                return False, ""
+            raise GeminiError(f"No answer in response: {response}")
         if PostStatusEnum.ALLOWED.value in analyze_result:
             return True, ""
         if PostStatusEnum.BANNED.value in analyze_result:
             return False, ""
         return True, analyze_result
 
-    async def call_api(self, payload: dict[str, Any]) -> dict:
-        async with AsyncClient(headers=self.headers, timeout=30) as client:
-            response = await client.post(self.api_endpoint, json=payload)
+    @classmethod
+    def process_batch_result(
+        cls,
+        response: dict,
+        count: int
+    ) -> List[Optional[Tuple[bool, str]]]:
+        """
+        Verdicts in item order, None for items the model skipped or
+        answered more than once, those are asked about one by one.
+        """
+        verdicts: List[Optional[Tuple[bool, str]]] = [None] * count
+        try:
+            answers = json.loads(cls._result_text(response) or "")
+        except ValueError:
+            return verdicts
+        if not isinstance(answers, list):
+            return verdicts
+
+        answered = [0] * count
+        for answer in answers:
+            if not isinstance(answer, dict):
+                continue
+            number, status = answer.get("id"), answer.get("verdict")
+            if type(number) is not int or not 1 <= number <= count:
+                continue
+            if status not in (
+                PostStatusEnum.ALLOWED.value, PostStatusEnum.BANNED.value
+            ):
+                continue
+            answered[number - 1] += 1
+            verdicts[number - 1] = (
+                status == PostStatusEnum.ALLOWED.value, ""
+            )
+        return [
+            verdict if answers_count == 1 else None
+            for verdict, answers_count in zip(verdicts, answered)
+        ]
+
+    async def call_api(
+        self,
+        payload: dict[str, Any],
+        timeout: float | None = None,
+        priority: ModerationPriorityEnum = ModerationPriorityEnum.INTERACTIVE,
+    ) -> dict:
+        """
+        timeout bounds the whole call, retries, rate limiting and
+        waiting for a bulkhead slot included. Raises GeminiError,
+        GeminiUnavailableError right away while the breaker is open or
+        the quota or the bulkhead can't fit the call in.
+        """
+        deadline = monotonic() + (timeout or self._config.timeout)
+        self._breaker.check()
+        try:
+            response = await self._call_with_retries(
+                payload, deadline, priority
+            )
+        except GeminiUnavailableError:
+            self._breaker.release()
+            raise
+        except GeminiError as e:
+            if e.retryable:
+                self._breaker.record_failure()
+            else:
+                # the API answered, it is up
+                self._breaker.record_success()
+            raise
+        except BaseException:
+            self._breaker.release()
+            raise
+        self._breaker.record_success()
+        return response
+
+    async def _call_with_retries(
+        self,
+        payload: dict[str, Any],
+        deadline: float,
+        priority: ModerationPriorityEnum
+    ) -> dict:
+        attempt = 0
+        while True:
+            try:
+                return await self._call_once(payload, deadline, priority)
+            except GeminiError as e:
+                if not e.retryable or attempt >= self._config.retry_attempts:
+                    raise
+                # full jitter, so that failed callers don't come back
+                # all at once
+                delay = random.uniform(0, min(
+                    self._config.retry_max_delay,
+                    self._config.retry_base_delay * 2 ** attempt,
+                ))
+                if e.retry_after is not None:
+                    delay = max(delay, e.retry_after)
+                if monotonic() + delay >= deadline:
+                    raise
+                attempt += 1
+                self._retries.inc()
+                logger.warning(f"Gemini call failed, retrying: {e}")
+                await asyncio.sleep(delay)
+
+    async def _call_once(
+        self,
+        payload: dict[str, Any],
+        deadline: float,
+        priority: ModerationPriorityEnum
+    ) -> dict:
+        wait = self._rate_limiter.reserve(deadline - monotonic())
+        if wait:
+            self._rate_limiter.queued(1)
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                self._rate_limiter.queued(-1)
+
+        await self._bulkhead.acquire(priority, deadline)
+        started = perf_counter()
+        try:
+            response = await self.client.post(
+                self.api_endpoint,
+                json=payload,
+                timeout=max(deadline - monotonic(), 0.001),
+            )
+        except (TimeoutException, TransportError) as e:
+            self._errors.inc()
+            raise GeminiError(f"{type(e).__name__}: {e}", retryable=True)
+        finally:
+            self._bulkhead.release()
+            self._latency.observe((perf_counter() - started) * 1000)
+
+        if response.status_code in RETRYABLE_STATUSES:
+            self._errors.inc()
+            raise GeminiError(
+                f"Status {response.status_code}",
+                retryable=True,
+                retry_after=retry_after(response),
+            )
+        if response.is_error:
+            self._errors.inc()
+            raise GeminiError(
+                f"Status {response.status_code}: {response.text[:200]}"
+            )
+        try:
             return response.json()
+        except ValueError as e:
+            self._errors.inc()
+            raise GeminiError(f"Invalid response: {e}")
+
+    def _fallback(self, error: GeminiError) -> Tuple[bool, str]:
+        fallback_verdict = self._config.fallback_verdict
+        if fallback_verdict is None:
+            # refused locally means busy or down for now, not a bad request
+            retryable = error.retryable or isinstance(
+                error, GeminiUnavailableError
+            )
+            raise GeminiUnavailableError(
+                f"No verdict: {error}",
+                retryable=retryable,
+                retry_after=(
+                    self._breaker.retry_after or error.retry_after
+                    if retryable else None
+                ),
+            ) from error
+        self._fallbacks.inc()
+        logger.warning(f"Moderation fell back to {fallback_verdict}: {error}")
+        return fallback_verdict == PostStatusEnum.ALLOWED.value, ""
 
     async def analyze_text(
         self,
         text: str,
-        is_auto_comment: bool = False
+        is_auto_comment: bool = False,
+        subject: Optional[str] = None,
+        priority: ModerationPriorityEnum = ModerationPriorityEnum.INTERACTIVE,
+    ) -> Tuple[bool, str]:
+        """
+        subject is the part of text being judged (e.g. the comment,
+        not its post), the local prefilter looks at it only.
+        priority orders the call among the queued ones, generating
+        a reply makes it no more urgent than AUTO_REPLY. Without a
+        fallback_verdict, raises GeminiUnavailableError when the model
+        can't be asked.
+        """
+        verdict = self._prefilter.check(
+            text if subject is None else subject, is_auto_comment
+        )
+        if verdict is not None:
+            return verdict
+
+        key = self._moderation_cache.key(text, is_auto_comment)
+        verdict = await self._moderation_cache.get(key)
+        if verdict is not None:
+            return verdict
+
+        if is_auto_comment:
+            priority = max(priority, ModerationPriorityEnum.AUTO_REPLY)
+        try:
+            # replies are generated per item, only plain verdicts are batched
+            if is_auto_comment or self._config.batch_max_size <= 1:
+                verdict = await self._analyze_single(
+                    text, is_auto_comment, priority
+                )
+            else:
+                verdict = await self._batcher.submit((text, priority))
+        except GeminiError as e:
+            # not cached, the next call asks the model again
+            return self._fallback(e)
+        await self._moderation_cache.set(key, verdict)
+        return verdict
+
+    async def _analyze_single(
+        self,
+        text: str,
+        is_auto_comment: bool = False,
+        priority: ModerationPriorityEnum = ModerationPriorityEnum.INTERACTIVE,
     ) -> Tuple[bool, str]:
         payload = self.make_payload(text, is_auto_comment)
-        response = await self.call_api(payload)
+        response = await self.call_api(payload, priority=priority)
         return self.process_result(response)
+
+    async def _analyze_batch(
+        self,
+        items: List[BatchItem]
+    ) -> List[Tuple[bool, str] | BaseException]:
+        texts = [text for text, _ in items]
+        # a batch is as urgent as its most urgent item
+        priority = min(priority for _, priority in items)
+        if len(texts) == 1:
+            return [await self._analyze_single(texts[0], priority=priority)]
+
+        try:
+            response = await self.call_api(
+                self.make_batch_payload(texts), priority=priority
+            )
+        except GeminiError as e:
+            if e.retryable or isinstance(e, GeminiUnavailableError):
+                # already retried, asking per item would only add load
+                return [e] * len(texts)
+            # the batch request itself was refused or answered with
+            # garbage, the items are asked about one by one
+            logger.warning(f"Batch moderation failed: {e}")
+            response = {}
+        verdicts = self.process_batch_result(response, len(texts))
+
+        missing = [i for i, verdict in enumerate(verdicts) if verdict is None]
+        if missing:
+            self._batch_fallbacks.inc(len(missing))
+        singles = await asyncio.gather(
+            *(
+                self._analyze_single(texts[i], priority=items[i][1])
+                for i in missing
+            ),
+            return_exceptions=True
+        )
+        results: List[Tuple[bool, str] | BaseException] = list(verdicts)
+        for i, single in zip(missing, singles):
+            results[i] = single
+        return results
         
     async def analyze_comment(
         self, 
         post: Post, 
-        comment: Comment
+        comment: Comment,
+        priority: ModerationPriorityEnum = ModerationPriorityEnum.INTERACTIVE,
     ) -> Tuple[bool, str]:
         is_auto_comment = isinstance(post.auto_comment_timeout, int)
         text = f"POST: {post.text}\n\nCOMMENT: {comment.text}"
-        return await self.analyze_text(text, is_auto_comment)
+        return await self.analyze_text(
+            text, is_auto_comment, subject=comment.text, priority=priority
+        )
+
+    async def analyze_comments(
+        self,
+        items: Sequence[Tuple[Post, Comment]],
+        priority: ModerationPriorityEnum = ModerationPriorityEnum.BACKGROUND,
+    ) -> List[Tuple[bool, str] | BaseException]:
+        """
+        At most bulk_moderation_concurrency comments are analyzed at
+        once, a failed one does not fail the others.
+        """
+        semaphore = asyncio.Semaphore(self._config.bulk_moderation_concurrency)
+
+        async def analyze(post: Post, comment: Comment) -> Tuple[bool, str]:
+            async with semaphore:
+                return await self.analyze_comment(post, comment, priority)
+
+        return await asyncio.gather(
+            *(analyze(post, comment) for post, comment in items),
+            return_exceptions=True
+        )
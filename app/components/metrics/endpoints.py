@@ -0,0 +1,42 @@
+from dependency_injector.wiring import inject, Provide
+from fastapi import Depends
+from fastapi_utils.cbv import cbv
+from fastapi_utils.inferring_router import InferringRouter
+
+from app.components.accounts.cache import CachedAccount
+from app.components.auth.consts import ScopeEnum
+from app.components.auth.utils import Scopes
+from app.components.metrics.scheme import GetMetricsResponse
+from app.containers import Container, container
+from app.database import DB
+from app.metrics import MetricsRegistry
+
+metrics_router = InferringRouter()
+
+
+@cbv(metrics_router)
+class MetricsAPI:
+    @inject
+    def __init__(
+        self,
+        db: DB = Depends(Provide[Container.db]),
+        metrics: MetricsRegistry = Depends(Provide[Container.metrics]),
+    ):
+        self._db = db
+        self._metrics = metrics
+
+    @metrics_router.get(
+        "/metrics",
+        response_model=GetMetricsResponse,
+        description="Returns a snapshot of in-process counters and timings"
+    )
+    async def get_metrics(
+        self,
+        account: CachedAccount = Scopes(ScopeEnum.STATISTICS_GET),
+    ) -> GetMetricsResponse:
+        return GetMetricsResponse(
+            metrics=self._metrics.snapshot(),
+            db_pool=self._db.pool_status(),
+        )
+
+container.wire(modules=[__name__])
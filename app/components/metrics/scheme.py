@@ -0,0 +1,7 @@
+from pydantic import BaseModel
+from typing import Any, Dict
+
+
+class GetMetricsResponse(BaseModel):
+    metrics: Dict[str, Any]
+    db_pool: str
@@ -0,0 +1,9 @@
+# what GetPostResponse shows, lists select only these
+POST_COLUMNS = (
+    "id",
+    "created_at",
+    "account_hex_id",
+    "text",
+    "edited",
+    "pending",
+)
@@ -1,14 +1,21 @@
 from dependency_injector.wiring import inject, Provide
-from fastapi import Depends, Path
+from fastapi import Depends, Header, Path, Response
 from fastapi_utils.cbv import cbv
 from fastapi_utils.inferring_router import InferringRouter
-from typing import Callable
+from typing import Callable, Optional
 
-from app.components.accounts.models import Account
-from app.components.accounts.service import AccountService
+from app.components.accounts.cache import CachedAccount
 from app.components.auth.consts import ScopeEnum
 from app.components.auth.utils import Scopes
+from app.components.comments.service import CommentService
+from app.components.gemini.consts import ModerationTargetEnum
+from app.components.gemini.exceptions import (
+    GeminiUnavailableError,
+    moderation_exception
+)
+from app.components.gemini.moderation import ModerationQueue
 from app.components.gemini.service import GeminiService
+from app.components.posts.consts import POST_COLUMNS
 from app.components.posts.models import Post
 from app.components.posts.scheme import (
     CreatePostRequest,
@@ -21,7 +28,9 @@ from app.components.posts.scheme import (
 )
 from app.components.posts.service import PostService
 from app.containers import Container, container
+from app.etag import etag_matches, make_etag, not_modified
 from app.exceptions import LogicError
+from app.responses import page_response
 
 posts_router = InferringRouter()
 
@@ -34,15 +43,19 @@ class PostsAPI:
         posts_service: PostService = Depends(
             Provide[Container.posts_service]
         ),
-        accounts_service: AccountService = Depends(
-            Provide[Container.accounts_service]
-        ),
         gemini_service: GeminiService = Depends(
             Provide[Container.gemini_service]
-        )
+        ),
+        moderation_queue: ModerationQueue = Depends(
+            Provide[Container.moderation_queue]
+        ),
+        comments_service: CommentService = Depends(
+            Provide[Container.comments_service]
+        ),
     ):
-        self._accounts_service = accounts_service
+        self._comments_service = comments_service
         self._gemini_service = gemini_service
+        self._moderation_queue = moderation_queue
         self._posts_service = posts_service
 
     @posts_router.post(
@@ -54,7 +67,7 @@ class PostsAPI:
     async def create_post(
         self,
         payload: CreatePostRequest,
-        account: Account = Scopes(ScopeEnum.POSTS_CREATE),
+        account: CachedAccount = Scopes(ScopeEnum.POSTS_CREATE),
         db_session: Callable = Depends(Provide[Container.db_session]),
     ) -> GetPostResponse:
         post = Post(
@@ -62,9 +75,21 @@ class PostsAPI:
             text=payload.text, 
             auto_comment_timeout=payload.auto_comment_timeout
         )
-        result, _ = await self._gemini_service.analyze_text(
-            f"POST: {post.text}"
-        )
+        if self._moderation_queue.deferred:
+            post.pending = True
+            async with db_session() as tx:
+                post = await self._posts_service.add_post(tx, post)
+            await self._moderation_queue.submit(
+                ModerationTargetEnum.POST, post.id
+            )
+            return GetPostResponse.from_model(post)
+
+        try:
+            result, _ = await self._gemini_service.analyze_text(
+                f"POST: {post.text}", subject=post.text
+            )
+        except GeminiUnavailableError as e:
+            raise moderation_exception(e)
         if isinstance(result, bool):
             post.banned = not result
         async with db_session() as tx:
@@ -81,17 +106,24 @@ class PostsAPI:
     @inject
     async def get_post(
         self,
+        response: Response,
         payload: GetPostRequest = Depends(),
-        account: Account = Scopes(ScopeEnum.POSTS_GET),
+        account: CachedAccount = Scopes(ScopeEnum.POSTS_GET),
         db_session: Callable = Depends(Provide[Container.db_session]),
-    ) -> GetPostResponse:
+        if_none_match: Optional[str] = Header(None),
+    ) -> GetPostResponse | Response:
         async with db_session() as tx:
             post = await self._posts_service.get_post(
                 tx,
-                payload.post_id
+                payload.post_id,
+                viewer_hex_id=account.hex_id
             )
         if not post:
             raise LogicError(f"Post not found")
+        etag = make_etag([post], GetPostResponse)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        response.headers["ETag"] = etag
         return GetPostResponse.from_model(post)
 
     @posts_router.get(
@@ -103,20 +135,24 @@ class PostsAPI:
     async def get_posts(
         self,
         payload: GetPostsRequest = Depends(),
-        account: Account = Scopes(ScopeEnum.POSTS_GET),
-        db_session: Callable = Depends(Provide[Container.db_session]),
-    ) -> GetPostsResponse:
+        account: CachedAccount = Scopes(ScopeEnum.POSTS_GET),
+        db_session: Callable = Depends(Provide[Container.db_read_session]),
+        if_none_match: Optional[str] = Header(None),
+    ) -> GetPostsResponse | Response:
         async with db_session() as tx:
-            if payload.owner_hex_id is not None:
-                posts_owner = await self._accounts_service.get_account(
-                    tx, account_hex_id=payload.owner_hex_id
-                )
-                if posts_owner is None:
-                    raise LogicError("Invalid owner id")
-            posts = await self._posts_service.get_posts(tx, payload)
-            return GetPostsResponse(
-                posts = [GetPostResponse.from_model(post) for post in posts]
+            page = await self._posts_service.get_posts(
+                tx, payload, viewer_hex_id=account.hex_id
             )
+        etag = make_etag(page.items, GetPostResponse, page.next_cursor)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        return page_response(
+            "posts",
+            page.items,
+            POST_COLUMNS,
+            page.next_cursor,
+            headers={"ETag": etag}
+        )
 
     @posts_router.put(
         "/post",
@@ -127,7 +163,7 @@ class PostsAPI:
     async def update_post(
         self,
         payload: UpdatePostRequest,
-        account: Account = Scopes(ScopeEnum.POSTS_UPDATE),
+        account: CachedAccount = Scopes(ScopeEnum.POSTS_UPDATE),
         db_session: Callable = Depends(Provide[Container.db_session]),
     ) -> GetPostResponse:
         async with db_session() as tx:
@@ -137,14 +173,19 @@ class PostsAPI:
             )
             if post is None:
                 raise LogicError(f"Post not found")
-            valid, _ = await self._gemini_service.analyze_text(
-                f"POST: {payload.text}"
-            )
+            try:
+                valid, _ = await self._gemini_service.analyze_text(
+                    f"POST: {payload.text}", subject=payload.text
+                )
+            except GeminiUnavailableError as e:
+                raise moderation_exception(e)
             post.banned = not valid
+            post.pending = False
             post.text = payload.text
             if payload.auto_comment_timeout is not None:
                 post.auto_comment_timeout = payload.auto_comment_timeout
             post.edited = True
+            self._comments_service.invalidate_comments(tx, post.id)
         if not valid:
             raise LogicError("Post was banned!")
         return GetPostResponse.from_model(post)
@@ -158,7 +199,7 @@ class PostsAPI:
     async def delete_post(
         self,
         post_id: int = Path(..., title="Unique id that corresponds to post."),
-        account: Account = Scopes(ScopeEnum.POSTS_DELETE),
+        account: CachedAccount = Scopes(ScopeEnum.POSTS_DELETE),
         db_session: Callable = Depends(Provide[Container.db_session]),
     ) -> DeletePostResponse:
         async with db_session() as tx:
@@ -168,6 +209,7 @@ class PostsAPI:
             if post is None:
                 raise LogicError(f"Post not found")
             await self._posts_service.delete_post(tx, post)
+            self._comments_service.invalidate_comments(tx, post.id)
             return DeletePostResponse(status="Ok")
 
 container.wire(modules=[__name__])
@@ -1,5 +1,8 @@
 from datetime import datetime
-from sqlalchemy import Boolean, Column, DateTime, Integer, String, ForeignKey
+from sqlalchemy import (
+    Boolean, Column, DateTime, ForeignKey, Index, Integer, String
+)
+from sqlalchemy.sql import false, true
 
 from app.components.base.models import Base
 from app.database import UTCNow
@@ -27,6 +30,27 @@ class Post(Base):
     banned: bool = Column(
         Boolean, nullable=False, default=False
     )
+    pending: bool = Column(
+        Boolean, nullable=False, default=False, server_default=false()
+    )
     auto_comment_timeout: int = Column(
         Integer, nullable=True
     )
+
+
+# match the filters and the order of PostRepository.get_posts_query
+Index(
+    "ix_posts_created_at",
+    Post.created_at.desc(), Post.id.desc(),
+    postgresql_where=Post.banned == false(),
+)
+Index(
+    "ix_posts_account_hex_id_created_at",
+    Post.account_hex_id, Post.created_at.desc(), Post.id.desc(),
+    postgresql_where=Post.banned == false(),
+)
+Index(
+    "ix_posts_pending",
+    Post.id,
+    postgresql_where=Post.pending == true(),
+)
@@ -1,12 +1,17 @@
-from sqlalchemy import desc
+from sqlalchemy import desc, exists, true, tuple_, update
+from sqlalchemy.engine import Row
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.future import select
-from sqlalchemy.sql import and_
+from sqlalchemy.sql import Select
+from sqlalchemy.sql import and_, or_
 from sqlmodel.ext.asyncio.session import AsyncSession
-from typing import Optional, List
+from typing import Dict, List, Optional, Sequence
 
+from app.components.accounts.models import Account
+from app.components.posts.consts import POST_COLUMNS
 from app.components.posts.models import Post
 from app.exceptions import LogicError
+from app.pagination import CheckedPage, Cursor, fetch_checked_page
 
 
 class PostRepository:
@@ -17,15 +22,21 @@ class PostRepository:
             await tx.flush()
         except IntegrityError:
             raise LogicError("Invalid post data")
-        await tx.commit()
-        await tx.refresh(post)
         return post
 
+    @staticmethod
+    def visible_to(viewer_hex_id: Optional[str]):
+        """
+        Posts waiting for moderation are shown to their owners only.
+        """
+        return or_(Post.pending == False, Post.account_hex_id == viewer_hex_id)
+
     @staticmethod
     async def get_post(
         tx: AsyncSession, 
         post_id: int, 
-        owner_hex_id: Optional[str] = None
+        owner_hex_id: Optional[str] = None,
+        viewer_hex_id: Optional[str] = None,
     ) -> Post | None:
         q = select(Post).where(and_(
             Post.id == post_id,
@@ -33,24 +44,100 @@ class PostRepository:
         ))
         if owner_hex_id is not None:
             q = q.where(Post.account_hex_id == owner_hex_id)
+        if viewer_hex_id is not None:
+            q = q.where(PostRepository.visible_to(viewer_hex_id))
         raw = await tx.execute(q)
         return raw.scalar_one_or_none()
 
     @staticmethod
-    async def get_posts(
+    async def get_posts_by_ids(
         tx: AsyncSession,
+        post_ids: Sequence[int],
+        viewer_hex_id: Optional[str] = None,
+    ) -> Dict[int, Post]:
+        q = select(Post).where(and_(
+            Post.id.in_(set(post_ids)),
+            Post.banned == False,
+            PostRepository.visible_to(viewer_hex_id)
+        ))
+        raw = await tx.execute(q)
+        return {post.id: post for post in raw.scalars().all()}
+
+    @staticmethod
+    def get_posts_query(
         quantity: int,
         account_hex_id: Optional[str] = None, 
-    ) -> List[Post]:
-        q = select(Post).where(Post.banned == False)
+        viewer_hex_id: Optional[str] = None,
+        after: Optional[Cursor] = None,
+    ) -> Select:
+        """
+        Served by the ix_posts_*_created_at partial indexes,
+        keep the filters and the order in line with them.
+        """
+        q = select(Post).where(and_(
+            Post.banned == False,
+            PostRepository.visible_to(viewer_hex_id)
+        ))
 
         if account_hex_id is not None:
             q = q.where(Post.account_hex_id == account_hex_id)
+        if after is not None:
+            q = q.where(
+                tuple_(Post.created_at, Post.id)
+                < tuple_(after.created_at, after.id)
+            )
+
+        return q.order_by(
+            desc(Post.created_at), desc(Post.id)
+        ).limit(quantity)
 
-        q = q.order_by(desc(Post.created_at)).limit(quantity)
+    @staticmethod
+    async def get_posts(
+        tx: AsyncSession,
+        quantity: int,
+        account_hex_id: Optional[str] = None, 
+        viewer_hex_id: Optional[str] = None,
+        after: Optional[Cursor] = None,
+    ) -> CheckedPage[Row]:
+        """
+        Rows of POST_COLUMNS. Also checks that the owner account
+        exists, in the same statement.
+        """
+        q = PostRepository.get_posts_query(
+            quantity, account_hex_id, viewer_hex_id, after
+        ).with_only_columns(
+            *(getattr(Post, column) for column in POST_COLUMNS)
+        )
+        owner = true()
+        if account_hex_id is not None:
+            owner = exists().where(Account.hex_id == account_hex_id)
+        return await fetch_checked_page(tx, q, owner=owner)
+
+    @staticmethod
+    async def get_pending_post_ids(tx: AsyncSession) -> List[int]:
+        q = select(Post.id).where(Post.pending == True).order_by(Post.id)
         raw = await tx.execute(q)
         return raw.scalars().all()
 
+    @staticmethod
+    async def set_moderation_result(
+        tx: AsyncSession,
+        post_id: int,
+        banned: bool
+    ) -> bool:
+        """
+        Resolves a pending post, False if it was already resolved
+        (e.g. re-moderated by an update) or deleted.
+        """
+        q = (
+            update(Post)
+            .where(and_(Post.id == post_id, Post.pending == True))
+            .values(banned=banned, pending=False)
+            .returning(Post.id)
+        )
+        raw = await tx.execute(q)
+        return raw.scalar_one_or_none() is not None
+
     @staticmethod
     async def delete_post(tx: AsyncSession, post: Post) -> None:
         await tx.delete(post)
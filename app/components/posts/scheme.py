@@ -2,6 +2,8 @@ from datetime import datetime
 from pydantic import BaseModel, Field
 from typing import List, Optional
 
+from app.constants import PAGINATION_SIZE
+
 from app.components.posts.models import Post
 
 
@@ -25,13 +27,18 @@ class UpdatePostRequest(GetPostRequest, CreatePostRequest):
 
 class GetPostsRequest(BaseModel):
     quantity: Optional[int] = Field(
-        50, ge=1, le=100, description="Number of posts to retrieve, "\
+        50, ge=1, le=PAGINATION_SIZE, description="Number of posts to retrieve, "\
                                     "default is 50 if not provided."
     )
     owner_hex_id: Optional[str] = Field(
-        None, pattern=r'^[a-fA-F0-9]{16}$',
+        None, pattern=r'^[a-fA-F0-9]{32}$',
         description="Owner's hexadecimal ID."
     )
+    cursor: Optional[str] = Field(
+        None, max_length=128,
+        description="next_cursor of the previous page, "\
+                    "the first page is returned if not provided."
+    )
 
 
 class GetPostResponse(BaseModel):
@@ -40,6 +47,7 @@ class GetPostResponse(BaseModel):
     account_hex_id: str
     text: str
     edited: bool
+    pending: bool = False
 
     @classmethod
     def from_model(cls, model: Post) -> "GetPostResponse":
@@ -49,11 +57,13 @@ class GetPostResponse(BaseModel):
             account_hex_id=model.account_hex_id,
             text=model.text,
             edited=model.edited,
+            pending=bool(model.pending),
         )
 
 
 class GetPostsResponse(BaseModel):
     posts: List[GetPostResponse]
+    next_cursor: Optional[str] = None
 
 
 class DeletePostResponse(BaseModel):
@@ -1,9 +1,12 @@
+from sqlalchemy.engine import Row
 from sqlmodel.ext.asyncio.session import AsyncSession
-from typing import Optional, List
+from typing import Dict, List, Optional, Sequence
 
 from app.components.posts.models import Post
 from app.components.posts.repo import PostRepository
 from app.components.posts.scheme import GetPostsRequest
+from app.exceptions import LogicError
+from app.pagination import Cursor, Page
 
 
 class PostService:
@@ -17,21 +20,51 @@ class PostService:
         self,
         tx: AsyncSession,
         post_id: int,
-        owner_hex_id: Optional[str] = None
+        owner_hex_id: Optional[str] = None,
+        viewer_hex_id: Optional[str] = None,
     ) -> Post | None:
         return await self._posts_repository.get_post(
-            tx, post_id, owner_hex_id
+            tx, post_id, owner_hex_id, viewer_hex_id
+        )
+
+    async def get_posts_by_ids(
+        self,
+        tx: AsyncSession,
+        post_ids: Sequence[int],
+        viewer_hex_id: Optional[str] = None,
+    ) -> Dict[int, Post]:
+        return await self._posts_repository.get_posts_by_ids(
+            tx, post_ids, viewer_hex_id
         )
 
     async def get_posts(
         self, 
         tx: AsyncSession, 
-        payload: GetPostsRequest
-    ) -> List[Post]:
-        return await self._posts_repository.get_posts(
+        payload: GetPostsRequest,
+        viewer_hex_id: Optional[str] = None,
+    ) -> Page[Row]:
+        after = None
+        if payload.cursor is not None:
+            after = Cursor.decode(payload.cursor)
+        found = await self._posts_repository.get_posts(
             tx, 
-            quantity=payload.quantity, 
-            account_hex_id=payload.owner_hex_id
+            quantity=payload.quantity + 1, 
+            account_hex_id=payload.owner_hex_id,
+            viewer_hex_id=viewer_hex_id,
+            after=after,
+        )
+        if not found.checks["owner"]:
+            raise LogicError("Invalid owner id")
+        return Page.from_rows(found.rows, payload.quantity)
+
+    async def get_pending_post_ids(self, tx: AsyncSession) -> List[int]:
+        return await self._posts_repository.get_pending_post_ids(tx)
+
+    async def set_moderation_result(
+        self, tx: AsyncSession, post_id: int, banned: bool
+    ) -> bool:
+        return await self._posts_repository.set_moderation_result(
+            tx, post_id, banned
         )
     
     async def delete_post(self, tx: AsyncSession, post: Post) -> None:
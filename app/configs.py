@@ -1,10 +1,15 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
+from typing import List, Literal
 
 
 class AuthConfig(BaseModel):
     secret_key: str
     algorithm: str
     token_expiration_minutes: float
+    hashing_workers: int = 4
+    hashing_queue_size: int = 64
+    token_cache_size: int = 10000
+    token_cache_ttl: float = 300
 
 
 class DbConfig(BaseModel):
@@ -12,6 +17,44 @@ class DbConfig(BaseModel):
     master_sync: str
     master_pool_min_size: int
     master_pool_max_size: int
+    master_pool_overflow: int | None = None
+    master_pool_timeout: float = 30
+    master_pool_recycle: int = 1800
+    master_pool_pre_ping: bool = True
+    pooled: bool = True
+    replicas: List[str] = []
+    replica_retry_interval: float = 5
+
+    @field_validator("replicas", mode="before")
+    @classmethod
+    def split_replicas(cls, value: str | List[str] | None) -> List[str]:
+        if value is None:
+            return []
+        if isinstance(value, str):
+            return [dsn.strip() for dsn in value.split(",") if dsn.strip()]
+        return value
+
+
+class CacheConfig(BaseModel):
+    shared_backend: str | None = None
+    accounts_size: int = 10000
+    accounts_ttl: float = 300
+    comment_lists_size: int = 10000
+    comment_lists_ttl: float = 300
+    comment_lists_version_ttl: float = 1
+
+    @field_validator("shared_backend", mode="before")
+    @classmethod
+    def disable_shared_backend(cls, value: str | None) -> str | None:
+        if value in ("", "none"):
+            return None
+        return value
+
+
+class CommentsConfig(BaseModel):
+    scheduler_batch_size: int = 500
+    scheduler_poll_interval: float = 1
+    stats_rollup_interval: float = 60 * 60
 
 
 class EnvConfig(BaseModel):
@@ -30,6 +73,56 @@ class GenerationConfig(BaseModel):
 class GeminiConfig(BaseModel):
     api_key: str
     generation_config: GenerationConfig
+    http2: bool = True
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 30
+    connect_timeout: float = 5
+    timeout: float = 30
+    verdict_cache_size: int = 10000
+    verdict_cache_ttl: float = 60 * 60 * 24
+    verdict_cache_persistent: bool = False
+    batch_max_size: int = 16
+    batch_max_delay_ms: float = 10
+    deferred_moderation: bool = False
+    moderation_workers: int = 4
+    moderation_queue_size: int = 1000
+    moderation_max_attempts: int = 8
+    moderation_retry_base_delay: float = 1
+    moderation_retry_max_delay: float = 300
+    bulk_moderation_concurrency: int = 8
+    prefilter_blocklist: List[str] = []
+    prefilter_allowlist: List[str] = []
+    prefilter_allow_max_length: int = 32
+    rate_limit_rpm: float = 0
+    rate_limit_burst: int = 20
+    retry_attempts: int = 2
+    retry_base_delay: float = 0.2
+    retry_max_delay: float = 2
+    breaker_failure_threshold: int = 5
+    breaker_reset_timeout: float = 30
+    fallback_verdict: Literal["ALLOWED", "BANNED"] | None = None
+    max_in_flight: int = 16
+    in_flight_queue_size: int = 256
+    min_call_budget: float = 1
+
+    @field_validator(
+        "prefilter_blocklist", "prefilter_allowlist", mode="before"
+    )
+    @classmethod
+    def split_words(cls, value: str | List[str] | None) -> List[str]:
+        if value is None or value == "none":
+            return []
+        if isinstance(value, str):
+            return [word.strip() for word in value.split(",") if word.strip()]
+        return value
+
+    @field_validator("fallback_verdict", mode="before")
+    @classmethod
+    def optional_verdict(cls, value: str | None) -> str | None:
+        if value is None or value == "none":
+            return None
+        return value.upper()
 
 
 class AppConfig(BaseModel):
@@ -37,3 +130,5 @@ class AppConfig(BaseModel):
     db: DbConfig
     auth: AuthConfig
     gemini: GeminiConfig
+    cache: CacheConfig = CacheConfig()
+    comments: CommentsConfig = CommentsConfig()
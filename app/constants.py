@@ -6,3 +6,5 @@ load_dotenv()
 PROJECT_DIR = path.dirname(path.abspath(__file__))
 CONFIG_FILE = environ.get("APP_CONFIG_FILE")
 PAGINATION_SIZE = 100
+EXPORT_BATCH_SIZE = 1000
+BULK_COMMENTS_SIZE = 100
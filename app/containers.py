@@ -2,18 +2,30 @@ from dependency_injector import containers, providers
 from passlib.context import CryptContext
 from pyaml_env import parse_config
 
+from app.cache import build_shared_cache
+from app.components.accounts.cache import AccountCache
 from app.components.accounts.repo import AccountRepository
 from app.components.accounts.service import AccountService
+from app.components.auth.hashing import PasswordHasher
 from app.components.auth.repo import AuthRepository
 from app.components.auth.service import AuthService
+from app.components.auth.token_cache import TokenCache
+from app.components.comments.cache import CommentListCache
 from app.components.comments.repo import CommentRepository
+from app.components.comments.scheduler import CommentScheduler
 from app.components.comments.service import CommentService
+from app.components.comments.stats import DailyStatsRollup
+from app.components.gemini.cache import ModerationCache
+from app.components.gemini.moderation import ModerationQueue
+from app.components.gemini.prefilter import ModerationPrefilter
+from app.components.gemini.repo import ModerationVerdictRepository
 from app.components.gemini.service import GeminiService
 from app.components.posts.repo import PostRepository
 from app.components.posts.service import PostService
 from app.configs import AppConfig
 from app.constants import CONFIG_FILE
 from app.database import DB
+from app.metrics import MetricsRegistry
 
 
 class Container(containers.DeclarativeContainer):
@@ -21,44 +33,118 @@ class Container(containers.DeclarativeContainer):
         AppConfig, **parse_config(CONFIG_FILE)
     )
 
+    metrics: providers.Provider = providers.Singleton(MetricsRegistry)
+
     db: providers.Provider = providers.Singleton(
-        DB, config=config.provided.db, debug=config.provided.env.debug
+        DB,
+        config=config.provided.db,
+        metrics=metrics,
+        debug=config.provided.env.debug,
     )
     db_session: providers.Provider = providers.Factory(
         db.provided.get_session
     )
+    db_read_session: providers.Provider = providers.Factory(
+        db.provided.get_read_session
+    )
+
+    shared_cache: providers.Provider = providers.Singleton(
+        build_shared_cache, config=config.provided.cache
+    )
 
     crypt_context: providers.Provider = providers.Singleton(
         CryptContext, schemes=["bcrypt"], deprecated="auto"
     )
+    password_hasher: providers.Provider = providers.Singleton(
+        PasswordHasher,
+        crypt_context=crypt_context,
+        metrics=metrics,
+        max_workers=config.provided.auth.hashing_workers,
+        max_queue=config.provided.auth.hashing_queue_size,
+    )
 
     accounts_repository: providers.Provider = providers.Singleton(
         AccountRepository
     )
+    account_cache: providers.Provider = providers.Singleton(
+        AccountCache,
+        config=config.provided.cache,
+        metrics=metrics,
+        shared_cache=shared_cache,
+        accounts_repository=accounts_repository,
+        db_session=db_session,
+    )
     accounts_service: providers.Provider = providers.Singleton(
         AccountService,
         accounts_repository=accounts_repository,
+        account_cache=account_cache,
     )
 
     auth_repository: providers.Provider = providers.Singleton(AuthRepository)
+    token_cache: providers.Provider = providers.Singleton(
+        TokenCache,
+        config=config.provided.auth,
+        metrics=metrics,
+    )
     auth_service: providers.Provider = providers.Singleton(
         AuthService,
         config=config.provided.auth,
         auth_repository=auth_repository,
-        crypt_context=crypt_context,
+        password_hasher=password_hasher,
     )
 
     comments_repository: providers.Provider = providers.Singleton(
         CommentRepository
     )
+    comment_list_cache: providers.Provider = providers.Singleton(
+        CommentListCache,
+        config=config.provided.cache,
+        metrics=metrics,
+        shared_cache=shared_cache,
+        comments_repository=comments_repository,
+        db_session=db_session,
+    )
     comments_service: providers.Provider = providers.Singleton(
         CommentService,
         comments_repository=comments_repository,
+        comment_list_cache=comment_list_cache,
+    )
+    daily_stats_rollup: providers.Provider = providers.Singleton(
+        DailyStatsRollup,
+        config=config.provided.comments,
+        metrics=metrics,
+        comments_service=comments_service,
+        db_session=db_session,
+    )
+    comment_scheduler: providers.Provider = providers.Singleton(
+        CommentScheduler,
+        config=config.provided.comments,
+        metrics=metrics,
+        comments_service=comments_service,
+        db_session=db_session,
     )
 
+    verdicts_repository: providers.Provider = providers.Singleton(
+        ModerationVerdictRepository
+    )
+    moderation_cache: providers.Provider = providers.Singleton(
+        ModerationCache,
+        config=config.provided.gemini,
+        metrics=metrics,
+        verdicts_repository=verdicts_repository,
+        db_session=db_session,
+    )
+    moderation_prefilter: providers.Provider = providers.Singleton(
+        ModerationPrefilter,
+        config=config.provided.gemini,
+        metrics=metrics,
+    )
     gemini_service: providers.Provider = providers.Singleton(
         GeminiService,
-        config=config.provided.gemini
+        config=config.provided.gemini,
+        metrics=metrics,
+        moderation_cache=moderation_cache,
+        prefilter=moderation_prefilter,
     )
 
     posts_repository: providers.Provider = providers.Singleton(PostRepository)
@@ -67,4 +153,15 @@ class Container(containers.DeclarativeContainer):
         posts_repository=posts_repository,
     )
 
+    moderation_queue: providers.Provider = providers.Singleton(
+        ModerationQueue,
+        config=config.provided.gemini,
+        metrics=metrics,
+        gemini_service=gemini_service,
+        posts_service=posts_service,
+        comments_service=comments_service,
+        comment_scheduler=comment_scheduler,
+        db_session=db_session,
+    )
+
 container = Container()
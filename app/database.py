@@ -1,14 +1,20 @@
+import asyncio
+
 from contextlib import asynccontextmanager
-from sqlalchemy import DateTime
+from loguru import logger
+from sqlalchemy import DateTime, event
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import AsyncSession, AsyncEngine, create_async_engine
 from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 from sqlalchemy.sql import expression
-from typing import AsyncGenerator
+from time import monotonic, perf_counter
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List
 
 from app.configs import DbConfig
 from app.exceptions import LogicError
+from app.metrics import MetricsRegistry
 
 
 class UTCNow(expression.FunctionElement):
@@ -19,43 +25,164 @@ def pg_utcnow(_, __, **___):
     return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
 
 
+def after_commit(
+    tx: AsyncSession,
+    callback: Callable[[], Awaitable[None]]
+) -> None:
+    """
+    Runs callback once the DB.get_session transaction is committed,
+    it is dropped if the transaction is rolled back.
+    """
+    tx.info.setdefault("after_commit", []).append(callback)
+
+
+async def run_after_commit(tx: AsyncSession) -> None:
+    """
+    Runs the callbacks registered on tx, once it is committed.
+    """
+    for callback in tx.info.pop("after_commit", []):
+        try:
+            await callback()
+        except Exception as e:
+            logger.exception(f"After commit callback failed: {e}")
+
+
+class Replica:
+    def __init__(self, name: str, engine: AsyncEngine):
+        self.name = name
+        self.engine = engine
+        self.session_factory = sessionmaker( #type: ignore
+            engine, class_=AsyncSession, expire_on_commit=False
+        )
+        self.retry_at: float = 0
+
+    @property
+    def healthy(self) -> bool:
+        return monotonic() >= self.retry_at
+
+
 class DB:
-    def __init__(self, config: DbConfig, *, debug: bool = False):
+    def __init__(
+        self,
+        config: DbConfig,
+        metrics: MetricsRegistry,
+        *,
+        debug: bool = False
+    ):
         self._config = config
+        self._metrics = metrics
         self._debug = debug
         self._db_url = self._config.master
         self._engine: AsyncEngine | None = None
         self._async_session: AsyncSession | None = None
+        self._replicas: List[Replica] = []
+        self._next_replica = 0
+
+    def _pool_options(self) -> Dict[str, Any]:
+        if not self._config.pooled:
+            return {"poolclass": NullPool}
+
+        overflow = self._config.master_pool_overflow
+        if overflow is None:
+            overflow = max(
+                self._config.master_pool_max_size
+                - self._config.master_pool_min_size,
+                0
+            )
+        return {
+            "poolclass": AsyncAdaptedQueuePool,
+            "pool_size": self._config.master_pool_min_size,
+            "max_overflow": overflow,
+            "pool_timeout": self._config.master_pool_timeout,
+            "pool_recycle": self._config.master_pool_recycle,
+            "pool_pre_ping": self._config.master_pool_pre_ping,
+        }
+
+    def _instrument(self, engine: AsyncEngine, name: str) -> None:
+        connects = self._metrics.counter(f"db.{name}.pool.connects")
+        checked_out = self._metrics.gauge(f"db.{name}.pool.checked_out")
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def on_connect(*_) -> None:
+            connects.inc()
+
+        @event.listens_for(engine.sync_engine, "checkout")
+        def on_checkout(*_) -> None:
+            checked_out.inc()
+
+        @event.listens_for(engine.sync_engine, "checkin")
+        def on_checkin(*_) -> None:
+            checked_out.dec()
 
     async def init_db(self, db_url: str | None = None) -> None:
-        if isinstance(db_url, str):
+        """
+        Builds the engine once. Subsequent calls are no-ops
+        unless a different url is passed.
+        """
+        if isinstance(db_url, str) and db_url != self._db_url:
             self._db_url = db_url
+            await self.dispose()
+        if self._engine is not None:
+            return
 
-        self._engine = create_async_engine(
-            self._db_url,
-            echo=self._debug,
-            future=True,
-            poolclass=NullPool,
-        )
-
+        self._engine = self._create_engine(self._db_url, "master")
+        self._replicas = [
+            Replica(f"replica{i}", self._create_engine(dsn, f"replica{i}"))
+            for i, dsn in enumerate(self._config.replicas)
+        ]
         self._async_session = sessionmaker( #type: ignore
             self._engine, class_=AsyncSession, expire_on_commit=False
         )
 
+    def _create_engine(self, db_url: str, name: str) -> AsyncEngine:
+        engine = create_async_engine(
+            db_url,
+            echo=self._debug,
+            future=True,
+            **self._pool_options(),
+        )
+        self._instrument(engine, name)
+        return engine
+
     @property
     def db_url(self) -> str:
         return self._db_url
 
+    def pool_status(self) -> str:
+        if self._engine is None:
+            return "not initialized"
+        return self._engine.pool.status()
+
     async def dispose(self) -> None:
-        await self._engine.dispose()
+        if self._engine is not None:
+            await self._engine.dispose()
+        for replica in self._replicas:
+            await replica.engine.dispose()
+        self._engine = None
+        self._async_session = None
+        self._replicas = []
+
+    async def _checkout(self, session: AsyncSession, name: str) -> None:
+        started = perf_counter()
+        try:
+            await session.connection()
+        except PoolTimeoutError:
+            self._metrics.counter(f"db.{name}.pool.timeouts").inc()
+            raise
+        finally:
+            self._metrics.histogram(f"db.{name}.pool.checkout_ms").observe(
+                (perf_counter() - started) * 1000
+            )
 
     @asynccontextmanager
     async def get_session(self) -> AsyncGenerator[AsyncSession, None]:
-        await self.init_db()
+        if self._async_session is None:
+            await self.init_db()
 
         session: AsyncSession = self._async_session()
         async with session:
             try:
+                await self._checkout(session, "master")
                 yield session
             except LogicError as e:
                 await session.rollback()
@@ -65,5 +192,58 @@ class DB:
                 raise
             else:
                 await session.commit()
+                await run_after_commit(session)
             finally:
                 await session.close()
+
+    async def _open_replica_session(self) -> AsyncSession | None:
+        """
+        Round-robins over replicas that are not in their retry window.
+        A replica that can't be connected to is benched for
+        replica_retry_interval seconds. One whose pool is exhausted is
+        only busy, the next one is tried and it stays in rotation.
+        """
+        count = len(self._replicas)
+        for offset in range(count):
+            replica = self._replicas[(self._next_replica + offset) % count]
+            if not replica.healthy:
+                continue
+            session: AsyncSession = replica.session_factory()
+            try:
+                await self._checkout(session, replica.name)
+            except PoolTimeoutError:
+                await session.close()
+                continue
+            except (OSError, DBAPIError, asyncio.TimeoutError):
+                await session.close()
+                replica.retry_at = (
+                    monotonic() + self._config.replica_retry_interval
+                )
+                self._metrics.counter(f"db.{replica.name}.failures").inc()
+                continue
+            self._next_replica = (self._next_replica + offset + 1) % count
+            return session
+        return None
+
+    @asynccontextmanager
+    async def get_read_session(self) -> AsyncGenerator[AsyncSession, None]:
+        """
+        Session for read-only work. Served by a replica when one is
+        configured and reachable, otherwise falls back to master.
+        """
+        if self._async_session is None:
+            await self.init_db()
+
+        session = await self._open_replica_session()
+        if session is None:
+            if self._replicas:
+                self._metrics.counter("db.replicas.fallbacks").inc()
+            async with self.get_session() as session:
+                yield session
+            return
+
+        async with session:
+            try:
+                yield session
+            finally:
+                await session.rollback()
@@ -0,0 +1,45 @@
+from fastapi import Response
+from hashlib import blake2b
+from http import HTTPStatus
+from pydantic import BaseModel
+from typing import Any, Iterable, Optional, Type
+
+
+def make_etag(
+    rows: Iterable[Any],
+    response_model: Type[BaseModel],
+    *extra: Any
+) -> str:
+    """
+    Digest of the rows' fields that response_model exposes, so it
+    changes whenever the serialized response would, edits included.
+    """
+    fields = tuple(response_model.model_fields)
+    digest = blake2b(digest_size=16)
+    for row in rows:
+        digest.update(
+            repr(tuple(getattr(row, field) for field in fields)).encode()
+        )
+    for value in extra:
+        digest.update(repr(value).encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Weak comparison, as If-None-Match requires.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        candidate.strip().removeprefix("W/") == etag
+        for candidate in if_none_match.split(",")
+    )
+
+
+def not_modified(etag: str) -> Response:
+    return Response(
+        status_code=HTTPStatus.NOT_MODIFIED, headers={"ETag": etag}
+    )
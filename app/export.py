@@ -0,0 +1,71 @@
+import csv
+import enum
+import io
+import json
+
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Mapping, Sequence
+
+from app.constants import EXPORT_BATCH_SIZE
+
+
+@enum.unique
+class ExportFormatEnum(str, enum.Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+MEDIA_TYPES = {
+    ExportFormatEnum.NDJSON: "application/x-ndjson",
+    ExportFormatEnum.CSV: "text/csv",
+}
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    raise TypeError(f"{type(value).__name__} is not serializable")
+
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, (date, enum.Enum)):
+        return _default(value)
+    return value
+
+
+async def encode_rows(
+    rows: AsyncIterator[Mapping[str, Any]],
+    export_format: ExportFormatEnum,
+    columns: Sequence[str],
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> AsyncIterator[bytes]:
+    """
+    Encodes rows as NDJSON lines or CSV (with a header) and hands them
+    out in chunks of up to batch_size rows.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if export_format == ExportFormatEnum.CSV:
+        writer.writerow(columns)
+
+    pending = 0
+    async for row in rows:
+        if export_format == ExportFormatEnum.CSV:
+            writer.writerow([_csv_value(row[column]) for column in columns])
+        else:
+            buffer.write(json.dumps(
+                {column: row[column] for column in columns},
+                default=_default,
+                ensure_ascii=False
+            ))
+            buffer.write("\n")
+        pending += 1
+        if pending >= batch_size:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue().encode()
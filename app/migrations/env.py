@@ -17,7 +17,13 @@ from app.components.base.models import Base
 from app.components.accounts.models import Account
 from app.components.auth.models import Auth
 from app.components.posts.models import Post
-from app.components.comments.models import Comment
+from app.components.comments.models import (
+    Comment,
+    CommentDailyDimStats,
+    CommentDailyStats,
+    ScheduledComment
+)
+from app.components.gemini.models import ModerationVerdict
 
 
 # Interpret the config file for Python logging.
@@ -0,0 +1,35 @@
+"""Moderation verdicts cache
+
+Revision ID: 7c1f4e2a9b3d
+Revises: 550447043b8e
+Create Date: 2026-10-18 10:30:12.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c1f4e2a9b3d'
+down_revision: Union[str, None] = '550447043b8e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('moderation_verdicts',
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('version', sa.String(length=16), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text("TIMEZONE('utc', CURRENT_TIMESTAMP)"), nullable=False),
+    sa.Column('allowed', sa.Boolean(), nullable=False),
+    sa.Column('message', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index(op.f('ix_moderation_verdicts_version'), 'moderation_verdicts', ['version'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_moderation_verdicts_version'), table_name='moderation_verdicts')
+    op.drop_table('moderation_verdicts')
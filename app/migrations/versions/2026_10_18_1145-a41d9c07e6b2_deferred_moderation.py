@@ -0,0 +1,28 @@
+"""Deferred moderation
+
+Revision ID: a41d9c07e6b2
+Revises: 7c1f4e2a9b3d
+Create Date: 2026-10-18 11:45:40.530117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a41d9c07e6b2'
+down_revision: Union[str, None] = '7c1f4e2a9b3d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('posts', sa.Column('pending', sa.Boolean(), server_default=sa.false(), nullable=False))
+    op.add_column('comments', sa.Column('pending', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('comments', 'pending')
+    op.drop_column('posts', 'pending')
@@ -0,0 +1,38 @@
+"""Scheduled comments
+
+Revision ID: d83b51f0c6a4
+Revises: a41d9c07e6b2
+Create Date: 2026-10-18 13:20:11.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd83b51f0c6a4'
+down_revision: Union[str, None] = 'a41d9c07e6b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('scheduled_comments',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('due_at', sa.DateTime(), nullable=False),
+    sa.Column('account_hex_id', sa.String(length=32), nullable=False),
+    sa.Column('post_id', sa.Integer(), nullable=False),
+    sa.Column('text', sa.String(), nullable=False),
+    sa.ForeignKeyConstraint(['account_hex_id'], ['accounts.hex_id'], ondelete='cascade'),
+    sa.ForeignKeyConstraint(['post_id'], ['posts.id'], ondelete='cascade'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('id')
+    )
+    op.create_index(op.f('ix_scheduled_comments_due_at'), 'scheduled_comments', ['due_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_scheduled_comments_due_at'), table_name='scheduled_comments')
+    op.drop_table('scheduled_comments')
@@ -0,0 +1,41 @@
+"""List indexes
+
+Revision ID: 5e2a7f4c1b90
+Revises: d83b51f0c6a4
+Create Date: 2026-10-18 14:10:37.815294
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e2a7f4c1b90'
+down_revision: Union[str, None] = 'd83b51f0c6a4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # built concurrently so that writes are not blocked on large tables
+    with op.get_context().autocommit_block():
+        op.create_index('ix_posts_created_at', 'posts', [sa.text('created_at DESC'), sa.text('id DESC')], unique=False, postgresql_where=sa.text('banned = false'), postgresql_concurrently=True)
+        op.create_index('ix_posts_account_hex_id_created_at', 'posts', ['account_hex_id', sa.text('created_at DESC'), sa.text('id DESC')], unique=False, postgresql_where=sa.text('banned = false'), postgresql_concurrently=True)
+        op.create_index('ix_posts_pending', 'posts', ['id'], unique=False, postgresql_where=sa.text('pending = true'), postgresql_concurrently=True)
+        op.create_index('ix_comments_post_id_created_at', 'comments', ['post_id', sa.text('created_at DESC'), sa.text('id DESC')], unique=False, postgresql_where=sa.text('banned = false'), postgresql_concurrently=True)
+        op.create_index('ix_comments_post_id_account_hex_id_created_at', 'comments', ['post_id', 'account_hex_id', sa.text('created_at DESC'), sa.text('id DESC')], unique=False, postgresql_where=sa.text('banned = false'), postgresql_concurrently=True)
+        op.create_index('ix_comments_created_at', 'comments', ['created_at'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_comments_pending', 'comments', ['id'], unique=False, postgresql_where=sa.text('pending = true'), postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_comments_pending', table_name='comments', postgresql_concurrently=True)
+        op.drop_index('ix_comments_created_at', table_name='comments', postgresql_concurrently=True)
+        op.drop_index('ix_comments_post_id_account_hex_id_created_at', table_name='comments', postgresql_concurrently=True)
+        op.drop_index('ix_comments_post_id_created_at', table_name='comments', postgresql_concurrently=True)
+        op.drop_index('ix_posts_pending', table_name='posts', postgresql_concurrently=True)
+        op.drop_index('ix_posts_account_hex_id_created_at', table_name='posts', postgresql_concurrently=True)
+        op.drop_index('ix_posts_created_at', table_name='posts', postgresql_concurrently=True)
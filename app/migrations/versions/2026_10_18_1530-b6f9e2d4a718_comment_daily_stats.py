@@ -0,0 +1,64 @@
+"""Comment daily stats
+
+Revision ID: b6f9e2d4a718
+Revises: 5e2a7f4c1b90
+Create Date: 2026-10-18 15:30:52.640193
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6f9e2d4a718'
+down_revision: Union[str, None] = '5e2a7f4c1b90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('comment_daily_stats',
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('created', sa.Integer(), nullable=False),
+    sa.Column('blocked', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('date')
+    )
+    op.execute("""
+    CREATE OR REPLACE FUNCTION comment_daily_stats_apply() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'UPDATE'
+            AND OLD.banned = NEW.banned
+            AND OLD.created_at = NEW.created_at THEN
+            RETURN NULL;
+        END IF;
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            UPDATE comment_daily_stats
+            SET created = created - (NOT OLD.banned)::int,
+                blocked = blocked - OLD.banned::int
+            WHERE date = OLD.created_at::date;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            UPDATE comment_daily_stats
+            SET created = created + (NOT NEW.banned)::int,
+                blocked = blocked + NEW.banned::int
+            WHERE date = NEW.created_at::date;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+    CREATE TRIGGER comments_daily_stats
+    AFTER INSERT OR DELETE OR UPDATE OF banned, created_at ON comments
+    FOR EACH ROW EXECUTE FUNCTION comment_daily_stats_apply();
+    """)
+    # the rollup is filled by python -m app.components.comments.stats
+    # and by the app in the background
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS comments_daily_stats ON comments")
+    op.execute("DROP FUNCTION IF EXISTS comment_daily_stats_apply()")
+    op.drop_table('comment_daily_stats')
@@ -0,0 +1,98 @@
+"""Comment daily dim stats
+
+Revision ID: 8d0c3e5b7a21
+Revises: b6f9e2d4a718
+Create Date: 2026-10-18 16:40:18.093571
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d0c3e5b7a21'
+down_revision: Union[str, None] = 'b6f9e2d4a718'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION comment_daily_stats_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+        AND OLD.banned = NEW.banned
+        AND OLD.created_at = NEW.created_at THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE comment_daily_stats
+        SET created = created - (NOT OLD.banned)::int,
+            blocked = blocked - OLD.banned::int
+        WHERE date = OLD.created_at::date;
+        {old_dim}
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE comment_daily_stats
+        SET created = created + (NOT NEW.banned)::int,
+            blocked = blocked + NEW.banned::int
+        WHERE date = NEW.created_at::date;
+        {new_dim}
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+OLD_DIM = """
+        UPDATE comment_daily_dim_stats
+        SET created = created - (NOT OLD.banned)::int,
+            blocked = blocked - OLD.banned::int
+        WHERE date = OLD.created_at::date
+            AND post_id = OLD.post_id
+            AND account_hex_id = OLD.account_hex_id;
+"""
+
+NEW_DIM = """
+        UPDATE comment_daily_dim_stats
+        SET created = created + (NOT NEW.banned)::int,
+            blocked = blocked + NEW.banned::int
+        WHERE date = NEW.created_at::date
+            AND post_id = NEW.post_id
+            AND account_hex_id = NEW.account_hex_id;
+"""
+
+
+def upgrade() -> None:
+    op.create_table('comment_daily_dim_stats',
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('post_id', sa.Integer(), nullable=False),
+    sa.Column('account_hex_id', sa.String(length=32), nullable=False),
+    sa.Column('created', sa.Integer(), nullable=False),
+    sa.Column('blocked', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('date', 'post_id', 'account_hex_id')
+    )
+    op.create_index('ix_comment_daily_dim_stats_post_id_date', 'comment_daily_dim_stats', ['post_id', 'date'], unique=False)
+    op.create_index('ix_comment_daily_dim_stats_account_hex_id_date', 'comment_daily_dim_stats', ['account_hex_id', 'date'], unique=False)
+    op.execute(TRIGGER_FUNCTION.format(old_dim=OLD_DIM, new_dim=NEW_DIM))
+    # slice the days that are already sealed
+    op.execute("LOCK TABLE comment_daily_stats IN SHARE ROW EXCLUSIVE MODE")
+    op.execute("""
+    INSERT INTO comment_daily_dim_stats
+        (date, post_id, account_hex_id, created, blocked)
+    SELECT created_at::date, post_id, account_hex_id,
+        sum((NOT banned)::int), sum(banned::int)
+    FROM comments
+    WHERE created_at < (
+        SELECT max(date) + 1 FROM comment_daily_stats
+    )
+    GROUP BY created_at::date, post_id, account_hex_id
+    """)
+
+
+def downgrade() -> None:
+    op.execute(TRIGGER_FUNCTION.format(old_dim="", new_dim=""))
+    op.drop_index('ix_comment_daily_dim_stats_account_hex_id_date', table_name='comment_daily_dim_stats')
+    op.drop_index('ix_comment_daily_dim_stats_post_id_date', table_name='comment_daily_dim_stats')
+    op.drop_table('comment_daily_dim_stats')
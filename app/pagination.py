@@ -0,0 +1,94 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as Base64Error
+from datetime import datetime
+from sqlalchemy import Row, desc, select, true
+from sqlalchemy.sql import ColumnElement, Select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import (
+    Dict,
+    Generic,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    TypeVar
+)
+
+from app.exceptions import LogicError
+
+T = TypeVar("T")
+
+
+class Cursor(NamedTuple):
+    """
+    Position after the last returned row in (created_at, id) DESC order.
+    """
+    created_at: datetime
+    id: int
+
+    def encode(self) -> str:
+        raw = f"{self.created_at.isoformat()}|{self.id}".encode()
+        return urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, value: str) -> "Cursor":
+        try:
+            raw = urlsafe_b64decode(value + "=" * (-len(value) % 4)).decode()
+            created_at, id_ = raw.split("|")
+            return cls(datetime.fromisoformat(created_at), int(id_))
+        except (Base64Error, UnicodeDecodeError, ValueError):
+            raise LogicError("Invalid cursor")
+
+
+class Page(NamedTuple, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str]
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[T], quantity: int) -> "Page[T]":
+        """
+        Rows are expected to be fetched with limit quantity + 1,
+        the extra one only tells whether there is a next page.
+        """
+        items = list(rows[:quantity])
+        next_cursor = None
+        if len(rows) > quantity:
+            last = items[-1]
+            next_cursor = Cursor(last.created_at, last.id).encode()
+        return cls(items, next_cursor)
+
+
+class CheckedPage(NamedTuple, Generic[T]):
+    checks: Dict[str, bool]
+    rows: List[T]
+
+
+async def fetch_checked_page(
+    tx: AsyncSession,
+    page: Select,
+    **checks: ColumnElement[bool]
+) -> CheckedPage[Row]:
+    """
+    Runs the existence checks and the page query in one statement.
+    The checks are a single row left joined with the page, so they
+    come back even if the page is empty (its columns are None then).
+    Rows start with the page columns, the check_* ones follow.
+    """
+    checks_row = select(
+        *(check.label(f"check_{name}") for name, check in checks.items())
+    ).subquery("checks")
+    rows = page.subquery("page")
+    q = (
+        select(*rows.c, checks_row)
+        .select_from(checks_row)
+        .outerjoin(rows, true())
+        .order_by(desc(rows.c.created_at), desc(rows.c.id))
+    )
+    raw = (await tx.execute(q)).all()
+    return CheckedPage(
+        {
+            name: bool(raw[0]._mapping[f"check_{name}"])
+            for name in checks
+        },
+        [row for row in raw if row.id is not None]
+    )
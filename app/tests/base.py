@@ -79,6 +79,48 @@ class ApiRequests:
             assert resp.status_code == expected_status_code, resp.content
             return resp.json()
 
+    async def export(
+        self,
+        endpoint: Optional[str] = None,
+        expected_status_code: HTTPStatus = HTTPStatus.OK,
+        **kwargs
+    ) -> str:
+        async with AsyncClient(
+            transport=ASGITransport(app=app),
+            base_url="http://testserver",
+            timeout=30
+        ) as api_client:
+            resp = await api_client.get(
+                endpoint or self.API_ENDPOINT,
+                headers=self.headers,
+                params=kwargs,
+            )
+            assert resp.status_code == expected_status_code, resp.content
+            return resp.text
+
+    async def get_conditional(
+        self,
+        endpoint: Optional[str] = None,
+        etag: Optional[str] = None,
+        expected_status_code: HTTPStatus = HTTPStatus.OK,
+        **kwargs
+    ) -> Response:
+        headers = dict(self.headers)
+        if etag is not None:
+            headers["If-None-Match"] = etag
+        async with AsyncClient(
+            transport=ASGITransport(app=app),
+            base_url="http://testserver",
+            timeout=30
+        ) as api_client:
+            resp = await api_client.get(
+                endpoint or self.API_ENDPOINT,
+                headers=headers,
+                params=kwargs,
+            )
+            assert resp.status_code == expected_status_code, resp.content
+            return resp
+
     async def create(
         self, 
         endpoint: Optional[str] = None,
@@ -154,3 +196,7 @@ class CommentAPI(ApiRequests):
 
 class PostAPI(ApiRequests):
     API_ENDPOINT: str = "/api/v1/post"
+
+
+class MetricsAPI(ApiRequests):
+    API_ENDPOINT: str = "/api/v1/metrics"
@@ -0,0 +1,60 @@
+"""
+Compares the compiled scope matcher with the previous
+string-splitting implementation.
+
+    python -m app.tests.benchmarks.bench_scopes
+"""
+from timeit import timeit
+
+from app.components.auth.consts import RolePermissionsEnum, ScopeEnum
+from app.components.auth.scopes import (
+    compile_required_scopes,
+    compile_scopes,
+    is_granted
+)
+
+
+def legacy_check_scopes(token_scopes: str, required_scopes: str) -> bool:
+    if token_scopes == "*:*":
+        return True
+    rscopes = required_scopes.split(" ")
+    for scope in token_scopes.split(" "):
+        if not rscopes:
+            return True
+        group, func = scope.split(":")
+        cur_rscope_i = 0
+        while cur_rscope_i < len(rscopes):
+            rgroup, rfunc = rscopes[cur_rscope_i].split(":")
+            if group not in ("*", rgroup) or func not in ("*", rfunc):
+                cur_rscope_i += 1
+            else:
+                del rscopes[cur_rscope_i]
+
+    return not rscopes
+
+
+def main(number: int = 200_000) -> None:
+    token_scopes = RolePermissionsEnum.ADMIN.value
+    required = (ScopeEnum.STATISTICS_GET.value, ScopeEnum.COMMENTS_GET.value)
+    required_str = " ".join(required)
+
+    # what check_auth does per request: masks are compiled once per
+    # token (TokenCache) and once per Scopes(...) dependency
+    token_mask = compile_scopes(tuple(token_scopes.split(" ")))
+    required_mask = compile_required_scopes(required)
+
+    legacy = timeit(
+        lambda: legacy_check_scopes(token_scopes, required_str),
+        number=number
+    )
+    compiled = timeit(
+        lambda: is_granted(token_mask, required_mask),
+        number=number
+    )
+    print(f"legacy   {legacy / number * 1e9:8.1f} ns/check")
+    print(f"compiled {compiled / number * 1e9:8.1f} ns/check")
+    print(f"speedup  {legacy / compiled:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
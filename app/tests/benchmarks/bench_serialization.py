@@ -0,0 +1,102 @@
+"""
+Compares serializing a 100 row comments page the way GET /comments
+used to (ORM objects, from_model, response_model validation) with
+the row tuple path that page_response takes.
+
+    python -m app.tests.benchmarks.bench_serialization
+"""
+import asyncio
+
+from datetime import datetime, timedelta
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from sqlalchemy.engine.result import result_tuple
+from time import perf_counter
+from typing import Any, Callable, List, Tuple
+
+from app.components.comments.consts import COMMENT_COLUMNS
+from app.components.comments.models import Comment
+from app.components.comments.scheme import (
+    GetCommentResponse,
+    GetCommentsResponse
+)
+from app.responses import page_response
+
+ROWS = 100
+
+Row = result_tuple(COMMENT_COLUMNS)
+RESPONSE_FIELD = create_model_field(
+    name="Response_get_comments",
+    type_=GetCommentsResponse,
+    mode="serialization",
+)
+
+
+def make_values(rows: int = ROWS) -> List[Tuple[Any, ...]]:
+    now = datetime.utcnow()
+    return [
+        (
+            i,
+            now - timedelta(seconds=i),
+            "a" * 32,
+            1,
+            f"comment number {i} " * 8,
+            i % 7 == 0,
+            False,
+        )
+        for i in range(rows)
+    ]
+
+
+async def legacy_page(values: List[Tuple[Any, ...]]) -> bytes:
+    # what the endpoint got from the ORM: one mapped object per row
+    comments = [
+        Comment(**dict(zip(COMMENT_COLUMNS, value))) for value in values
+    ]
+    content = GetCommentsResponse(
+        comments=[
+            GetCommentResponse.from_model(comment) for comment in comments
+        ],
+        next_cursor="cursor",
+    )
+    # and what FastAPI did with it because of response_model
+    serialized = await serialize_response(
+        field=RESPONSE_FIELD, response_content=content
+    )
+    return JSONResponse(serialized).body
+
+
+async def lean_page(values: List[Tuple[Any, ...]]) -> bytes:
+    # Row tuples as the column select returns them
+    rows = [Row(value) for value in values]
+    return page_response("comments", rows, COMMENT_COLUMNS, "cursor").body
+
+
+async def measure(
+    page: Callable,
+    values: List[Tuple[Any, ...]],
+    number: int
+) -> float:
+    started = perf_counter()
+    for _ in range(number):
+        await page(values)
+    return (perf_counter() - started) / number
+
+
+async def run(number: int) -> None:
+    values = make_values()
+    legacy = await measure(legacy_page, values, number)
+    lean = await measure(lean_page, values, number)
+    print(f"legacy   {legacy * 1e6:8.1f} us/request ({ROWS} rows)")
+    print(f"lean     {lean * 1e6:8.1f} us/request ({ROWS} rows)")
+    print(f"saved    {(legacy - lean) * 1e6:8.1f} us/request")
+    print(f"speedup  {legacy / lean:8.1f}x")
+
+
+def main(number: int = 2000) -> None:
+    asyncio.run(run(number))
+
+
+if __name__ == "__main__":
+    main()
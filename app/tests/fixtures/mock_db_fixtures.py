@@ -5,10 +5,31 @@ from sqlalchemy.ext.asyncio import (
     AsyncEngine,
     create_async_engine
 )
+from contextlib import asynccontextmanager
 from sqlalchemy.orm import sessionmaker
-from typing import AsyncGenerator
+from typing import Any, AsyncGenerator, Dict
 
 from app.containers import container
+from app.database import run_after_commit
+
+
+class FakeTransaction:
+    """
+    Stands in for a session where only after_commit is used.
+    """
+
+    def __init__(self) -> None:
+        self.info: Dict[str, Any] = {}
+
+
+@asynccontextmanager
+async def fake_transaction() -> AsyncGenerator[FakeTransaction, None]:
+    """
+    Like DB.get_session: callbacks run on success only.
+    """
+    tx = FakeTransaction()
+    yield tx
+    await run_after_commit(tx)
 
 
 @pytest_asyncio.fixture
@@ -0,0 +1,83 @@
+import pytest
+
+from contextlib import asynccontextmanager
+from datetime import datetime
+from pydantic import ValidationError
+from typing import AsyncGenerator
+
+from app.components.accounts.cache import AccountCache, CachedAccount
+from app.components.accounts.models import Account
+from app.components.accounts.service import AccountService
+from app.configs import CacheConfig
+from app.metrics import MetricsRegistry
+from app.tests.fixtures.mock_db_fixtures import fake_transaction
+
+
+class CountingRepository:
+    """
+    Stands in for AccountRepository, every load is a new ORM object.
+    """
+
+    def __init__(self) -> None:
+        self.loads = 0
+        self.login = "first"
+
+    async def get_account(self, _, account_id: int) -> Account | None:
+        self.loads += 1
+        if account_id != 1:
+            return None
+        return Account(
+            id=account_id,
+            created_at=datetime(2024, 1, 1),
+            hex_id="a" * 32,
+            login=self.login,
+        )
+
+
+@asynccontextmanager
+async def fake_session() -> AsyncGenerator[None, None]:
+    yield None
+
+
+def make_service(repository: CountingRepository) -> AccountService:
+    account_cache = AccountCache(
+        CacheConfig(), MetricsRegistry(), None, repository, fake_session
+    )
+    return AccountService(repository, account_cache)
+
+
+@pytest.mark.asyncio
+async def test_account_cache_snapshot() -> None:
+    repository = CountingRepository()
+    service = make_service(repository)
+    account = await service.get_cached_account(1)
+    assert isinstance(account, CachedAccount)
+    assert account.hex_id == "a" * 32 and account.login == "first"
+    assert await service.get_cached_account(1) is account
+    assert repository.loads == 1
+    # shared between requests, so it can't be changed by one of them
+    with pytest.raises(ValidationError):
+        account.login = "changed"
+    assert await service.get_cached_account(2) is None
+
+
+@pytest.mark.asyncio
+async def test_account_cache_invalidation() -> None:
+    repository = CountingRepository()
+    service = make_service(repository)
+    await service.get_cached_account(1)
+
+    # a rolled back change keeps the cached copy
+    with pytest.raises(RuntimeError):
+        async with fake_transaction() as tx:
+            service.invalidate_account(tx, 1)
+            raise RuntimeError("rollback")
+    assert (await service.get_cached_account(1)).login == "first"
+
+    repository.login = "second"
+    async with fake_transaction() as tx:
+        service.invalidate_account(tx, 1)
+        # still served until the change commits
+        assert (await service.get_cached_account(1)).login == "first"
+    assert (await service.get_cached_account(1)).login == "second"
+    assert repository.loads == 2
@@ -0,0 +1,100 @@
+import asyncio
+import pytest
+
+from time import monotonic
+
+from app.components.gemini.bulkhead import Bulkhead
+from app.components.gemini.consts import ModerationPriorityEnum
+from app.components.gemini.exceptions import GeminiUnavailableError
+from app.metrics import MetricsRegistry
+
+INTERACTIVE = ModerationPriorityEnum.INTERACTIVE
+AUTO_REPLY = ModerationPriorityEnum.AUTO_REPLY
+BACKGROUND = ModerationPriorityEnum.BACKGROUND
+
+
+@pytest.mark.asyncio
+async def test_bulkhead_priorities() -> None:
+    metrics = MetricsRegistry()
+    bulkhead = Bulkhead(
+        "test.bulkhead", metrics, max_in_flight=2, queue_size=3, min_budget=0
+    )
+    deadline = monotonic() + 10
+    await bulkhead.acquire(INTERACTIVE, deadline)
+    await bulkhead.acquire(INTERACTIVE, deadline)
+
+    granted = []
+
+    async def call(name: str, priority: ModerationPriorityEnum) -> None:
+        await bulkhead.acquire(priority, deadline)
+        granted.append(name)
+
+    tasks = [
+        asyncio.create_task(call(name, priority))
+        for name, priority in [
+            ("reply", AUTO_REPLY),
+            ("background", BACKGROUND),
+            ("plain", INTERACTIVE),
+        ]
+    ]
+    await asyncio.sleep(0)
+    assert metrics.snapshot()["test.bulkhead.queued"] == 3
+
+    # the queue is full: the least urgent call makes room for a more
+    # urgent one, and nothing makes room for the least urgent ones
+    tasks.append(asyncio.create_task(call("second reply", AUTO_REPLY)))
+    await asyncio.sleep(0)
+    with pytest.raises(GeminiUnavailableError):
+        await tasks[1]
+    with pytest.raises(GeminiUnavailableError):
+        await bulkhead.acquire(BACKGROUND, deadline)
+
+    for _ in range(3):
+        bulkhead.release()
+        await asyncio.sleep(0.01)
+    assert granted == ["plain", "reply", "second reply"], granted
+    assert bulkhead.in_flight == 2
+    bulkhead.release()
+    bulkhead.release()
+    assert bulkhead.in_flight == 0
+    snapshot = metrics.snapshot()
+    assert snapshot["test.bulkhead.evicted"] == 1, snapshot
+    assert snapshot["test.bulkhead.rejected"] == 2, snapshot
+    assert snapshot["test.bulkhead.queued"] == 0, snapshot
+
+
+@pytest.mark.asyncio
+async def test_bulkhead_deadlines() -> None:
+    bulkhead = Bulkhead(
+        "test.bulkhead",
+        MetricsRegistry(),
+        max_in_flight=1,
+        queue_size=10,
+        min_budget=0.5,
+    )
+    # not enough time left to make the call at all
+    with pytest.raises(GeminiUnavailableError):
+        await bulkhead.acquire(INTERACTIVE, monotonic() + 0.4)
+
+    await bulkhead.acquire(INTERACTIVE, monotonic() + 10)
+    # queued until only min_budget would be left
+    started = monotonic()
+    with pytest.raises(GeminiUnavailableError):
+        await bulkhead.acquire(INTERACTIVE, monotonic() + 0.55)
+    assert monotonic() - started < 0.5
+
+    # a cancelled waiter leaves no trace, the slot goes to the next one
+    cancelled = asyncio.create_task(
+        bulkhead.acquire(INTERACTIVE, monotonic() + 10)
+    )
+    waiting = asyncio.create_task(
+        bulkhead.acquire(BACKGROUND, monotonic() + 10)
+    )
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    await asyncio.sleep(0)
+    bulkhead.release()
+    await waiting
+    assert bulkhead.in_flight == 1
+    bulkhead.release()
+    assert bulkhead.in_flight == 0
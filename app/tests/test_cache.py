@@ -0,0 +1,41 @@
+import asyncio
+import pytest
+
+from app.cache import TieredCache, build_shared_cache
+from app.configs import CacheConfig
+from app.metrics import MetricsRegistry
+
+
+@pytest.mark.asyncio
+async def test_tiered_cache() -> None:
+    shared = build_shared_cache(CacheConfig(shared_backend="memory"))
+    cache: TieredCache[dict] = TieredCache(
+        "test.cache", MetricsRegistry(), shared, max_size=10, ttl=60
+    )
+    loads = 0
+
+    async def loader() -> dict:
+        nonlocal loads
+        loads += 1
+        await asyncio.sleep(0.01)
+        return {"id": 1}
+
+    # concurrent misses share a single load
+    results = await asyncio.gather(
+        *(cache.get_or_load("1", loader) for _ in range(10))
+    )
+    assert all(result == {"id": 1} for result in results), results
+    assert loads == 1, loads
+
+    # a cold process finds the value in the shared tier
+    cold: TieredCache[dict] = TieredCache(
+        "test.cache", MetricsRegistry(), shared, max_size=10, ttl=60
+    )
+    assert await cold.get_or_load("1", loader) == {"id": 1}
+    assert loads == 1, loads
+
+    # invalidation drops the local and the shared tier
+    await cache.invalidate("1")
+    assert await shared.get("test.cache:1") is None
+    assert await cache.get_or_load("1", loader) == {"id": 1}
+    assert loads == 2, loads
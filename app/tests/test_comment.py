@@ -1,3 +1,4 @@
+import json
 import pytest
 import random
 
@@ -5,9 +6,12 @@ from datetime import datetime, timedelta
 from http import HTTPStatus
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.components.gemini.consts import ModerationTargetEnum
+from app.components.gemini.moderation import ModerationQueue
 from app.components.posts.models import Post
-from app.tests.base import CommentAPI, TestMixin
-from app.tests.consts import ContentTypeEnum
+from app.containers import container
+from app.tests.base import AccountsAPI, CommentAPI, TestMixin
+from app.tests.consts import PASSWORD, ContentTypeEnum
 from app.tests.fixtures import f
 
 
@@ -58,6 +62,27 @@ class TestComment(TestMixin):
         assert isinstance(report, dict), breakdown
         assert len(report) > 0, [date_from, date_to, breakdown]
 
+        # get the breakdown of this post sliced by author
+        breakdown = await api.get(
+            endpoint=f"/api/v1/comments-daily-breakdown",
+            post_id=f_post.id,
+            group_by="account_hex_id"
+        )
+        slices = breakdown.get("slices")
+        assert isinstance(slices, list), breakdown
+        assert len(slices) == 1, breakdown
+        assert slices[0].get("account_hex_id") == comment.get(
+            "account_hex_id"
+        ), breakdown
+        assert slices[0].get("created") == 1, breakdown
+
+        # export comments of the post
+        exported = await api.export(
+            endpoint=f"/api/v1/comments/export", post_id=f_post.id
+        )
+        lines = [json.loads(line) for line in exported.splitlines()]
+        assert [line.get("id") for line in lines] == [comment_id], lines
+
         # delete comment
         del_comment = await api.delete(
             endpoint=f"/api/v1/comment/{comment_id}"
@@ -86,3 +111,172 @@ class TestComment(TestMixin):
             expected_status_code=HTTPStatus.BAD_REQUEST
         )
         assert del_comment.get("error") == "Comment not found", del_comment
+
+    async def test_comments_bulk(
+        self,
+        f_session: AsyncSession,
+        f_post: Post
+    ) -> None:
+        await f_session.refresh(f_post)
+
+        api = CommentAPI(token=self.token)
+        texts = [
+            f.paragraph(nb_sentences=random.randint(3, 7)) for _ in range(3)
+        ]
+        resp = await api.create(
+            endpoint=f"/api/v1/comments/bulk",
+            content_type=ContentTypeEnum.JSON,
+            comments=[
+                {"post_id": f_post.id, "text": texts[0]},
+                {"post_id": f_post.id + 1000, "text": texts[1]},
+                {"post_id": f_post.id, "text": texts[2]},
+            ]
+        )
+        results = resp.get("results")
+        assert [r.get("index") for r in results] == [0, 1, 2], resp
+        assert results[1].get("error") == "Post not found", resp
+        assert results[1].get("comment") is None, resp
+        for result, text in ((results[0], texts[0]), (results[2], texts[2])):
+            assert result.get("comment", {}).get("text") == text, resp
+            assert result.get("comment", {}).get("post_id") == f_post.id, resp
+
+        # every item is validated before anything is stored
+        resp = await api.create(
+            endpoint=f"/api/v1/comments/bulk",
+            content_type=ContentTypeEnum.JSON,
+            comments=[],
+            expected_status_code=HTTPStatus.UNPROCESSABLE_ENTITY
+        )
+
+    async def test_comments_list_checks(
+        self,
+        f_session: AsyncSession,
+        f_post: Post
+    ) -> None:
+        await f_session.refresh(f_post)
+        api = CommentAPI(token=self.token)
+
+        # an existing post without matching comments is not an error
+        resp = await api.get(
+            endpoint=f"/api/v1/comments",
+            post_id=f_post.id,
+            owner_hex_id=f_post.account_hex_id
+        )
+        assert resp.get("comments") == [], resp
+
+        resp = await api.get(
+            endpoint=f"/api/v1/comments",
+            post_id=f_post.id + 1000,
+            expected_status_code=HTTPStatus.BAD_REQUEST
+        )
+        assert resp.get("error") == "Post not found", resp
+
+        resp = await api.get(
+            endpoint=f"/api/v1/comments",
+            post_id=f_post.id,
+            owner_hex_id="0" * 32,
+            expected_status_code=HTTPStatus.BAD_REQUEST
+        )
+        assert resp.get("error") == "Invalid owner id", resp
+
+    async def test_comments_etag(
+        self,
+        f_session: AsyncSession,
+        f_post: Post
+    ) -> None:
+        await f_session.refresh(f_post)
+        api = CommentAPI(token=self.token)
+        endpoint = f"/api/v1/comments"
+
+        resp = await api.get_conditional(endpoint, post_id=f_post.id)
+        etag = resp.headers.get("ETag")
+        assert etag, resp.headers
+
+        # nothing changed, nothing is sent
+        resp = await api.get_conditional(
+            endpoint,
+            etag=etag,
+            expected_status_code=HTTPStatus.NOT_MODIFIED,
+            post_id=f_post.id
+        )
+        assert resp.content == b"", resp.content
+        assert resp.headers.get("ETag") == etag, resp.headers
+
+        # a new comment changes the list
+        comment = await api.create(
+            text=f.paragraph(nb_sentences=random.randint(3, 7)),
+            post_id=f_post.id,
+            content_type=ContentTypeEnum.JSON
+        )
+        resp = await api.get_conditional(
+            endpoint, etag=etag, post_id=f_post.id
+        )
+        assert resp.headers.get("ETag") != etag, resp.headers
+        etag = resp.headers.get("ETag")
+
+        # and so does an edit
+        await api.update(
+            comment_id=comment.get("id"),
+            text=f.paragraph(nb_sentences=random.randint(3, 7))
+        )
+        resp = await api.get_conditional(
+            endpoint, etag=etag, post_id=f_post.id
+        )
+        assert resp.headers.get("ETag") != etag, resp.headers
+
+    async def test_comment_pending(
+        self,
+        monkeypatch: pytest.MonkeyPatch,
+        f_session: AsyncSession,
+        f_post: Post
+    ) -> None:
+        await f_session.refresh(f_post)
+        moderation_queue = container.moderation_queue()
+        gemini_service = container.gemini_service()
+        submitted = []
+
+        async def submit(target: ModerationTargetEnum, id_: int) -> None:
+            submitted.append((target, id_))
+
+        async def analyze_comment(*_, **__):
+            return True, ""
+
+        monkeypatch.setattr(ModerationQueue, "deferred", True)
+        monkeypatch.setattr(moderation_queue, "submit", submit)
+        monkeypatch.setattr(gemini_service, "analyze_comment", analyze_comment)
+
+        login = f.pystr(min_chars=5, max_chars=20)
+        await AccountsAPI(token=self.token).create(
+            username=login, password=PASSWORD
+        )
+        other = CommentAPI(token=await self._get_token(login))
+        api = CommentAPI(token=self.token)
+
+        comment = await api.create(
+            text=f.paragraph(nb_sentences=random.randint(3, 7)),
+            post_id=f_post.id,
+            content_type=ContentTypeEnum.JSON
+        )
+        comment_id = comment.get("id")
+        assert submitted == [(ModerationTargetEnum.COMMENT, comment_id)]
+
+        # a pending comment is shown to its author only
+        resp = await api.get(comment_id=comment_id)
+        assert resp.get("id") == comment_id, resp
+        assert resp.get("pending"), resp
+        resp = await other.get(
+            comment_id=comment_id,
+            expected_status_code=HTTPStatus.BAD_REQUEST
+        )
+        assert resp.get("error") == "Comment not found", resp
+        resp = await other.get(endpoint=f"/api/v1/comments", post_id=f_post.id)
+        ids = [item.get("id") for item in resp.get("comments")]
+        assert comment_id not in ids, resp
+
+        # and to everyone once it is allowed
+        await moderation_queue._process(submitted[0])
+        resp = await other.get(comment_id=comment_id)
+        assert resp.get("id") == comment_id, resp
+        resp = await other.get(endpoint=f"/api/v1/comments", post_id=f_post.id)
+        ids = [item.get("id") for item in resp.get("comments")]
+        assert comment_id in ids, resp
@@ -0,0 +1,191 @@
+import asyncio
+import pytest
+
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, AsyncGenerator, Dict, List, Sequence
+
+from app.cache import build_shared_cache
+from app.components.comments.cache import CommentListCache
+from app.components.comments.models import Comment
+from app.components.comments.service import CommentService
+from app.configs import CacheConfig
+from app.metrics import MetricsRegistry
+from app.pagination import CheckedPage
+from app.tests.fixtures.mock_db_fixtures import fake_transaction
+
+
+class CountingRepository:
+    """
+    Stands in for CommentRepository, every load returns the load number.
+    """
+
+    def __init__(self) -> None:
+        self.loads = 0
+        self.delay = 0.01
+
+    async def get_public_comments(
+        self, _, post_id: int, quantity: int
+    ) -> CheckedPage[int]:
+        self.loads += 1
+        load = self.loads
+        await asyncio.sleep(self.delay)
+        return CheckedPage({"post": True, "pending": False}, [load])
+
+
+@asynccontextmanager
+async def fake_session() -> AsyncGenerator[None, None]:
+    yield None
+
+
+def make_cache(
+    config: CacheConfig,
+    repository: CountingRepository
+) -> CommentListCache:
+    return CommentListCache(
+        config,
+        MetricsRegistry(),
+        build_shared_cache(config),
+        repository,
+        fake_session,
+    )
+
+
+@pytest.mark.asyncio
+async def test_comment_list_cache() -> None:
+    repository = CountingRepository()
+    cache = make_cache(CacheConfig(), repository)
+
+    # a burst of reads of a hot post costs one query
+    pages = await asyncio.gather(
+        *(cache.get_comments(1, 51) for _ in range(20))
+    )
+    assert all(page.rows == [1] for page in pages), pages
+    assert repository.loads == 1, repository.loads
+
+    # and one more per change
+    await cache.invalidate(1)
+    pages = await asyncio.gather(
+        *(cache.get_comments(1, 51) for _ in range(20))
+    )
+    assert all(page.rows == [2] for page in pages), pages
+    assert repository.loads == 2, repository.loads
+
+    # a load racing with a change is never served afterwards
+    repository.delay = 0.05
+    await cache.invalidate(1)
+    stale = asyncio.create_task(cache.get_comments(1, 51))
+    await asyncio.sleep(0.01)
+    await cache.invalidate(1)
+    assert (await stale).rows == [3]
+    repository.delay = 0
+    assert (await cache.get_comments(1, 51)).rows == [4]
+    assert (await cache.get_comments(1, 51)).rows == [4]
+
+
+@pytest.mark.asyncio
+async def test_comment_list_cache_shared_versions() -> None:
+    config = CacheConfig(
+        shared_backend="memory", comment_lists_version_ttl=0.05
+    )
+    shared = build_shared_cache(config)
+    repository = CountingRepository()
+    caches = [
+        CommentListCache(
+            config, MetricsRegistry(), shared, repository, fake_session
+        )
+        for _ in range(2)
+    ]
+
+    # the second process reuses the page loaded by the first
+    assert (await caches[0].get_comments(1, 51)).rows == [1]
+    assert (await caches[1].get_comments(1, 51)).rows == [1]
+    assert repository.loads == 1, repository.loads
+
+    # and sees a change made by the first once its version expires
+    await caches[0].invalidate(1)
+    await asyncio.sleep(0.1)
+    assert (await caches[1].get_comments(1, 51)).rows == [2]
+    assert (await caches[0].get_comments(1, 51)).rows == [2]
+    assert repository.loads == 2, repository.loads
+
+
+class WritesRepository:
+    """
+    Stands in for CommentRepository on the write paths.
+    """
+
+    def __init__(self) -> None:
+        self.due: List[Dict[str, Any]] = []
+
+    async def add_comment(self, _, comment: Comment) -> Comment:
+        return comment
+
+    async def add_comments(self, _, rows: Sequence[Dict]) -> None:
+        pass
+
+    async def pop_due_scheduled_comments(
+        self, _, now: datetime, limit: int
+    ) -> List[Dict[str, Any]]:
+        due, self.due = self.due[:limit], self.due[limit:]
+        return due
+
+    async def set_moderation_result(
+        self, _, comment_id: int, banned: bool
+    ) -> int | None:
+        return 3 if comment_id == 30 else None
+
+    async def delete_comment(self, _, comment: Comment) -> None:
+        pass
+
+
+class RecordingCache:
+    def __init__(self) -> None:
+        self.invalidated: List[int] = []
+
+    async def invalidate(self, post_id: int) -> None:
+        self.invalidated.append(post_id)
+
+
+@pytest.mark.asyncio
+async def test_comment_writes_invalidate_after_commit() -> None:
+    repository = WritesRepository()
+    cache = RecordingCache()
+    service = CommentService(repository, cache)
+    comment = Comment(id=10, post_id=1, account_hex_id="a" * 32, text="a")
+
+    async with fake_transaction() as tx:
+        await service.add_comment(tx, comment)
+        await service.update_comment(tx, comment, "b", banned=False)
+        # nothing is dropped while the transaction may still fail
+        assert cache.invalidated == []
+    assert cache.invalidated == [1, 1]
+
+    cache.invalidated.clear()
+    reply = {
+        "due_at": datetime.utcnow(),
+        "account_hex_id": "a" * 32,
+        "text": "reply",
+    }
+    repository.due = [{**reply, "post_id": post_id} for post_id in (2, 2, 4)]
+    async with fake_transaction() as tx:
+        await service.deliver_due_comments(tx, datetime.utcnow(), 10)
+        assert await service.set_moderation_result(tx, 30, banned=False)
+        # already resolved, nothing changed
+        assert not await service.set_moderation_result(tx, 31, banned=True)
+        await service.delete_comment(tx, comment)
+        assert cache.invalidated == []
+    assert sorted(cache.invalidated) == [1, 2, 3, 4]
+
+    # a rolled back transaction leaves the cache alone
+    cache.invalidated.clear()
+    repository.due = [{**reply, "post_id": 2}]
+    with pytest.raises(ConnectionError):
+        async with fake_transaction() as tx:
+            await service.add_comment(tx, comment)
+            await service.update_comment(tx, comment, "c", banned=True)
+            await service.deliver_due_comments(tx, datetime.utcnow(), 10)
+            await service.set_moderation_result(tx, 30, banned=True)
+            await service.delete_comment(tx, comment)
+            raise ConnectionError("db is down")
+    assert cache.invalidated == []
@@ -0,0 +1,348 @@
+import asyncio
+import pytest
+import random
+
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple
+)
+
+from app.components.comments.consts import BreakdownDimensionEnum
+from app.components.comments.models import (
+    Comment,
+    CommentDailyDimStats,
+    CommentDailyStats
+)
+from app.components.comments.repo import CommentRepository
+from app.components.comments.scheme import (
+    GetCommentsBreakdownRequest,
+    get_breakdown_request
+)
+from app.components.comments.service import CommentService
+from app.components.comments.stats import DailyStatsRollup
+from app.configs import CommentsConfig
+from app.metrics import MetricsRegistry
+from app.components.posts.models import Post
+from app.tests.fixtures.mock_db_fixtures import fake_transaction
+
+
+@dataclass
+class FakeComment:
+    created_at: datetime
+    banned: bool
+    post_id: int
+    account_hex_id: str
+
+
+class InMemoryStatsRepository:
+    """
+    Stands in for CommentRepository, days up to the watermark
+    are served as if they were rolled up.
+    """
+
+    def __init__(
+        self,
+        comments: List[FakeComment],
+        watermark: Optional[date]
+    ):
+        self.comments = comments
+        self.watermark = watermark
+
+    @staticmethod
+    def _aggregate(
+        comments: Iterable[FakeComment],
+        post_id: Optional[int],
+        account_hex_id: Optional[str],
+        group_by: Sequence[BreakdownDimensionEnum],
+    ) -> List[Dict]:
+        rows: Dict[tuple, Dict] = {}
+        for comment in comments:
+            if post_id is not None and comment.post_id != post_id:
+                continue
+            if (
+                account_hex_id is not None
+                and comment.account_hex_id != account_hex_id
+            ):
+                continue
+            key = (comment.created_at.date(), *(
+                getattr(comment, dimension.value) for dimension in group_by
+            ))
+            row = rows.setdefault(key, {
+                "date": key[0],
+                **{
+                    dimension.value: value
+                    for dimension, value in zip(group_by, key[1:])
+                },
+                "created": 0,
+                "blocked": 0,
+            })
+            row["blocked" if comment.banned else "created"] += 1
+        return [rows[key] for key in sorted(rows)]
+
+    async def get_daily_stats_watermark(self, _) -> Optional[date]:
+        return self.watermark
+
+    @staticmethod
+    def get_comments_breakdown_query(**filters: Any) -> Tuple[str, Dict]:
+        return "live", filters
+
+    @staticmethod
+    def get_daily_stats_query(
+        date_from: Optional[date] = None,
+        date_before: Optional[date] = None,
+        **slicing: Any
+    ) -> Tuple[str, Dict]:
+        return "rollup", {
+            "date_from": date_from, "date_before": date_before, **slicing
+        }
+
+    async def stream_rows(
+        self, _, q: Tuple[str, Dict]
+    ) -> AsyncIterator[Dict]:
+        source, filters = q
+        if source == "live":
+            rows = self._live(**filters)
+        else:
+            rows = self._rollup(**filters)
+        for row in rows:
+            yield row
+
+    def _live(
+        self,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        date_before: Optional[datetime] = None,
+        post_id: Optional[int] = None,
+        account_hex_id: Optional[str] = None,
+        group_by: Sequence[BreakdownDimensionEnum] = (),
+    ) -> List[Dict]:
+        return self._aggregate(
+            (
+                comment for comment in self.comments
+                if (date_from is None or comment.created_at >= date_from)
+                and (date_to is None or comment.created_at <= date_to)
+                and (date_before is None or comment.created_at < date_before)
+            ),
+            post_id, account_hex_id, group_by
+        )
+
+    def _rollup(
+        self,
+        date_from: Optional[date] = None,
+        date_before: Optional[date] = None,
+        post_id: Optional[int] = None,
+        account_hex_id: Optional[str] = None,
+        group_by: Sequence[BreakdownDimensionEnum] = (),
+    ) -> List[Dict]:
+        return self._aggregate(
+            (
+                comment for comment in self.comments
+                if comment.created_at.date() <= self.watermark
+                and (date_from is None or comment.created_at.date() >= date_from)
+                and (
+                    date_before is None
+                    or comment.created_at.date() < date_before
+                )
+            ),
+            post_id, account_hex_id, group_by
+        )
+
+
+@pytest.mark.asyncio
+async def test_breakdown_merges_rollup_and_live_counts() -> None:
+    now = datetime.now().replace(microsecond=0)
+    accounts = ["a" * 32, "b" * 32, "c" * 32]
+    comments = [
+        FakeComment(
+            created_at=now - timedelta(
+                minutes=random.randint(0, 60 * 24 * 10)
+            ),
+            banned=random.random() < 0.3,
+            post_id=random.randint(1, 4),
+            account_hex_id=random.choice(accounts),
+        )
+        for _ in range(500)
+    ]
+    watermark = now.date() - timedelta(days=1)
+    live = CommentService(InMemoryStatsRepository(comments, None))
+    rolled_up = CommentService(InMemoryStatsRepository(comments, watermark))
+
+    midnight = datetime.combine(now.date(), time.min)
+    ranges = [
+        (None, None),
+        (midnight - timedelta(days=3), None),
+        (midnight - timedelta(days=3, hours=5), now),
+        (None, midnight - timedelta(days=2, hours=7)),
+        (midnight - timedelta(days=6, hours=1),
+         midnight - timedelta(days=5, hours=2)),
+        (midnight - timedelta(hours=3), midnight - timedelta(hours=1)),
+    ]
+    slicings = [
+        {},
+        {"post_id": 2},
+        {"account_hex_id": accounts[0]},
+        {"group_by": [BreakdownDimensionEnum.POST]},
+        {
+            "account_hex_id": accounts[1],
+            "group_by": list(BreakdownDimensionEnum),
+        },
+    ]
+    for date_from, date_to in ranges:
+        for slicing in slicings:
+            payload = GetCommentsBreakdownRequest(
+                date_from=date_from, date_to=date_to, **slicing
+            )
+            expected = await live.get_comments_breakdown(None, payload)
+            actual = await rolled_up.get_comments_breakdown(None, payload)
+            assert actual == expected, (date_from, date_to, slicing)
+
+
+@pytest.mark.asyncio
+async def test_seal_counts_late_commit(
+    f_engine: AsyncEngine,
+    f_session: AsyncSession,
+    f_post: Post
+) -> None:
+    await f_session.refresh(f_post)
+    session_factory = sessionmaker(bind=f_engine, class_=AsyncSession)
+    # a day long gone, nobody else seals or writes it
+    day = date(1990, 1, 1) + timedelta(days=random.randint(0, 3000))
+
+    async def seal() -> int:
+        async with session_factory() as tx, tx.begin():
+            return await CommentRepository.seal_daily_stats(
+                tx, day, day + timedelta(days=1)
+            )
+
+    async with session_factory() as writer, session_factory() as reader:
+        try:
+            # written just before midnight, committed after the seal began
+            writer.add(Comment(
+                account_hex_id=f_post.account_hex_id,
+                post_id=f_post.id,
+                text="late",
+                created_at=datetime.combine(day, time.max),
+            ))
+            await writer.flush()
+            sealing = asyncio.create_task(seal())
+            await asyncio.sleep(0.5)
+            assert not sealing.done()
+            await writer.commit()
+            assert await sealing == 1
+
+            stats = await reader.get(CommentDailyStats, day)
+            assert (stats.created, stats.blocked) == (1, 0)
+            raw = await reader.execute(
+                select(CommentDailyDimStats.created)
+                .where(CommentDailyDimStats.date == day)
+            )
+            assert raw.scalars().all() == [1]
+        finally:
+            await writer.rollback()
+            await writer.execute(
+                delete(Comment).where(Comment.text == "late")
+                .where(Comment.post_id == f_post.id)
+            )
+            await writer.execute(
+                delete(CommentDailyDimStats)
+                .where(CommentDailyDimStats.date == day)
+            )
+            await writer.execute(
+                delete(CommentDailyStats)
+                .where(CommentDailyStats.date == day)
+            )
+            await writer.commit()
+
+
+def test_breakdown_request_group_by() -> None:
+    app = FastAPI()
+
+    @app.get("/breakdown")
+    async def breakdown(
+        payload: GetCommentsBreakdownRequest = Depends(get_breakdown_request)
+    ) -> GetCommentsBreakdownRequest:
+        return payload
+
+    client = TestClient(app)
+    resp = client.get("/breakdown", params={"post_id": 1})
+    assert resp.status_code == 200, resp.content
+    assert resp.json()["group_by"] == []
+
+    # every dimension is a column once, in the requested order
+    resp = client.get("/breakdown", params={
+        "group_by": ["account_hex_id", "post_id", "account_hex_id"]
+    })
+    assert resp.json()["group_by"] == ["account_hex_id", "post_id"]
+
+    resp = client.get("/breakdown", params={"group_by": "day"})
+    assert resp.status_code == 422, resp.content
+    resp = client.get("/breakdown", params={"post_id": 0})
+    assert resp.status_code == 422, resp.content
+
+
+class SealingRepository:
+    """
+    Stands in for CommentRepository, records the sealed ranges.
+    """
+
+    def __init__(self, first: Optional[date]) -> None:
+        self.first = first
+        self.sealed: List[Tuple[date, date]] = []
+        # held by another instance
+        self.locked = False
+
+    async def try_lock_daily_stats(self, _) -> bool:
+        return not self.locked
+
+    async def get_daily_stats_watermark(self, _) -> Optional[date]:
+        return self.sealed[-1][0] if self.sealed else None
+
+    async def get_first_comment_date(self, _) -> Optional[date]:
+        return self.first
+
+    async def seal_daily_stats(
+        self, _, date_from: date, date_before: date
+    ) -> int:
+        if date_from >= date_before:
+            return 0
+        self.sealed.append((date_from, date_before))
+        return (date_before - date_from).days
+
+
+@pytest.mark.asyncio
+async def test_daily_stats_rollup() -> None:
+    today = datetime.utcnow().date()
+    repository = SealingRepository(today - timedelta(days=3))
+    rollup = DailyStatsRollup(
+        CommentsConfig(),
+        MetricsRegistry(),
+        CommentService(repository),
+        fake_transaction,
+    )
+
+    # another instance is sealing, this one leaves it alone
+    repository.locked = True
+    assert await rollup.seal() == 0
+    assert repository.sealed == []
+
+    # a day per transaction, the lock on comments is held that long
+    repository.locked = False
+    assert await rollup.seal() == 3
+    assert repository.sealed == [
+        (today - timedelta(days=days), today - timedelta(days=days - 1))
+        for days in (3, 2, 1)
+    ]
+    assert await rollup.seal() == 0
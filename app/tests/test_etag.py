@@ -0,0 +1,42 @@
+from dataclasses import dataclass, replace
+from datetime import datetime
+
+from app.components.comments.scheme import GetCommentResponse
+from app.etag import etag_matches, make_etag
+
+
+@dataclass
+class FakeComment:
+    id: int
+    created_at: datetime
+    account_hex_id: str
+    post_id: int
+    text: str
+    edited: bool
+    pending: bool
+    banned: bool = False
+
+
+def test_etag() -> None:
+    now = datetime.utcnow()
+    rows = [
+        FakeComment(i, now, "a" * 32, 1, f"comment {i}", False, False)
+        for i in range(3)
+    ]
+    etag = make_etag(rows, GetCommentResponse, "cursor")
+    assert etag == make_etag(list(rows), GetCommentResponse, "cursor")
+
+    # anything the response shows changes it
+    assert etag != make_etag(rows, GetCommentResponse, None)
+    assert etag != make_etag(rows[:2], GetCommentResponse, "cursor")
+    edited = [rows[0], replace(rows[1], text="edited"), rows[2]]
+    assert etag != make_etag(edited, GetCommentResponse, "cursor")
+    # fields it does not show do not
+    banned = [rows[0], replace(rows[1], banned=True), rows[2]]
+    assert etag == make_etag(banned, GetCommentResponse, "cursor")
+
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches('"other"', etag)
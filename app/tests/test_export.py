@@ -0,0 +1,55 @@
+import csv
+import io
+import json
+import pytest
+
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Dict
+
+from app.export import ExportFormatEnum, encode_rows
+
+COLUMNS = ("id", "created_at", "text")
+
+
+async def rows(count: int) -> AsyncIterator[Dict[str, Any]]:
+    for i in range(count):
+        yield {
+            "id": i,
+            "created_at": datetime(2024, 1, 1, 12, 0, i % 60),
+            "text": f"line, \"{i}\"\nnext",
+            "ignored": date.today(),
+        }
+
+
+@pytest.mark.asyncio
+async def test_encode_ndjson() -> None:
+    chunks = [
+        chunk async for chunk in
+        encode_rows(rows(5), ExportFormatEnum.NDJSON, COLUMNS, batch_size=2)
+    ]
+    assert len(chunks) == 3, chunks
+    lines = b"".join(chunks).decode().splitlines()
+    assert len(lines) == 5, lines
+    first = json.loads(lines[0])
+    assert first == {
+        "id": 0, "created_at": "2024-01-01T12:00:00", "text": "line, \"0\"\nnext"
+    }, first
+
+
+@pytest.mark.asyncio
+async def test_encode_csv() -> None:
+    chunks = [
+        chunk async for chunk in
+        encode_rows(rows(3), ExportFormatEnum.CSV, COLUMNS, batch_size=2)
+    ]
+    assert len(chunks) == 2, chunks
+    parsed = list(csv.reader(io.StringIO(b"".join(chunks).decode())))
+    assert parsed[0] == list(COLUMNS), parsed
+    assert parsed[3] == ["2", "2024-01-01T12:00:02", "line, \"2\"\nnext"], parsed
+
+    # only the header when there is nothing to export
+    chunks = [
+        chunk async for chunk in
+        encode_rows(rows(0), ExportFormatEnum.CSV, COLUMNS)
+    ]
+    assert b"".join(chunks) == b"id,created_at,text\n", chunks
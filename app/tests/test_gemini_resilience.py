@@ -0,0 +1,259 @@
+import asyncio
+import httpx
+import pytest
+
+from threading import Thread
+
+from app.components.gemini.consts import ModerationPriorityEnum
+from app.components.gemini.exceptions import (
+    GeminiError,
+    GeminiUnavailableError,
+    moderation_exception
+)
+from app.components.gemini.resilience import (
+    BreakerStateEnum,
+    CircuitBreaker,
+    TokenBucket
+)
+from app.components.gemini.service import GeminiService
+from app.containers import container
+from app.metrics import MetricsRegistry
+from app.tests.test_prefilter import make_config
+
+ALLOWED = {"candidates": [{"content": {"parts": [{"text": "ALLOWED"}]}}]}
+
+
+def test_token_bucket(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = 100.0
+    monkeypatch.setattr(
+        "app.components.gemini.resilience.monotonic", lambda: now
+    )
+    metrics = MetricsRegistry()
+    bucket = TokenBucket("test.bucket", metrics, rate=2, burst=2)
+    # the burst goes out right away, then calls are spaced by 1 / rate
+    assert [bucket.reserve(10) for _ in range(4)] == [0, 0, 0.5, 1.0]
+    with pytest.raises(GeminiUnavailableError):
+        bucket.reserve(1)
+    now += 2
+    assert bucket.reserve(0) == 0
+    assert metrics.snapshot()["test.bucket.refused"] == 1
+
+
+def test_circuit_breaker(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = 100.0
+    monkeypatch.setattr(
+        "app.components.gemini.resilience.monotonic", lambda: now
+    )
+    metrics = MetricsRegistry()
+    breaker = CircuitBreaker(
+        "test.breaker", metrics, failure_threshold=2, reset_timeout=10
+    )
+    breaker.check()
+    breaker.record_failure()
+    breaker.check()
+    breaker.record_failure()
+    assert breaker.state == BreakerStateEnum.OPEN
+    with pytest.raises(GeminiUnavailableError):
+        breaker.check()
+    assert breaker.retry_after == 10
+
+    # a single probe after reset_timeout, a failed one opens it again
+    now += 10
+    breaker.check()
+    with pytest.raises(GeminiUnavailableError):
+        breaker.check()
+    breaker.record_failure()
+    assert breaker.state == BreakerStateEnum.OPEN
+
+    now += 10
+    breaker.check()
+    breaker.record_success()
+    assert breaker.state == BreakerStateEnum.CLOSED
+    snapshot = metrics.snapshot()
+    assert snapshot["test.breaker.state"] == BreakerStateEnum.CLOSED.value
+    assert snapshot["test.breaker.opened"] == 2, snapshot
+    assert snapshot["test.breaker.rejected"] == 2, snapshot
+
+
+def make_service(
+    handler,
+    metrics: MetricsRegistry,
+    **kwargs
+) -> GeminiService:
+    config = make_config(
+        batch_max_size=1,
+        retry_base_delay=0.001,
+        retry_max_delay=0.001,
+        breaker_failure_threshold=2,
+        **kwargs
+    )
+    service = GeminiService(
+        config,
+        metrics,
+        container.moderation_cache(),
+        container.moderation_prefilter(),
+    )
+    service._client = httpx.AsyncClient(
+        transport=httpx.MockTransport(handler)
+    )
+    service._client_loop = asyncio.get_running_loop()
+    return service
+
+
+@pytest.mark.asyncio
+async def test_call_api_retries() -> None:
+    statuses = [503, 429, 200]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        status_code = statuses.pop(0)
+        return httpx.Response(
+            status_code, json=ALLOWED if status_code == 200 else {}
+        )
+
+    metrics = MetricsRegistry()
+    service = make_service(handler, metrics)
+    assert await service.call_api({}) == ALLOWED
+    assert metrics.snapshot()["gemini.retries"] == 2
+
+    # client errors are not retried and don't open the breaker
+    statuses[:] = [400, 400, 400]
+    for _ in range(3):
+        with pytest.raises(GeminiError):
+            await service.call_api({})
+    assert len(statuses) == 0
+    assert metrics.snapshot()["gemini.breaker.state"] == 0
+
+
+@pytest.mark.asyncio
+async def test_breaker_fallback() -> None:
+    calls = 0
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        raise httpx.ConnectError("down", request=request)
+
+    metrics = MetricsRegistry()
+    service = make_service(
+        handler, metrics, retry_attempts=1, fallback_verdict="banned"
+    )
+    texts = [f"resilience test {i}" for i in range(4)]
+    for text in texts:
+        assert await service.analyze_text(text) == (False, "")
+    # two calls of two attempts opened the breaker, the rest failed fast
+    assert calls == 4, calls
+    snapshot = metrics.snapshot()
+    assert snapshot["gemini.breaker.state"] == BreakerStateEnum.OPEN.value
+    assert snapshot["gemini.breaker.rejected"] == 2, snapshot
+    assert snapshot["gemini.fallbacks"] == 4, snapshot
+
+    # without a fallback verdict it is unavailable, a 503 to the client
+    service._config.fallback_verdict = None
+    with pytest.raises(GeminiUnavailableError) as e:
+        await service.analyze_text(texts[0])
+    assert e.value.retryable and e.value.retry_after > 0
+    http_error = moderation_exception(e.value)
+    assert http_error.status_code == 503
+    assert int(http_error.headers["Retry-After"]) > 0
+
+
+@pytest.mark.asyncio
+async def test_permanent_failure() -> None:
+    responses = [
+        httpx.Response(400, json={}),
+        httpx.Response(200, text="not json"),
+        httpx.Response(200, json={"candidates": []}),
+    ]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return responses.pop(0)
+
+    service = make_service(handler, MetricsRegistry())
+    # asking again won't help: not a 503, and no Retry-After
+    for i in range(3):
+        with pytest.raises(GeminiUnavailableError) as e:
+            await service.analyze_text(f"permanent failure {i}")
+        assert not e.value.retryable and e.value.retry_after is None
+        http_error = moderation_exception(e.value)
+        assert http_error.status_code == 502
+        assert not http_error.headers
+    assert not responses
+
+
+@pytest.mark.asyncio
+async def test_batch_failure() -> None:
+    calls = []
+    batch_status = 400
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        batch = "responseSchema" in request.content.decode()
+        calls.append(batch)
+        if batch:
+            return httpx.Response(batch_status, json={})
+        return httpx.Response(200, json=ALLOWED)
+
+    metrics = MetricsRegistry()
+    service = make_service(handler, metrics, retry_attempts=0)
+    items = [
+        (f"batch failure {i}", ModerationPriorityEnum.INTERACTIVE)
+        for i in range(3)
+    ]
+    # the batch prompt was rejected, the items are asked one by one
+    assert await service._analyze_batch(items) == [(True, "")] * 3
+    assert calls == [True, False, False, False]
+    assert metrics.snapshot()["gemini.batch_fallbacks"] == 3
+
+    # an unavailable model is not asked again per item
+    calls.clear()
+    batch_status = 503
+    results = await service._analyze_batch(items)
+    assert all(isinstance(result, GeminiError) for result in results)
+    assert calls == [True]
+    assert metrics.snapshot()["gemini.batch_fallbacks"] == 3
+
+
+def test_client_lifecycle() -> None:
+    service = GeminiService(
+        make_config(),
+        MetricsRegistry(),
+        container.moderation_cache(),
+        container.moderation_prefilter(),
+    )
+
+    async def get_client() -> httpx.AsyncClient:
+        client = service.client
+        # one client per loop
+        assert service.client is client
+        return client
+
+    first = asyncio.run(get_client())
+    assert not first.is_closed
+    # a new loop (a worker restart, a test) gets a new client
+    # and the one bound to the finished loop is closed
+    second = asyncio.run(get_client())
+    assert second is not first
+    assert first.is_closed and not second.is_closed
+
+    # a client still serving on a running loop is closed on that loop
+    loop = asyncio.new_event_loop()
+    thread = Thread(target=loop.run_forever)
+    thread.start()
+    try:
+        third = asyncio.run_coroutine_threadsafe(get_client(), loop).result()
+        assert second.is_closed
+        fourth = asyncio.run(get_client())
+        asyncio.run_coroutine_threadsafe(asyncio.sleep(0), loop).result()
+        assert third.is_closed and not fourth.is_closed
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+    async def start_and_close() -> httpx.AsyncClient:
+        await service.start()
+        client = service.client
+        await service.close()
+        return client
+
+    assert asyncio.run(start_and_close()).is_closed
+    assert fourth.is_closed
@@ -0,0 +1,58 @@
+import asyncio
+import pytest
+
+from fastapi import status
+from passlib.context import CryptContext
+from threading import Event
+
+from app.components.auth.exceptions import HashingOverloadedException
+from app.components.auth.hashing import PasswordHasher
+from app.metrics import MetricsRegistry
+
+
+def make_hasher(metrics: MetricsRegistry, **kwargs) -> PasswordHasher:
+    # the lowest cost bcrypt allows, the tests are about the pool
+    crypt_context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4)
+    return PasswordHasher(crypt_context, metrics, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_password_hasher() -> None:
+    hasher = make_hasher(MetricsRegistry(), max_workers=2, max_queue=4)
+    try:
+        hashed = await hasher.hash("secret")
+        assert hashed != "secret"
+        assert await hasher.verify("secret", hashed)
+        assert not await hasher.verify("not secret", hashed)
+    finally:
+        hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_overload() -> None:
+    metrics = MetricsRegistry()
+    hasher = make_hasher(metrics, max_workers=1, max_queue=1)
+    release = Event()
+    try:
+        # one call running, one queued: the pool is at capacity
+        busy = [
+            asyncio.create_task(hasher._run(release.wait))
+            for _ in range(2)
+        ]
+        await asyncio.sleep(0)
+        assert metrics.snapshot()["auth.hashing.pending"] == 2
+
+        with pytest.raises(HashingOverloadedException) as e:
+            await hasher.hash("secret")
+        assert e.value.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert e.value.headers["Retry-After"]
+        assert metrics.snapshot()["auth.hashing.rejected"] == 1
+
+        release.set()
+        await asyncio.gather(*busy)
+        # room again once the pool drained
+        assert await hasher.hash("secret")
+        assert metrics.snapshot()["auth.hashing.pending"] == 0
+    finally:
+        release.set()
+        hasher.shutdown()
@@ -0,0 +1,91 @@
+import pytest
+
+from datetime import datetime, timedelta
+from sqlalchemy import insert, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+from app.components.comments.models import Comment
+from app.components.comments.repo import CommentRepository
+from app.components.posts.models import Post
+from app.components.posts.repo import PostRepository
+from app.pagination import Cursor
+
+ROWS = 2000
+
+
+async def explain(tx: AsyncSession, q: Select) -> str:
+    sql = q.compile(
+        dialect=postgresql.dialect(),
+        compile_kwargs={"literal_binds": True}
+    )
+    raw = await tx.execute(text(f"EXPLAIN {sql}"))
+    return "\n".join(raw.scalars().all())
+
+
+@pytest.mark.asyncio
+async def test_list_queries_use_indexes(
+    f_session: AsyncSession,
+    f_post: Post
+) -> None:
+    await f_session.refresh(f_post)
+    now = datetime.utcnow()
+    await f_session.execute(insert(Comment), [
+        {
+            "account_hex_id": f_post.account_hex_id,
+            "post_id": f_post.id,
+            "text": f"comment {i}",
+            "created_at": now - timedelta(seconds=i),
+            "banned": i % 10 == 0,
+        }
+        for i in range(ROWS)
+    ])
+    await f_session.execute(text("ANALYZE posts"))
+    await f_session.execute(text("ANALYZE comments"))
+    # the seeded tables are small, make the planner prefer any usable index
+    await f_session.execute(text("SET LOCAL enable_seqscan = off"))
+
+    after = Cursor(now - timedelta(seconds=ROWS // 2), f_post.id)
+    cases = [
+        (
+            PostRepository.get_posts_query(
+                50, viewer_hex_id=f_post.account_hex_id
+            ),
+            ("ix_posts_created_at",),
+        ),
+        (
+            PostRepository.get_posts_query(
+                50,
+                account_hex_id=f_post.account_hex_id,
+                viewer_hex_id=f_post.account_hex_id,
+                after=after,
+            ),
+            # all seeded rows share the owner, either index is as good
+            ("ix_posts_account_hex_id_created_at", "ix_posts_created_at"),
+        ),
+        (
+            CommentRepository.get_comments_query(
+                f_post.id, 50, viewer_hex_id=f_post.account_hex_id
+            ),
+            ("ix_comments_post_id_created_at",),
+        ),
+        (
+            CommentRepository.get_comments_query(
+                f_post.id,
+                50,
+                account_hex_id=f_post.account_hex_id,
+                viewer_hex_id=f_post.account_hex_id,
+                after=after,
+            ),
+            (
+                "ix_comments_post_id_account_hex_id_created_at",
+                "ix_comments_post_id_created_at",
+            ),
+        ),
+    ]
+    for q, indexes in cases:
+        plan = await explain(f_session, q)
+        assert any(index in plan for index in indexes), plan
+        assert "Seq Scan" not in plan, plan
+        assert "Sort" not in plan, plan
@@ -0,0 +1,17 @@
+import pytest
+
+from app.tests.base import MetricsAPI, TestMixin
+
+
+@pytest.mark.asyncio
+class TestMetrics(TestMixin):
+    async def test_metrics_api(self) -> None:
+        api = MetricsAPI(token=self.token)
+
+        # token creation went through a db session
+        resp = await api.get()
+        metrics = resp.get("metrics")
+        assert isinstance(metrics, dict), resp
+        checkout = metrics.get("db.master.pool.checkout_ms")
+        assert checkout and checkout["count"] > 0, metrics
+        assert isinstance(resp.get("db_pool"), str), resp
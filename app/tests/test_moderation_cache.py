@@ -0,0 +1,162 @@
+import pytest
+
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from time import time
+from typing import AsyncGenerator, Dict
+
+from app.components.gemini.cache import ModerationCache
+from app.components.gemini.models import ModerationVerdict
+from app.metrics import MetricsRegistry
+from app.tests.test_prefilter import make_config
+
+
+class MemoryRepository:
+    """
+    Stands in for ModerationVerdictRepository.
+    """
+
+    def __init__(self) -> None:
+        self.rows: Dict[str, ModerationVerdict] = {}
+        self.calls = 0
+        self.fail = False
+
+    def _call(self) -> None:
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("db is down")
+
+    async def get_verdict(
+        self, _, key: str, created_after: datetime
+    ) -> ModerationVerdict | None:
+        self._call()
+        row = self.rows.get(key)
+        if row is None or row.created_at < created_after:
+            return None
+        return row
+
+    async def save_verdict(
+        self, _, key: str, version: str, allowed: bool, message: str
+    ) -> None:
+        self._call()
+        self.rows[key] = ModerationVerdict(
+            key=key,
+            version=version,
+            created_at=datetime.utcnow(),
+            allowed=allowed,
+            message=message,
+        )
+
+    async def delete_stale_verdicts(
+        self, _, version: str, created_before: datetime
+    ) -> None:
+        self._call()
+        self.rows = {
+            key: row for key, row in self.rows.items()
+            if row.version == version and row.created_at >= created_before
+        }
+
+
+@asynccontextmanager
+async def fake_session() -> AsyncGenerator[None, None]:
+    yield None
+
+
+def make_cache(
+    repository: MemoryRepository,
+    metrics: MetricsRegistry | None = None,
+    **kwargs
+) -> ModerationCache:
+    return ModerationCache(
+        make_config(**kwargs),
+        metrics or MetricsRegistry(),
+        repository,
+        fake_session,
+    )
+
+
+def test_moderation_cache_key() -> None:
+    cache = make_cache(MemoryRepository())
+    key = cache.key("Nice  POST\n", False)
+    # case, spacing and unicode forms don't matter
+    assert cache.key("nice post", False) == key
+    assert cache.key("ｎｉｃｅ post", False) == key
+    assert cache.key("nice posts", False) != key
+    # a reply is generated for the same text in the other mode
+    assert cache.key("nice post", True) != key
+
+    # another prompt or generation config is another version
+    other = make_cache(MemoryRepository())
+    other_config = make_config()
+    other_config.generation_config.temperature = 0.5
+    changed = ModerationCache(
+        other_config, MetricsRegistry(), MemoryRepository(), fake_session
+    )
+    assert other.version == cache.version
+    assert changed.version != cache.version
+    assert changed.key("nice post", False) != key
+
+
+@pytest.mark.asyncio
+async def test_moderation_cache_local(
+    monkeypatch: pytest.MonkeyPatch
+) -> None:
+    repository = MemoryRepository()
+    cache = make_cache(repository, verdict_cache_ttl=60)
+    key = cache.key("text", False)
+    assert await cache.get(key) is None
+    await cache.set(key, (False, ""))
+    assert await cache.get(key) == (False, "")
+    # not persistent, the db is never asked
+    assert repository.calls == 0
+
+    now = time()
+    monkeypatch.setattr("app.cache.time", lambda: now + 61)
+    assert await cache.get(key) is None
+
+
+@pytest.mark.asyncio
+async def test_moderation_cache_persistent() -> None:
+    repository = MemoryRepository()
+    cache = make_cache(repository, verdict_cache_persistent=True)
+    key = cache.key("text", True)
+    await cache.set(key, (True, "a reply"))
+    assert repository.rows[key].version == cache.version
+
+    # a cold process finds it in the db, and then locally
+    metrics = MetricsRegistry()
+    cold = make_cache(repository, metrics, verdict_cache_persistent=True)
+    assert await cold.get(key) == (True, "a reply")
+    assert await cold.get(key) == (True, "a reply")
+    assert metrics.snapshot()["gemini.verdict_cache.persistent_hits"] == 1
+
+    # persisted verdicts past the ttl are not served
+    repository.rows[key].created_at -= timedelta(days=2)
+    stale = make_cache(repository, verdict_cache_persistent=True)
+    assert await stale.get(key) is None
+
+    # an unavailable db is a miss, not an error
+    repository.fail = True
+    assert await stale.get(cache.key("other", False)) is None
+    await stale.set(cache.key("other", False), (True, ""))
+    repository.fail = False
+
+
+@pytest.mark.asyncio
+async def test_moderation_cache_purge() -> None:
+    repository = MemoryRepository()
+    old_config = make_config(verdict_cache_persistent=True)
+    old_config.generation_config.temperature = 0.5
+    old = ModerationCache(
+        old_config, MetricsRegistry(), repository, fake_session
+    )
+    cache = make_cache(repository, verdict_cache_persistent=True)
+    await old.set(old.key("text", False), (False, ""))
+    await cache.set(cache.key("text", False), (True, ""))
+    await cache.set(cache.key("expired", False), (True, ""))
+    repository.rows[cache.key("expired", False)].created_at -= timedelta(
+        days=2
+    )
+
+    await cache.purge()
+    assert set(repository.rows) == {cache.key("text", False)}
@@ -0,0 +1,331 @@
+import asyncio
+import pytest
+
+from typing import Dict, List, Set, Tuple
+
+from app.components.comments.models import Comment
+from app.components.gemini.consts import ModerationTargetEnum
+from app.components.gemini.exceptions import GeminiUnavailableError
+from app.components.gemini.moderation import ModerationQueue
+from app.components.posts.models import Post
+from app.metrics import MetricsRegistry
+from app.tests.fixtures.mock_db_fixtures import fake_transaction
+from app.tests.test_prefilter import make_config
+
+POST = ModerationTargetEnum.POST
+COMMENT = ModerationTargetEnum.COMMENT
+BAD = "bad"
+
+
+class FakeGeminiService:
+    def __init__(self) -> None:
+        self.calls: List[str] = []
+        # texts whose verdict waits until released
+        self.held: Set[str] = set()
+        self.release = asyncio.Event()
+        # calls that find the model unavailable, and when to come back
+        self.unavailable = 0
+        self.retry_after: float | None = 0.05
+        # texts the model never gives a usable answer for
+        self.poison: Set[str] = set()
+
+    async def _verdict(self, text: str, reply: str) -> Tuple[bool, str]:
+        self.calls.append(text)
+        if self.unavailable:
+            self.unavailable -= 1
+            raise GeminiUnavailableError(
+                "circuit open", retryable=True, retry_after=self.retry_after
+            )
+        if any(poison in text for poison in self.poison):
+            raise GeminiUnavailableError("status 400")
+        if any(held in text for held in self.held):
+            await self.release.wait()
+        if BAD in text:
+            return False, ""
+        return True, reply
+
+    async def analyze_text(self, text: str, **_) -> Tuple[bool, str]:
+        return await self._verdict(text, "")
+
+    async def analyze_comment(
+        self, post: Post, comment: Comment, *_
+    ) -> Tuple[bool, str]:
+        reply = "a reply" if post.auto_comment_timeout is not None else ""
+        return await self._verdict(comment.text, reply)
+
+
+class FakePostService:
+    def __init__(self, posts: List[Post]) -> None:
+        self.posts: Dict[int, Post] = {post.id: post for post in posts}
+
+    async def get_post(self, _, post_id: int) -> Post | None:
+        post = self.posts.get(post_id)
+        if post is None or post.banned:
+            return None
+        return post
+
+    async def get_pending_post_ids(self, _) -> List[int]:
+        return [id_ for id_, post in self.posts.items() if post.pending]
+
+    async def set_moderation_result(
+        self, _, post_id: int, banned: bool
+    ) -> bool:
+        post = self.posts[post_id]
+        if not post.pending:
+            return False
+        post.pending, post.banned = False, banned
+        return True
+
+
+class FakeCommentService:
+    def __init__(self, comments: List[Comment]) -> None:
+        self.comments: Dict[int, Comment] = {
+            comment.id: comment for comment in comments
+        }
+
+    async def get_comment(self, _, comment_id: int) -> Comment | None:
+        return self.comments.get(comment_id)
+
+    async def get_pending_comment_ids(self, _) -> List[int]:
+        return [
+            id_ for id_, comment in self.comments.items() if comment.pending
+        ]
+
+    async def set_moderation_result(
+        self, _, comment_id: int, banned: bool
+    ) -> int | None:
+        comment = self.comments[comment_id]
+        if not comment.pending:
+            return None
+        comment.pending, comment.banned = False, banned
+        return comment.post_id
+
+
+class FakeScheduler:
+    def __init__(self) -> None:
+        self.scheduled: List[Tuple[int, str]] = []
+
+    async def schedule(self, _, post: Post, message: str) -> None:
+        self.scheduled.append((post.id, message))
+
+
+def make_post(id_: int, text: str, auto_reply: bool = False) -> Post:
+    return Post(
+        id=id_,
+        account_hex_id="a" * 32,
+        text=text,
+        pending=True,
+        banned=False,
+        auto_comment_timeout=5 if auto_reply else None,
+    )
+
+
+def make_comment(id_: int, post_id: int, text: str) -> Comment:
+    return Comment(
+        id=id_,
+        account_hex_id="b" * 32,
+        post_id=post_id,
+        text=text,
+        pending=True,
+        banned=False,
+    )
+
+
+def make_queue(
+    posts: List[Post],
+    comments: List[Comment],
+    metrics: MetricsRegistry | None = None,
+    **kwargs
+) -> Tuple[ModerationQueue, FakeGeminiService, FakeScheduler]:
+    gemini_service = FakeGeminiService()
+    scheduler = FakeScheduler()
+    kwargs.setdefault("deferred_moderation", True)
+    queue = ModerationQueue(
+        make_config(**kwargs),
+        metrics or MetricsRegistry(),
+        gemini_service,
+        FakePostService(posts),
+        FakeCommentService(comments),
+        scheduler,
+        fake_transaction,
+    )
+    return queue, gemini_service, scheduler
+
+
+@pytest.mark.asyncio
+async def test_moderation_queue_resolves() -> None:
+    posts = [make_post(1, "a post"), make_post(2, f"a {BAD} post")]
+    auto_reply = make_post(3, "auto reply post", auto_reply=True)
+    auto_reply.pending = False
+    comments = [
+        make_comment(10, 3, "a comment"),
+        make_comment(11, 3, f"a {BAD} comment"),
+        # its post is banned meanwhile
+        make_comment(12, 2, "a comment"),
+    ]
+    metrics = MetricsRegistry()
+    queue, _, scheduler = make_queue(
+        [*posts, auto_reply], comments, metrics
+    )
+    try:
+        for post in posts:
+            await queue.submit(POST, post.id)
+        await queue._queue.join()
+        for comment in comments:
+            await queue.submit(COMMENT, comment.id)
+        await queue._queue.join()
+    finally:
+        await queue.stop()
+
+    assert [(p.pending, p.banned) for p in posts] == [
+        (False, False), (False, True)
+    ]
+    assert [(c.pending, c.banned) for c in comments] == [
+        (False, False), (False, True), (False, True)
+    ]
+    # the reply is scheduled for the allowed comment only
+    assert scheduler.scheduled == [(3, "a reply")]
+    assert metrics.snapshot()["moderation.processed"] == 5
+
+
+@pytest.mark.asyncio
+async def test_moderation_queue_resumes() -> None:
+    posts = [make_post(1, "a post"), make_post(2, "another post")]
+    posts[1].pending = False
+    comments = [make_comment(10, 1, "a comment")]
+    queue, gemini_service, _ = make_queue(posts, comments)
+    try:
+        # what a restart left pending is picked up again
+        await queue.start()
+        await queue._queue.join()
+    finally:
+        await queue.stop()
+    assert not posts[0].pending and not comments[0].pending
+    assert sorted(gemini_service.calls) == ["POST: a post", "a comment"]
+
+    # nothing to resume without deferred moderation
+    queue, gemini_service, _ = make_queue(
+        [make_post(1, "a post")], [], deferred_moderation=False
+    )
+    await queue.start()
+    assert queue._queue is None and gemini_service.calls == []
+
+
+@pytest.mark.asyncio
+async def test_moderation_queue_full() -> None:
+    posts = [make_post(id_, f"post {id_}") for id_ in (1, 2, 3)]
+    metrics = MetricsRegistry()
+    queue, gemini_service, _ = make_queue(
+        posts,
+        [],
+        metrics,
+        moderation_workers=1,
+        moderation_queue_size=1,
+    )
+    gemini_service.held = {"post 1", "post 2"}
+    try:
+        # the only worker is busy with the first post, the second one
+        # fills the queue and the third is moderated by the caller
+        await queue.submit(POST, 1)
+        await asyncio.sleep(0.01)
+        await queue.submit(POST, 2)
+        await queue.submit(POST, 3)
+        assert not posts[2].pending
+        assert posts[0].pending and posts[1].pending
+        assert metrics.snapshot()["moderation.inline"] == 1
+
+        gemini_service.release.set()
+        await queue._queue.join()
+    finally:
+        await queue.stop()
+    assert not any(post.pending for post in posts)
+    assert metrics.snapshot()["moderation.processed"] == 3
+
+
+@pytest.mark.asyncio
+async def test_moderation_queue_unavailable() -> None:
+    posts = [make_post(1, "post 1"), make_post(2, "post 2")]
+    comments = [make_comment(10, 1, "a comment")]
+    metrics = MetricsRegistry()
+    queue, gemini_service, _ = make_queue(
+        posts,
+        comments,
+        metrics,
+        moderation_workers=1,
+        moderation_queue_size=1,
+        moderation_retry_base_delay=0.01,
+    )
+    gemini_service.held = {"post 1"}
+    try:
+        await queue.submit(POST, 1)
+        await asyncio.sleep(0.01)
+        await queue.submit(POST, 2)
+        # moderated inline while the model is unavailable: the caller
+        # is not failed, the comment stays pending and is retried
+        gemini_service.unavailable = 2
+        await queue.submit(COMMENT, 10)
+        assert comments[0].pending
+        gemini_service.release.set()
+        await queue._queue.join()
+        await asyncio.sleep(0.1)
+        await queue._queue.join()
+    finally:
+        await queue.stop()
+    assert not any(post.pending for post in posts)
+    assert not comments[0].pending
+    snapshot = metrics.snapshot()
+    assert snapshot["moderation.retried"] == 2, snapshot
+    assert snapshot["moderation.failed"] == 0, snapshot
+    assert snapshot["moderation.processed"] == 3, snapshot
+
+
+@pytest.mark.asyncio
+async def test_moderation_queue_gives_up(
+    monkeypatch: pytest.MonkeyPatch
+) -> None:
+    posts = [make_post(1, "post 1")]
+    comments = [make_comment(10, 1, "poison comment")]
+    metrics = MetricsRegistry()
+    queue, gemini_service, _ = make_queue(
+        posts,
+        comments,
+        metrics,
+        moderation_max_attempts=4,
+        moderation_retry_base_delay=0.01,
+        moderation_retry_max_delay=0.03,
+    )
+    delays = []
+    retry = queue._retry
+
+    def recording_retry(job, delay: float) -> None:
+        delays.append(delay)
+        retry(job, delay)
+
+    monkeypatch.setattr(queue, "_retry", recording_retry)
+    gemini_service.poison = {"poison"}
+    try:
+        # never answerable: banned right away, not retried
+        await queue.submit(COMMENT, 10)
+        await queue._queue.join()
+        assert (comments[0].pending, comments[0].banned) == (False, True)
+        assert gemini_service.calls == ["poison comment"]
+        assert delays == []
+
+        # unavailable for good: backs off, doubling the delay up to
+        # the max, then gives up
+        gemini_service.unavailable = 100
+        gemini_service.retry_after = None
+        await queue.submit(POST, 1)
+        for _ in range(20):
+            await asyncio.sleep(0.02)
+            if not posts[0].pending:
+                break
+        assert (posts[0].pending, posts[0].banned) == (False, True)
+        assert delays == [0.01, 0.02, 0.03]
+        assert gemini_service.calls.count("POST: post 1") == 4
+    finally:
+        await queue.stop()
+    snapshot = metrics.snapshot()
+    assert snapshot["moderation.given_up"] == 2, snapshot
+    assert snapshot["moderation.retried"] == 3, snapshot
+    assert not queue._attempts
@@ -62,3 +62,48 @@ class TestPost(TestMixin):
             expected_status_code=HTTPStatus.BAD_REQUEST
         )
         assert del_post.get("error") == "Post not found", del_post
+
+    async def test_posts_pagination(self) -> None:
+        api = PostAPI(token=self.token)
+        created = [
+            (await api.create(
+                text=f.sentence(), content_type=ContentTypeEnum.JSON
+            )).get("id")
+            for _ in range(3)
+        ]
+        owner_hex_id = (await api.get(post_id=created[0])).get(
+            "account_hex_id"
+        )
+
+        # walk the owner's posts two at a time
+        seen, cursor = [], None
+        while True:
+            params = {"owner_hex_id": owner_hex_id, "quantity": 2}
+            if cursor is not None:
+                params["cursor"] = cursor
+            resp = await api.get(endpoint=f"/api/v1/posts", **params)
+            posts = resp.get("posts", None)
+            assert isinstance(posts, list), resp
+            assert len(posts) <= 2, resp
+            seen.extend(post.get("id") for post in posts)
+            cursor = resp.get("next_cursor")
+            if cursor is None:
+                break
+
+        assert len(seen) == len(set(seen)), seen
+        assert set(created) <= set(seen), seen
+        assert seen.index(created[2]) < seen.index(created[0]), seen
+
+        resp = await api.get(
+            endpoint=f"/api/v1/posts",
+            cursor="not-a-cursor",
+            expected_status_code=HTTPStatus.BAD_REQUEST
+        )
+        assert resp.get("error") == "Invalid cursor", resp
+
+        resp = await api.get(
+            endpoint=f"/api/v1/posts",
+            owner_hex_id="0" * 32,
+            expected_status_code=HTTPStatus.BAD_REQUEST
+        )
+        assert resp.get("error") == "Invalid owner id", resp
@@ -0,0 +1,118 @@
+import pytest
+import random
+import re
+
+from app.components.gemini.consts import ModerationPriorityEnum
+from app.components.gemini.prefilter import (
+    LOOKALIKES,
+    KeywordMatcher,
+    ModerationPrefilter
+)
+from app.configs import GeminiConfig, GenerationConfig
+from app.containers import container
+from app.metrics import MetricsRegistry
+
+
+def make_config(**kwargs) -> GeminiConfig:
+    return GeminiConfig(
+        api_key="test",
+        generation_config=GenerationConfig(
+            temperature=0, topP=1, topK=1, maxOutputTokens=1
+        ),
+        **kwargs
+    )
+
+
+def test_keyword_matcher() -> None:
+    matcher = KeywordMatcher(["ass", "darn*", "very bad"])
+    assert matcher.search("what an ASS!")
+    assert matcher.search("darnit")
+    assert matcher.search("d4rn you")
+    assert matcher.search("that is   Very  bad")
+    # whole words only, unless the keyword ends with *
+    assert not matcher.search("first class passage")
+    assert not matcher.search("undarned")
+    assert not matcher.search("very badge")
+    assert not KeywordMatcher([])
+
+
+def test_keyword_matcher_agrees_with_regex() -> None:
+    rnd = random.Random(7)
+    alphabet = "abc "
+    keywords = list({
+        "".join(rnd.choice("abc") for _ in range(rnd.randint(1, 4)))
+        + rnd.choice(["", "*"])
+        for _ in range(30)
+    })
+    matcher = KeywordMatcher(keywords)
+    reference = re.compile("|".join(
+        rf"(?<!\w){re.escape(keyword.rstrip('*'))}"
+        + ("" if keyword.endswith("*") else r"(?!\w)")
+        for keyword in keywords
+    ))
+    for _ in range(2000):
+        text = "".join(
+            rnd.choice(alphabet) for _ in range(rnd.randint(0, 20))
+        )
+        normalized = " ".join(text.split()).translate(LOOKALIKES)
+        expected = reference.search(normalized) is not None
+        assert matcher.search(text) == expected, (text, keywords)
+
+
+def test_moderation_prefilter() -> None:
+    metrics = MetricsRegistry()
+    prefilter = ModerationPrefilter(
+        make_config(
+            prefilter_blocklist="darn, heck*",
+            prefilter_allowlist=["thanks", "great post", "+1"],
+        ),
+        metrics,
+    )
+    assert prefilter.check("Oh darn.") == (False, "")
+    assert prefilter.check("Thanks!!") == (True, "")
+    assert prefilter.check("great   POST") == (True, "")
+    assert prefilter.check("+1") == (True, "")
+    # an allowed phrase must be all there is
+    assert prefilter.check("thanks, idiot") is None
+    # replies to auto comment posts are generated by the model
+    assert prefilter.check("thanks", is_auto_comment=True) is None
+    assert prefilter.check("what the heckin", is_auto_comment=True) == (
+        False, ""
+    )
+    snapshot = metrics.snapshot()
+    assert snapshot["gemini.prefilter.blocked"] == 2, snapshot
+    assert snapshot["gemini.prefilter.allowed"] == 3, snapshot
+    assert snapshot["gemini.prefilter.passed"] == 2, snapshot
+
+
+@pytest.mark.asyncio
+async def test_prefilter_skips_the_model(
+    monkeypatch: pytest.MonkeyPatch
+) -> None:
+    gemini_service = container.gemini_service()
+    monkeypatch.setattr(
+        gemini_service,
+        "_prefilter",
+        ModerationPrefilter(
+            make_config(
+                prefilter_blocklist=["darn"],
+                prefilter_allowlist=["thanks"],
+            ),
+            MetricsRegistry(),
+        ),
+    )
+
+    async def call_api(
+        payload: dict,
+        timeout: float | None = None,
+        priority: ModerationPriorityEnum = ModerationPriorityEnum.INTERACTIVE,
+    ) -> dict:
+        raise AssertionError("the model must not be called")
+
+    monkeypatch.setattr(gemini_service, "call_api", call_api)
+    assert await gemini_service.analyze_text(
+        "POST: hello\n\nCOMMENT: thanks", subject="thanks"
+    ) == (True, "")
+    assert await gemini_service.analyze_text(
+        "POST: darn it", subject="darn it"
+    ) == (False, "")
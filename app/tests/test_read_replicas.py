@@ -0,0 +1,132 @@
+import pytest
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from typing import Any, Dict, List
+
+from app.configs import DbConfig
+from app.database import DB, Replica
+from app.metrics import MetricsRegistry
+
+
+class FakeSession:
+    """
+    Stands in for an AsyncSession, connection() fails with the
+    error its factory is set to.
+    """
+
+    def __init__(self, factory: "FakeSessionFactory") -> None:
+        self.name = factory.name
+        self.error = factory.error
+        self.info: Dict[str, Any] = {}
+
+    async def __aenter__(self) -> "FakeSession":
+        return self
+
+    async def __aexit__(self, *_) -> None:
+        pass
+
+    async def connection(self) -> None:
+        if self.error is not None:
+            raise self.error
+
+    async def commit(self) -> None:
+        pass
+
+    async def rollback(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class FakeSessionFactory:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.error: Exception | None = None
+
+    def __call__(self) -> FakeSession:
+        return FakeSession(self)
+
+
+def make_db(
+    metrics: MetricsRegistry,
+    replicas: int
+) -> tuple[DB, List[FakeSessionFactory]]:
+    config = DbConfig(
+        master="postgresql+asyncpg://master/test",
+        master_sync="postgresql://master/test",
+        master_pool_min_size=1,
+        master_pool_max_size=1,
+        replica_retry_interval=5,
+    )
+    db = DB(config, metrics)
+    db._async_session = FakeSessionFactory("master")
+    factories = []
+    for i in range(replicas):
+        replica = Replica(f"replica{i}", None)
+        replica.session_factory = FakeSessionFactory(replica.name)
+        factories.append(replica.session_factory)
+        db._replicas.append(replica)
+    return db, factories
+
+
+async def read(db: DB) -> str:
+    async with db.get_read_session() as session:
+        return session.name
+
+
+@pytest.mark.asyncio
+async def test_read_replicas_round_robin() -> None:
+    metrics = MetricsRegistry()
+    db, _ = make_db(metrics, 3)
+    assert [await read(db) for _ in range(4)] == [
+        "replica0", "replica1", "replica2", "replica0"
+    ]
+    assert "db.replicas.fallbacks" not in metrics.snapshot()
+
+    # without replicas reads go to master, that is not a fallback
+    db, _ = make_db(metrics, 0)
+    assert await read(db) == "master"
+    assert "db.replicas.fallbacks" not in metrics.snapshot()
+
+
+@pytest.mark.asyncio
+async def test_read_replicas_bench(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = 100.0
+    monkeypatch.setattr("app.database.monotonic", lambda: now)
+    metrics = MetricsRegistry()
+    db, factories = make_db(metrics, 2)
+
+    # a replica that can't be connected to is benched
+    factories[0].error = OSError("connection refused")
+    assert [await read(db) for _ in range(3)] == ["replica1"] * 3
+    assert metrics.snapshot()["db.replica0.failures"] == 1
+
+    # and tried again once its retry window is over
+    factories[0].error = None
+    now += 5
+    assert [await read(db) for _ in range(2)] == ["replica0", "replica1"]
+
+
+@pytest.mark.asyncio
+async def test_read_replicas_busy() -> None:
+    metrics = MetricsRegistry()
+    db, factories = make_db(metrics, 2)
+
+    # an exhausted pool is back-pressure: the next replica serves,
+    # the busy one is not benched
+    factories[0].error = PoolTimeoutError("pool exhausted")
+    assert await read(db) == "replica1"
+    factories[0].error = None
+    assert await read(db) == "replica0"
+    snapshot = metrics.snapshot()
+    assert snapshot["db.replica0.pool.timeouts"] == 1, snapshot
+    assert "db.replica0.failures" not in snapshot, snapshot
+
+    # nothing can serve the read: master does
+    for factory in factories:
+        factory.error = PoolTimeoutError("pool exhausted")
+    assert await read(db) == "master"
+    factories[0].error = OSError("connection refused")
+    assert await read(db) == "master"
+    assert metrics.snapshot()["db.replicas.fallbacks"] == 2
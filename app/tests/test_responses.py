@@ -0,0 +1,17 @@
+import json
+import pytest
+
+from app.tests.benchmarks.bench_serialization import (
+    legacy_page,
+    lean_page,
+    make_values
+)
+
+
+@pytest.mark.asyncio
+async def test_page_response_matches_response_model() -> None:
+    values = make_values(20)
+    legacy = await legacy_page(values)
+    lean = await lean_page(values)
+    assert json.loads(lean) == json.loads(legacy)
+    assert lean == legacy
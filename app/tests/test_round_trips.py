@@ -0,0 +1,77 @@
+import pytest
+import secrets
+
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from typing import Iterator, List
+
+from app.components.accounts.models import Account
+from app.components.accounts.repo import AccountRepository
+from app.components.auth.models import Auth
+from app.components.auth.repo import AuthRepository
+from app.components.comments.models import Comment
+from app.components.comments.repo import CommentRepository
+from app.components.posts.models import Post
+from app.components.posts.repo import PostRepository
+from app.tests.consts import PASSWORD
+from app.tests.fixtures import f
+
+
+@contextmanager
+def count_statements(engine: AsyncEngine) -> Iterator[List[str]]:
+    statements: List[str] = []
+
+    def before_cursor_execute(conn, cursor, statement, *args) -> None:
+        statements.append(statement)
+
+    event.listen(
+        engine.sync_engine, "before_cursor_execute", before_cursor_execute
+    )
+    try:
+        yield statements
+    finally:
+        event.remove(
+            engine.sync_engine, "before_cursor_execute", before_cursor_execute
+        )
+
+
+@pytest.mark.asyncio
+async def test_add_is_one_statement(
+    f_engine: AsyncEngine,
+    f_session: AsyncSession
+) -> None:
+    # open the transaction first, so only the inserts are counted
+    await f_session.connection()
+
+    with count_statements(f_engine) as statements:
+        account = await AccountRepository.add_account(f_session, Account(
+            hex_id=secrets.token_hex(16),
+            login=f.pystr(min_chars=5, max_chars=20)
+        ))
+    assert len(statements) == 1, statements
+    assert account.id is not None and account.created_at is not None
+
+    with count_statements(f_engine) as statements:
+        auth = await AuthRepository.add_auth(f_session, Auth(
+            account_id=account.id,
+            login=account.login,
+            hashed_password=PASSWORD,
+        ))
+    assert len(statements) == 1, statements
+    assert auth.id is not None and auth.scopes is not None
+
+    with count_statements(f_engine) as statements:
+        post = await PostRepository.add_post(f_session, Post(
+            account_hex_id=account.hex_id, text=f.paragraph()
+        ))
+    assert len(statements) == 1, statements
+    assert post.id is not None and post.created_at is not None
+
+    with count_statements(f_engine) as statements:
+        comment = await CommentRepository.add_comment(f_session, Comment(
+            account_hex_id=account.hex_id, post_id=post.id, text=f.paragraph()
+        ))
+    assert len(statements) == 1, statements
+    assert comment.id is not None and comment.created_at is not None
+    assert comment.pending is False
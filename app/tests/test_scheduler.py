@@ -0,0 +1,115 @@
+import asyncio
+import pytest
+
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import AsyncGenerator, List, Tuple
+
+from app.components.comments.scheduler import CommentScheduler
+from app.components.posts.models import Post
+from app.configs import CommentsConfig
+from app.metrics import MetricsRegistry
+from app.tests.fixtures.mock_db_fixtures import fake_transaction
+
+
+class InMemoryComments:
+    """
+    Stands in for CommentService, the table is a plain list.
+    """
+
+    def __init__(self) -> None:
+        self.scheduled: List[datetime] = []
+        self.delivered: List[datetime] = []
+        self.batches = 0
+
+    async def schedule_auto_replies(
+        self, _, replies: List[Tuple[Post, str]]
+    ) -> List[datetime]:
+        due = [
+            datetime.utcnow() + timedelta(seconds=post.auto_comment_timeout)
+            for post, _ in replies
+        ]
+        self.scheduled.extend(due)
+        return due
+
+    async def deliver_due_comments(
+        self, _, now: datetime, limit: int
+    ) -> List[datetime]:
+        due = sorted(d for d in self.scheduled if d <= now)[:limit]
+        for due_at in due:
+            self.scheduled.remove(due_at)
+        self.delivered.extend(due)
+        self.batches += bool(due)
+        return due
+
+    async def get_next_scheduled_at(self, _) -> datetime | None:
+        return min(self.scheduled, default=None)
+
+
+@asynccontextmanager
+async def fake_session() -> AsyncGenerator[None, None]:
+    yield None
+
+
+@pytest.mark.asyncio
+async def test_comment_scheduler() -> None:
+    comments = InMemoryComments()
+    scheduler = CommentScheduler(
+        CommentsConfig(scheduler_batch_size=2, scheduler_poll_interval=30),
+        MetricsRegistry(),
+        comments,
+        fake_session,
+    )
+    # left over by a previous run
+    comments.scheduled = [datetime.utcnow() - timedelta(seconds=1)] * 5
+    await scheduler.start()
+    try:
+        await asyncio.sleep(0.05)
+        assert len(comments.delivered) == 5, comments.delivered
+        assert comments.batches == 3, comments.batches
+
+        # the scheduler wakes up for a new reply despite the long poll
+        async with fake_transaction() as tx:
+            await scheduler.schedule(
+                tx, Post(id=1, auto_comment_timeout=0.1), "reply"
+            )
+        await asyncio.sleep(0.05)
+        assert len(comments.delivered) == 5, comments.delivered
+        await asyncio.sleep(0.2)
+        assert len(comments.delivered) == 6, comments.delivered
+        assert not comments.scheduled, comments.scheduled
+    finally:
+        await scheduler.stop()
+
+
+@pytest.mark.asyncio
+async def test_comment_scheduler_lazy_start() -> None:
+    comments = InMemoryComments()
+    scheduler = CommentScheduler(
+        CommentsConfig(scheduler_poll_interval=30),
+        MetricsRegistry(),
+        comments,
+        fake_session,
+    )
+    try:
+        # never started: the first reply starts the delivery loop
+        async with fake_transaction() as tx:
+            await scheduler.schedule(
+                tx, Post(id=1, auto_comment_timeout=0.1), "reply"
+            )
+            # nothing is woken before the reply is committed
+            assert scheduler._next_due is None
+        assert scheduler._next_due is not None
+        await asyncio.sleep(0.2)
+        assert len(comments.delivered) == 1, comments.delivered
+
+        # a rolled back reply doesn't wake the loop
+        with pytest.raises(ConnectionError):
+            async with fake_transaction() as tx:
+                await scheduler.schedule(
+                    tx, Post(id=2, auto_comment_timeout=0), "reply"
+                )
+                raise ConnectionError("db is down")
+        assert scheduler._next_due is None
+    finally:
+        await scheduler.stop()
@@ -0,0 +1,76 @@
+import itertools
+import pytest
+
+from dependency_injector import providers
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from jose import jwt
+
+from app.components.auth.consts import RolePermissionsEnum, ScopeEnum
+from app.components.auth.scopes import compile_required_scopes
+from app.components.auth.utils import Scopes, check_scopes
+from app.containers import container
+from app.tests.benchmarks.bench_scopes import legacy_check_scopes
+
+
+@pytest.mark.parametrize("token_scopes", [
+    *(role.value for role in RolePermissionsEnum),
+    "*:*",
+    "*:get",
+    "posts:get comments:create",
+])
+def test_check_scopes_matches_legacy(token_scopes: str) -> None:
+    for required in itertools.combinations(
+        (scope.value for scope in ScopeEnum), 2
+    ):
+        required_scopes = " ".join(required)
+        assert check_scopes(token_scopes, required_scopes) == \
+            legacy_check_scopes(token_scopes, required_scopes), required
+
+
+def test_check_scopes_rejects_unknown_scope() -> None:
+    with pytest.raises(ValueError):
+        check_scopes(RolePermissionsEnum.ADMIN.value, "posts:publish")
+
+
+def test_scopes_dependency() -> None:
+    assert Scopes(ScopeEnum.POSTS_GET).dependency is \
+        Scopes("posts:get").dependency
+    assert Scopes(ScopeEnum.POSTS_GET).dependency.required_mask == \
+        compile_required_scopes(("posts:get",))
+
+    class FakeAccountCache:
+        async def get_account(self, account_id: int) -> dict:
+            return {"id": account_id}
+
+    app = FastAPI()
+
+    @app.get("/stats")
+    async def stats(account: dict = Scopes(ScopeEnum.STATISTICS_GET)) -> dict:
+        return account
+
+    auth_config = container.config().auth
+
+    def headers(scopes: str) -> dict:
+        token = jwt.encode(
+            {"account_id": 1, "scopes": scopes},
+            auth_config.secret_key,
+            algorithm=auth_config.algorithm,
+        )
+        return {"Authorization": f"Bearer {token}"}
+
+    with container.account_cache.override(
+        providers.Object(FakeAccountCache())
+    ):
+        client = TestClient(app)
+        granted = client.get(
+            "/stats", headers=headers(RolePermissionsEnum.ADMIN.value)
+        )
+        assert granted.status_code == 200, granted.text
+        assert granted.json() == {"id": 1}
+        denied = client.get(
+            "/stats", headers=headers(RolePermissionsEnum.USER.value)
+        )
+        assert denied.status_code == 401, denied.text
+        assert "statistics:get" in denied.json()["detail"]
+        assert client.get("/stats").status_code == 401
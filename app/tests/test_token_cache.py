@@ -0,0 +1,107 @@
+import pytest
+
+from jose import JWTError, jwt
+from time import time
+from typing import Any, Dict, List
+
+from app.components.auth.token_cache import TokenCache
+from app.configs import AuthConfig
+from app.metrics import MetricsRegistry
+
+CONFIG = AuthConfig(
+    secret_key="test",
+    algorithm="HS256",
+    token_expiration_minutes=10,
+    token_cache_size=2,
+    token_cache_ttl=60,
+)
+
+
+def make_token(account_id: int, **claims: Any) -> str:
+    payload: Dict[str, Any] = {"account_id": account_id, "scopes": "me"}
+    payload.update(claims)
+    return jwt.encode(payload, CONFIG.secret_key, algorithm=CONFIG.algorithm)
+
+
+@pytest.fixture
+def decodes(monkeypatch: pytest.MonkeyPatch) -> List[str]:
+    """
+    Tokens that were actually decoded, i.e. not served from the cache.
+    """
+    decoded: List[str] = []
+    decode = jwt.decode
+
+    def counting_decode(token: str, *args: Any, **kwargs: Any) -> Any:
+        decoded.append(token)
+        return decode(token, *args, **kwargs)
+
+    monkeypatch.setattr(
+        "app.components.auth.token_cache.jwt.decode", counting_decode
+    )
+    return decoded
+
+
+def test_token_cache_hits(decodes: List[str]) -> None:
+    token_cache = TokenCache(CONFIG, MetricsRegistry())
+    token = make_token(1, exp=int(time()) + 600)
+    for _ in range(3):
+        assert token_cache.decode(token).account_id == 1
+    assert decodes == [token]
+
+
+def test_token_cache_expiry(
+    monkeypatch: pytest.MonkeyPatch,
+    decodes: List[str]
+) -> None:
+    token_cache = TokenCache(CONFIG, MetricsRegistry())
+    now = time()
+    expires_at = int(now) + 30
+    short = make_token(1, exp=expires_at)
+    long = make_token(2, exp=int(now) + 600)
+    token_cache.decode(short)
+    token_cache.decode(long)
+
+    # past the token's exp, well within the cache ttl
+    monkeypatch.setattr("app.cache.time", lambda: expires_at + 1)
+    token_cache.decode(long)
+    assert decodes == [short, long]
+    # not served from the cache, decoded (and checked) again
+    token_cache.decode(short)
+    assert decodes == [short, long, short]
+
+    # past the cache ttl, even though the token is still valid
+    monkeypatch.setattr(
+        "app.cache.time", lambda: now + CONFIG.token_cache_ttl + 1
+    )
+    token_cache.decode(long)
+    assert decodes == [short, long, short, long]
+
+
+def test_token_cache_size(decodes: List[str]) -> None:
+    token_cache = TokenCache(CONFIG, MetricsRegistry())
+    tokens = [make_token(i) for i in range(3)]
+    for token in tokens:
+        token_cache.decode(token)
+    assert len(token_cache._cache) == CONFIG.token_cache_size
+    # the least recently used one was dropped
+    token_cache.decode(tokens[2])
+    token_cache.decode(tokens[0])
+    assert decodes == [*tokens, tokens[0]]
+
+
+def test_token_cache_rejects(decodes: List[str]) -> None:
+    token_cache = TokenCache(CONFIG, MetricsRegistry())
+    forged = jwt.encode(
+        {"account_id": 1, "scopes": "me"}, "other", algorithm="HS256"
+    )
+    expired = make_token(1, exp=int(time()) - 10)
+    no_account = jwt.encode(
+        {"scopes": "me"}, CONFIG.secret_key, algorithm=CONFIG.algorithm
+    )
+    for token in (forged, expired, no_account, "garbage"):
+        for _ in range(2):
+            with pytest.raises(JWTError):
+                token_cache.decode(token)
+    # every attempt was decoded, nothing was cached
+    assert len(decodes) == 8
+    assert len(token_cache._cache) == 0
@@ -10,9 +10,16 @@ from sqlalchemy.orm import sessionmaker
 from typing import AsyncGenerator
 
 from app.components.accounts.endpoints import accounts_router
+from app.components.auth.hashing import PasswordHasher
 from app.components.auth.endpoints import auth_router
 from app.components.posts.endpoints import posts_router
 from app.components.comments.endpoints import comments_router
+from app.components.comments.scheduler import CommentScheduler
+from app.components.comments.stats import DailyStatsRollup
+from app.components.gemini.cache import ModerationCache
+from app.components.gemini.moderation import ModerationQueue
+from app.components.gemini.service import GeminiService
+from app.components.metrics.endpoints import metrics_router
 from app.components.base.models import Base
 from app.configs import AppConfig
 from app.containers import container, Container
@@ -24,7 +31,14 @@ from app.exceptions import LogicError
 def setup_app(
     config: AppConfig = Provide[Container.config],
     db: DB = Provide[Container.db],
-    
+    password_hasher: PasswordHasher = Provide[Container.password_hasher],
+    gemini_service: GeminiService = Provide[Container.gemini_service],
+    moderation_cache: ModerationCache = Provide[Container.moderation_cache],
+    moderation_queue: ModerationQueue = Provide[Container.moderation_queue],
+    comment_scheduler: CommentScheduler = Provide[Container.comment_scheduler],
+    daily_stats_rollup: DailyStatsRollup = Provide[
+        Container.daily_stats_rollup
+    ],
 ):
     @asynccontextmanager
     async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
@@ -36,8 +50,18 @@ def setup_app(
         Base.metadata.create_all(bind=engine)
         
         await db.init_db()
+        await gemini_service.start()
+        await moderation_cache.purge()
+        await comment_scheduler.start()
+        await daily_stats_rollup.start()
+        await moderation_queue.start()
         yield
+        await moderation_queue.stop()
+        await daily_stats_rollup.stop()
+        await comment_scheduler.stop()
+        await gemini_service.close()
         await db.dispose()
+        password_hasher.shutdown()
 
     app = FastAPI(debug=config.env.debug, lifespan=lifespan)
     api_v1 = FastAPI(debug=config.env.debug)
@@ -45,6 +69,7 @@ def setup_app(
     api_v1.include_router(auth_router)
     api_v1.include_router(posts_router)
     api_v1.include_router(comments_router)
+    api_v1.include_router(metrics_router)
     app.mount("/api/v1", api_v1)
 
     if config.env.enable_cors: